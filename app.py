@@ -4,12 +4,25 @@ import streamlit as st
 import logging
 from pathlib import Path
 import sys
+import time
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from src.rag_pipeline import RAGPipeline
-from src.evaluation import RAGEvaluator
+from config import (
+    CHUNK_EXPAND_WINDOW, COARSE_TOP_D, COLLECTION_MEMORY_BUDGET_MB, COLLECTIONS_DIR,
+    CONTEXT_COMPRESSION_RATIO, CONTEXT_TOKEN_BUDGET, INGESTION_JOBS_DIR, LLM_N_THREADS,
+    LLM_NOT_READY_POLICY, LLM_READY_TIMEOUT_S, LLM_WARMUP, LLM_WORKERS, MAX_CHUNKS_PER_PAGE,
+    MMR_LAMBDA, PREFIX_CACHE_PATH, RAG_SERVICE_URL, RERANK_BUDGET_MS, RERANK_FETCH_K,
+    RERANK_MODEL, RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL, RETRIEVAL_K, SCORE_THRESHOLD,
+    SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, USAGE_LOG_PATH
+)
+from src.collection_manager import CollectionManager, IndexCache
+from src.embeddings import Embedder
+from src.evaluation import RAGEvaluator, UsageLog, UsageStats
+from src.generation import AnswerGenerator, GenerationScheduler, PRIORITY_BATCH
+from src.ingestion_jobs import ACTIVE_STATES, IngestionJobRunner
+from src.service import RAGServiceClient
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +31,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Collection name under which the index path from the sidebar is registered
+MAIN_COLLECTION = "main"
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
 # Page configuration
 st.set_page_config(
     page_title="Medical RAG QA System",
@@ -208,21 +225,193 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# Resources are cached separately, so rebuilding an index reloads only that
+# index and switching models reloads only the LLM.
+@st.cache_resource
+def load_embedder(embedding_model: str = DEFAULT_EMBEDDING_MODEL):
+    """Load an embedding model once; every index embedded with it shares it."""
+    start = time.perf_counter()
+    embedder = Embedder(model_name=embedding_model)
+    logger.info(f"Loaded embedding model {embedding_model} in {time.perf_counter() - start:.1f} s")
+    return embedder
+
+
+@st.cache_resource
+def load_llm(model_path: str):
+    """Create the answer generator and scheduler for a model, which loads and warms up in the background."""
+    generator = AnswerGenerator(
+        model_path=model_path,
+        n_threads=LLM_N_THREADS,
+        prefix_cache_path=PREFIX_CACHE_PATH,
+        n_workers=LLM_WORKERS
+    )
+    # The first query waits for the model only if it arrives early
+    if LLM_WARMUP and model_path != "demo_mode" and Path(model_path).exists():
+        generator.start_background_load()
+    return generator, GenerationScheduler(generator, concurrency=LLM_WORKERS)
+
+
+@st.cache_resource
+def load_index_cache():
+    """Indexes loaded so far, shared across models; each reloads on its own once rebuilt."""
+    return IndexCache(load_embedder(), memory_budget_mb=COLLECTION_MEMORY_BUDGET_MB)
+
+
 @st.cache_resource
-def load_rag_pipeline(model_path: str, index_path: str):
-    """Load RAG pipeline with caching."""
+def load_usage_log():
+    """Open the usage log once for every model and collection (None when disabled)."""
+    return UsageLog(USAGE_LOG_PATH) if USAGE_LOG_PATH else None
+
+
+@st.cache_resource
+def load_collection_manager(model_path: str, retrieval_mode: str = "hybrid"):
+    """Collection manager over the cached embedder, indexes and LLM; cheap to create per model."""
+    generator, scheduler = load_llm(model_path)
+    return CollectionManager(
+        model_path=model_path,
+        collections_dir=COLLECTIONS_DIR,
+        embedder=load_embedder(),
+        generator=generator,
+        scheduler=scheduler,
+        usage_log=load_usage_log(),
+        index_cache=load_index_cache(),
+        retrieval_k=RETRIEVAL_K,
+        retrieval_mode=retrieval_mode,
+        score_threshold=SCORE_THRESHOLD,
+        rerank_model=RERANK_MODEL or None,
+        rerank_fetch_k=RERANK_FETCH_K,
+        rerank_budget_ms=RERANK_BUDGET_MS,
+        mmr_lambda=MMR_LAMBDA,
+        max_chunks_per_page=MAX_CHUNKS_PER_PAGE,
+        context_token_budget=CONTEXT_TOKEN_BUDGET,
+        compression_ratio=CONTEXT_COMPRESSION_RATIO,
+        expand_window=CHUNK_EXPAND_WINDOW,
+        coarse_top_d=COARSE_TOP_D,
+        llm_not_ready_policy=LLM_NOT_READY_POLICY,
+        llm_ready_timeout_s=LLM_READY_TIMEOUT_S,
+        semantic_cache_threshold=SEMANTIC_CACHE_THRESHOLD,
+        semantic_cache_size=SEMANTIC_CACHE_SIZE,
+        response_cache_path=RESPONSE_CACHE_PATH,
+        response_cache_ttl=RESPONSE_CACHE_TTL
+    )
+
+
+@st.cache_resource
+def load_service_client(service_url: str):
+    """Connect to the query service with caching, so its connections are reused."""
+    return RAGServiceClient(service_url)
+
+
+def load_rag_pipeline(model_path: str, index_path: str, retrieval_mode: str = "hybrid"):
+    """Load the pipeline over an index path through the shared collection manager, or the query service client."""
+    if RAG_SERVICE_URL:
+        return load_service_client(RAG_SERVICE_URL)
     try:
-        pipeline = RAGPipeline(
-            model_path=model_path,
-            index_path=index_path
-        )
-        pipeline.load_index()
-        return pipeline
+        manager = load_collection_manager(model_path, retrieval_mode)
+        manager.register(MAIN_COLLECTION, index_path)
+        return manager.get(MAIN_COLLECTION)
     except Exception as e:
         st.error(f"Error loading RAG pipeline: {e}")
         return None
 
 
+@st.cache_resource
+def load_ingestion_runner():
+    """Start and track background ingestion jobs."""
+    return IngestionJobRunner(INGESTION_JOBS_DIR)
+
+
+@st.fragment(run_every=2)
+def show_ingestion_jobs(location: str) -> None:
+    """Poll running ingestion jobs, with a cancel button each, and show how the latest one ended."""
+    runner = load_ingestion_runner()
+    jobs = runner.list_jobs()
+    watched = st.session_state.setdefault('watched_ingestion_jobs', set())
+    
+    for job in jobs:
+        if job['state'] in ACTIVE_STATES:
+            watched.add(job['job_id'])
+            if job['stage'] == 'embedding' and job['chunks_total']:
+                fraction = job['chunks_embedded'] / job['chunks_total']
+                detail = f"embedding chunks {job['chunks_embedded']}/{job['chunks_total']}"
+            elif job['files_total']:
+                fraction = job['files_done'] / job['files_total']
+                detail = f"extracting files {job['files_done']}/{job['files_total']} · {job['pages_extracted']} pages"
+            else:
+                fraction, detail = 0.0, job['stage'] or "starting"
+            eta = f" · about {job['eta_s']:.0f} s left in this stage" if job['eta_s'] is not None else ""
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.progress(min(fraction, 1.0), text=f"📥 {Path(job['pdf_path']).name} → {job['index_path']}: {detail}{eta}")
+            with col2:
+                if st.button("✖ Cancel", key=f"cancel_{location}_{job['job_id']}"):
+                    runner.cancel(job['job_id'])
+                    st.toast("Cancelling after the current file or batch...")
+        elif job['job_id'] in watched:
+            # Finished since the last poll: reload its index and show the new state app-wide
+            watched.discard(job['job_id'])
+            if job['state'] == 'succeeded':
+                load_index_cache().invalidate(job['index_path'])
+            st.rerun()
+    
+    finished = [job for job in jobs if job['state'] not in ACTIVE_STATES]
+    if finished:
+        job = finished[0]
+        if job['state'] == 'succeeded':
+            st.success(
+                f"✅ Last ingestion built {job['index_path']} from {job['files_done']} file(s), "
+                f"{job['pages_extracted']} pages and {job['chunks_total']} chunks"
+            )
+        elif job['state'] == 'cancelled':
+            st.info(f"Last ingestion into {job['index_path']} was cancelled; the previous index is unchanged.")
+        else:
+            st.error(f"❌ Last ingestion into {job['index_path']} failed: {job['error']}")
+
+
+def collection_query_events(manager, question, collections, **options):
+    """Answer from collections as `query_stream`-style events; the answer arrives whole."""
+    response = manager.query(question, collections=collections, **options)
+    yield {'type': 'retrieval', 'citations': response['citations'], 'retrieval_ms': None}
+    yield {'type': 'token', 'text': response['answer']}
+    yield {'type': 'done', 'response': response}
+
+
+def show_session_usage(placeholder) -> None:
+    """Render this session's accumulated generation usage into a sidebar placeholder."""
+    summary = st.session_state['usage_stats'].summary()
+    if summary['queries'] == 0:
+        placeholder.empty()
+        return
+    sources = ", ".join(f"{count} {source}" for source, count in sorted(summary['by_source'].items()))
+    placeholder.caption(
+        f"📊 This session: {summary['queries']} queries ({sources}) · "
+        f"{summary['prompt_tokens']} prompt + {summary['completion_tokens']} completion tokens · "
+        f"mean TTFT {summary['mean_ttft_ms']:.0f} ms · {summary['tokens_per_second']:.1f} tokens/s"
+    )
+
+
+def answer_for_evaluation(pipeline, questions, references, k, progress_bar=None, batch_size=16):
+    """
+    Answer evaluation questions in batches, dropping (and reporting) the ones that failed.
+    
+    Returns:
+        Tuple of (questions, references, answers, contexts) for the answered questions
+    """
+    responses = []
+    for offset in range(0, len(questions), batch_size):
+        responses.extend(pipeline.query_batch(questions[offset:offset + batch_size], k=k, priority=PRIORITY_BATCH))
+        if progress_bar is not None:
+            progress_bar.progress(len(responses) / len(questions))
+    
+    answered = []
+    for question, reference, response in zip(questions, references, responses):
+        if 'error' in response:
+            st.warning(f"Not evaluated, could not answer \"{question}\": {response['error']}")
+        else:
+            answered.append((question, reference, response['answer'], response.get('context', '')))
+    return tuple(list(column) for column in zip(*answered)) if answered else ([], [], [], [])
+
+
 def main():
     """Main Streamlit application."""
     
@@ -292,14 +481,15 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("🔄 Refresh Index"):
-                st.cache_resource.clear()
-                st.success("Index cache cleared")
+                load_index_cache().invalidate(index_path)
+                st.success("Index will reload on the next query")
         
         with col2:
             if st.button("🗑️ Delete Index"):
                 import shutil
                 if Path(index_path).exists():
                     shutil.rmtree(index_path)
+                    load_index_cache().invalidate(index_path)
                     st.success("Index deleted")
                 else:
                     st.warning("Index not found")
@@ -333,10 +523,24 @@ def main():
             "Number of Documents to Retrieve",
             min_value=1,
             max_value=10,
-            value=5,
+            value=min(RETRIEVAL_K, 10),
             help="Top-k documents for retrieval"
         )
         
+        retrieval_mode = st.selectbox(
+            "Retrieval Mode",
+            ["hybrid", "dense"],
+            help="Hybrid combines semantic search with BM25 keyword matching for exact drug names, dosages and codes"
+        )
+        
+        answer_deadline_s = st.number_input(
+            "Answer Deadline (seconds)",
+            min_value=0.0,
+            value=0.0,
+            step=1.0,
+            help="0 waits for the full answer; otherwise optional steps are skipped and the answer shortened to meet it"
+        )
+        
         # Advanced Settings
         with st.expander("⚙️ Advanced Settings"):
             chunk_size = st.slider(
@@ -371,6 +575,15 @@ def main():
         # Check if paths exist
         model_exists = (Path(model_path).exists() if model_path and model_path != "demo_mode" else False) or (model_path == "demo_mode")
         index_exists = Path(index_path).exists() if index_path else False
+        if RAG_SERVICE_URL:
+            # The service has its own model and index; it is usable if it answers
+            try:
+                service_health = load_rag_pipeline(model_path, index_path, retrieval_mode).health()
+                st.success(f"✓ Query service at {RAG_SERVICE_URL} (index {service_health['index_version']})")
+                model_exists = index_exists = True
+            except Exception as e:
+                st.error(f"✗ Query service at {RAG_SERVICE_URL} unavailable: {e}")
+                model_exists = index_exists = False
         
         # Store in session state for banner check
         st.session_state['index_exists'] = index_exists
@@ -393,6 +606,55 @@ def main():
         else:
             st.markdown('<div class="status-badge status-warning">⚠ Index Not Found</div>', unsafe_allow_html=True)
             st.caption("Ingest documents first")
+        
+        # Generation queue shared by all sessions using the LLM
+        if index_exists and model_exists and model_path != "demo_mode":
+            status_pipeline = load_rag_pipeline(model_path, index_path, retrieval_mode)
+            if status_pipeline is not None:
+                readiness = status_pipeline.get_llm_readiness()
+                if readiness['state'] == 'loading':
+                    st.markdown('<div class="status-badge status-warning">⏳ LLM Loading</div>', unsafe_allow_html=True)
+                    st.caption("Queries wait for the model to finish loading")
+                elif readiness['state'] == 'ready':
+                    st.markdown('<div class="status-badge status-success">✓ LLM Ready</div>', unsafe_allow_html=True)
+                    if readiness['load_ms'] is not None:
+                        st.caption(
+                            f"Loaded in {readiness['load_ms'] / 1000:.1f} s"
+                            + (f", warm-up {readiness['warmup_ms']:.0f} ms" if readiness['warmup_ms'] is not None else "")
+                        )
+                elif readiness['state'] == 'failed':
+                    st.markdown('<div class="status-badge status-error">✗ LLM Failed to Load</div>', unsafe_allow_html=True)
+                    st.caption(f"Answering in demo mode: {readiness['error']}")
+                queue_metrics = status_pipeline.get_generation_metrics()
+                st.caption(
+                    f"🧵 Generation queue: {queue_metrics['queue_depth']} waiting, "
+                    f"{queue_metrics['in_flight']} running · mean wait {queue_metrics['mean_wait_ms']:.0f} ms"
+                )
+                if 'workers' in queue_metrics:
+                    workers = queue_metrics['workers']
+                    st.caption(
+                        f"⚙️ LLM workers: {workers['alive']}/{workers['workers']} alive, "
+                        f"{workers['threads_per_worker']} threads each"
+                    )
+        
+        # Indexes held in memory by the collection manager
+        if not RAG_SERVICE_URL and index_exists:
+            collection_stats = load_collection_manager(model_path, retrieval_mode).get_stats()
+            if collection_stats['loaded']:
+                loaded_mb = collection_stats['memory_bytes'] / (1024 * 1024)
+                budget_bytes = collection_stats['memory_budget_bytes']
+                st.caption(
+                    "📚 Loaded collections: "
+                    + ", ".join(f"{name} ({collection_stats['load_ms'][name]:.0f} ms)" for name in collection_stats['loaded'])
+                    + f" · {loaded_mb:.0f} MB"
+                    + (f" of {budget_bytes / (1024 * 1024):.0f} MB" if budget_bytes else "")
+                )
+        
+        # Token and timing totals of this browser session's queries
+        if 'usage_stats' not in st.session_state:
+            st.session_state['usage_stats'] = UsageStats()
+        session_usage_placeholder = st.empty()
+        show_session_usage(session_usage_placeholder)
     
     # Main content area
     tab1, tab2, tab3 = st.tabs(["🔍 Query", "📥 Ingest Documents", "📈 Evaluation"])
@@ -426,32 +688,17 @@ def main():
                 st.markdown("<br>", unsafe_allow_html=True)
                 if st.button("📥 Ingest Now", type="primary", use_container_width=True, key="quick_ingest_btn"):
                     if quick_pdf_path:
-                        with st.spinner("Processing PDFs and creating index... This may take 1-3 minutes..."):
-                            try:
-                                pipeline = RAGPipeline(
-                                    model_path=model_path if model_path != "demo_mode" else "demo.gguf",
-                                    index_path=index_path
-                                )
-                                pipeline.ingest_documents(quick_pdf_path)
-                                
-                                st.success("✅ Successfully ingested documents! Index created.")
-                                st.info("💡 Refresh the page or go to Query tab to start asking questions.")
-                                st.balloons()
-                                
-                                # Clear cache
-                                st.cache_resource.clear()
-                                
-                                # Auto-refresh after 2 seconds
-                                import time
-                                time.sleep(2)
-                                st.rerun()
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error ingesting documents: {e}")
-                                st.info("💡 Make sure PDF files exist in the specified path.")
+                        try:
+                            load_ingestion_runner().submit(quick_pdf_path, index_path)
+                        except Exception as e:
+                            st.error(f"❌ Error starting ingestion: {e}")
+                            st.info("💡 Make sure PDF files exist in the specified path.")
                     else:
                         st.warning("Please provide a PDF path.")
             
+            # Runs in the background; the page switches to querying once the index is built
+            show_ingestion_jobs("quick")
+            
             # Show available PDFs
             if Path(quick_pdf_path).exists():
                 pdf_files = list(Path(quick_pdf_path).glob("*.pdf"))
@@ -487,7 +734,7 @@ def main():
                 """)
         else:
             # Load pipeline
-            pipeline = load_rag_pipeline(model_path, index_path)
+            pipeline = load_rag_pipeline(model_path, index_path, retrieval_mode)
             
             if pipeline is None:
                 st.error("Failed to load RAG pipeline. Please check your configuration.")
@@ -499,58 +746,147 @@ def main():
                     placeholder="e.g., What are the symptoms of diabetes?"
                 )
                 
+                # Optional search filters, applied inside the vector search
+                query_filters = {}
+                with st.expander("🔎 Search Filters"):
+                    selected_sources = st.multiselect(
+                        "Limit to sources",
+                        pipeline.list_sources(),
+                        help="Search only within the selected documents"
+                    )
+                    use_page_range = st.checkbox("Limit to page range")
+                    if use_page_range:
+                        page_col1, page_col2 = st.columns(2)
+                        with page_col1:
+                            first_page = st.number_input("From page", min_value=1, value=1, step=1)
+                        with page_col2:
+                            last_page = st.number_input("To page", min_value=1, value=10, step=1)
+                        query_filters['page_range'] = (int(first_page), int(last_page))
+                    if selected_sources:
+                        query_filters['source'] = selected_sources
+                
+                # Other indexes in the collections directory, searched instead of the main one
+                selected_collections = []
+                if not RAG_SERVICE_URL:
+                    collection_manager = load_collection_manager(model_path, retrieval_mode)
+                    other_collections = [name for name in collection_manager.list_collections() if name != MAIN_COLLECTION]
+                    if other_collections:
+                        selected_collections = st.multiselect(
+                            "📚 Collections",
+                            other_collections,
+                            help="Answer from these collections instead of the main index; several are searched together"
+                        )
+                
                 if st.button("🔍 Get Answer", type="primary"):
                     if not question.strip():
                         st.warning("Please enter a question.")
                     else:
-                        with st.spinner("Retrieving relevant documents and generating answer..."):
-                            try:
-                                # Query will automatically use demo mode if LLM not available
-                                response = pipeline.query(question, k=retrieval_k)
-                                
-                                # Show demo mode notice if applicable
-                                if response.get("model") == "Demo Mode (Context Extraction)":
-                                    st.info("💡 **Demo Mode**: Using context extraction (LLM not available). Install llama-cpp-python for full LLM answers.")
-                                
-                                # Display answer with enhanced styling
-                                st.markdown('<div class="section-header">💡 Answer</div>', unsafe_allow_html=True)
-                                st.markdown(f'<div class="answer-box">{response["answer"]}</div>', unsafe_allow_html=True)
-                                
-                                # Display citations with enhanced styling
-                                if response.get("citations"):
-                                    st.markdown('<div class="section-header">📚 Sources & Citations</div>', unsafe_allow_html=True)
-                                    for citation in response["citations"]:
-                                        st.markdown(f"""
-                                        <div class="citation-box">
-                                            <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
-                                                <span style="background: #667eea; color: white; padding: 0.25rem 0.75rem; border-radius: 20px; font-weight: 600; margin-right: 1rem;">
-                                                    [{citation['index']}]
-                                                </span>
-                                                <strong style="color: #333; font-size: 1.1rem;">
-                                                    {citation['source']}
-                                                </strong>
-                                                <span style="margin-left: auto; color: #666; font-size: 0.9rem;">
-                                                    Page {citation['page_number']}
-                                                </span>
-                                            </div>
-                                            <div style="color: #555; font-size: 0.95rem; margin-top: 0.5rem; padding-left: 1rem; border-left: 3px solid #e0e0e0;">
-                                                {citation['preview']}
-                                            </div>
+                        try:
+                            # Query will automatically use demo mode if LLM not available
+                            deadline_ms = answer_deadline_s * 1000 if answer_deadline_s > 0 else None
+                            with st.spinner("Retrieving relevant documents..."):
+                                if selected_collections:
+                                    events = collection_query_events(
+                                        collection_manager,
+                                        question,
+                                        selected_collections,
+                                        k=retrieval_k,
+                                        filters=query_filters or None,
+                                        deadline_ms=deadline_ms if len(selected_collections) == 1 else None
+                                    )
+                                else:
+                                    events = pipeline.query_stream(
+                                        question,
+                                        k=retrieval_k,
+                                        filters=query_filters or None,
+                                        deadline_ms=deadline_ms
+                                    )
+                                retrieval = next(events)
+                            if retrieval['retrieval_ms'] is not None:
+                                st.caption(
+                                    f"🔎 Retrieved {len(retrieval['citations'])} passages in {retrieval['retrieval_ms']:.0f} ms"
+                                )
+                            
+                            # Display answer with enhanced styling, token by token as it is generated
+                            st.markdown('<div class="section-header">💡 Answer</div>', unsafe_allow_html=True)
+                            answer_placeholder = st.empty()
+                            streamed_answer = ""
+                            response = None
+                            for event in events:
+                                if event["type"] == "token":
+                                    streamed_answer += event["text"]
+                                    answer_placeholder.markdown(f'<div class="answer-box">{streamed_answer}▌</div>', unsafe_allow_html=True)
+                                elif event["type"] == "done":
+                                    response = event["response"]
+                            answer_placeholder.markdown(f'<div class="answer-box">{response["answer"]}</div>', unsafe_allow_html=True)
+                            st.session_state['usage_stats'].add(response["usage"])
+                            show_session_usage(session_usage_placeholder)
+                            
+                            # Show demo mode notice if applicable
+                            if response.get("fallback_reason") == "llm_loading":
+                                st.info("⏳ **LLM still loading**: This answer was extracted from the context. Ask again once the sidebar shows the LLM is ready.")
+                            elif response.get("model") == "Demo Mode (Context Extraction)":
+                                st.info("💡 **Demo Mode**: Using context extraction (LLM not available). Install llama-cpp-python for full LLM answers.")
+                            
+                            if response.get("cache"):
+                                st.caption(f"⚡ Answered from cache (matched: \"{response['cache']['question']}\")")
+                            
+                            if response.get("degradations"):
+                                st.caption(
+                                    f"⏳ To meet the {answer_deadline_s:g} s deadline: "
+                                    + ", ".join(d.replace("_", " ") for d in response["degradations"])
+                                )
+                            
+                            streaming = response.get("streaming", {})
+                            if "tokens_per_second" in streaming:
+                                st.caption(
+                                    f"⏱️ First token after {streaming['ttft_ms']:.0f} ms · "
+                                    f"{streaming['tokens_per_second']:.1f} tokens/s"
+                                )
+                            
+                            # Display citations with enhanced styling
+                            if response.get("citations"):
+                                st.markdown('<div class="section-header">📚 Sources & Citations</div>', unsafe_allow_html=True)
+                                for citation in response["citations"]:
+                                    st.markdown(f"""
+                                    <div class="citation-box">
+                                        <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
+                                            <span style="background: #667eea; color: white; padding: 0.25rem 0.75rem; border-radius: 20px; font-weight: 600; margin-right: 1rem;">
+                                                [{citation['index']}]
+                                            </span>
+                                            <strong style="color: #333; font-size: 1.1rem;">
+                                                {citation['source']}{f" · {citation['collection']}" if 'collection' in citation else ""}
+                                            </strong>
+                                            <span style="margin-left: auto; color: #666; font-size: 0.9rem;">
+                                                Page {citation['page_number']}
+                                            </span>
                                         </div>
-                                        """, unsafe_allow_html=True)
-                                
-                                # Metadata
-                                with st.expander("📊 Response Metadata"):
-                                    st.json({
-                                        "Question": response["question"],
-                                        "Context Length": response["context_length"],
-                                        "Number of Citations": len(response.get("citations", [])),
-                                        "Model": response.get("model", "Unknown")
-                                    })
+                                        <div style="color: #555; font-size: 0.95rem; margin-top: 0.5rem; padding-left: 1rem; border-left: 3px solid #e0e0e0;">
+                                            {citation['preview']}
+                                        </div>
+                                    </div>
+                                    """, unsafe_allow_html=True)
                             
-                            except Exception as e:
-                                st.error(f"Error generating answer: {e}")
-                                logger.exception("Error in query")
+                            # Metadata
+                            with st.expander("📊 Response Metadata"):
+                                st.json({
+                                    "Question": response["question"],
+                                    "Context Length": response["context_length"],
+                                    "Answer Source": response["usage"]["answer_source"],
+                                    "Prompt Tokens": response.get("prompt_tokens", "N/A"),
+                                    "Completion Tokens": response["usage"]["completion_tokens"],
+                                    "Prefill (ms)": round(response["usage"]["prefill_ms"]),
+                                    "Decode (ms)": round(response["usage"]["decode_ms"]),
+                                    "Time to First Token (ms)": round(streaming["ttft_ms"]) if "ttft_ms" in streaming else "N/A",
+                                    "Tokens/sec": round(streaming.get("tokens_per_second", 0.0), 1),
+                                    "Prefix Tokens Reused": response.get("prefix_cache", {}).get("prefix_tokens", 0),
+                                    "Number of Citations": len(response.get("citations", [])),
+                                    "Model": response.get("model", "Unknown")
+                                })
+                        
+                        except Exception as e:
+                            st.error(f"Error generating answer: {e}")
+                            logger.exception("Error in query")
     
     # Ingestion Tab
     with tab2:
@@ -615,39 +951,46 @@ def main():
             # Auto-update path
             pdf_path = str(upload_path.parent)
         
+        ingest_collection = st.text_input(
+            "Collection (optional)",
+            value="",
+            help=f"Build a named collection under {COLLECTIONS_DIR}, e.g. 'cardiology', instead of the main index"
+        ).strip()
+        
         if st.button("📥 Ingest Documents", type="primary"):
             if not pdf_path:
                 st.warning("Please provide a PDF path.")
             else:
                 try:
-                    with st.spinner("Processing PDFs and creating vector index..."):
-                        # For ingestion, we don't need the LLM, so model path can be placeholder
-                        # The generator won't be initialized until querying
-                        # Get advanced settings if available
-                        chunk_size_val = chunk_size if 'chunk_size' in locals() else 1000
-                        chunk_overlap_val = chunk_overlap if 'chunk_overlap' in locals() else 200
-                        embedding_model_val = embedding_model if 'embedding_model' in locals() else "sentence-transformers/all-MiniLM-L6-v2"
-                        
-                        pipeline = RAGPipeline(
-                            model_path=model_path if model_path != "demo_mode" else "demo.gguf",
-                            index_path=index_path,
-                            chunk_size=chunk_size_val,
-                            chunk_overlap=chunk_overlap_val,
-                            embedding_model=embedding_model_val
+                    # Get advanced settings if available
+                    chunk_size_val = chunk_size if 'chunk_size' in locals() else 1000
+                    chunk_overlap_val = chunk_overlap if 'chunk_overlap' in locals() else 200
+                    embedding_model_val = embedding_model if 'embedding_model' in locals() else DEFAULT_EMBEDDING_MODEL
+                    
+                    target_index_path = index_path
+                    if ingest_collection:
+                        target_index_path = str(
+                            load_collection_manager(model_path, retrieval_mode).collection_path(ingest_collection)
                         )
-                        pipeline.ingest_documents(pdf_path)
-                        
-                        st.success(f"✅ Successfully ingested documents from {pdf_path}")
-                        st.info("You can now use the Query tab to ask questions.")
-                        st.info("💡 **Note:** You'll need to install llama-cpp-python and download a model to query.")
-                        
-                        # Clear cache to reload pipeline
-                        st.cache_resource.clear()
+                    
+                    # The index builds in a worker process; queries use the current one until it is swapped in
+                    load_ingestion_runner().submit(
+                        pdf_path,
+                        target_index_path,
+                        chunk_size=chunk_size_val,
+                        chunk_overlap=chunk_overlap_val,
+                        embedding_model=embedding_model_val
+                    )
+                    st.info(f"Ingesting {pdf_path} into {target_index_path} in the background. "
+                            "The Query tab keeps answering from the current index meanwhile.")
+                    st.info("💡 **Note:** You'll need to install llama-cpp-python and download a model to query.")
                 
                 except Exception as e:
-                    st.error(f"Error ingesting documents: {e}")
+                    st.error(f"Error starting ingestion: {e}")
                     logger.exception("Error in ingestion")
                     st.info("💡 **Tip:** Make sure PDF files exist in the specified path.")
+        
+        show_ingestion_jobs("ingest")
     
     # Evaluation Tab
     with tab3:
@@ -696,20 +1039,11 @@ def main():
                         with st.spinner("Evaluating..."):
                             # Generate answers
                             if index_exists and model_exists:
-                                pipeline = load_rag_pipeline(model_path, index_path)
+                                pipeline = load_rag_pipeline(model_path, index_path, retrieval_mode)
                                 if pipeline:
-                                    generated_answers = []
-                                    contexts_list = []
-                                    
-                                    for question in questions:
-                                        try:
-                                            response = pipeline.query(question, k=retrieval_k)
-                                            generated_answers.append(response['answer'])
-                                            # Get context (simplified)
-                                            contexts_list.append(response.get('context', ''))
-                                        except Exception as e:
-                                            generated_answers.append(f"Error: {e}")
-                                            contexts_list.append("")
+                                    questions, references, generated_answers, contexts_list = answer_for_evaluation(
+                                        pipeline, questions, references, retrieval_k
+                                    )
                                     
                                     # Evaluate
                                     evaluator = RAGEvaluator()
@@ -780,24 +1114,15 @@ def main():
                             with st.spinner("Evaluating dataset..."):
                                 pipeline = load_rag_pipeline(
                                     model_path if model_exists else "demo_mode", 
-                                    index_path
+                                    index_path,
+                                    retrieval_mode
                                 )
                                 if pipeline:
                                     questions = df['question'].tolist()
                                     references = df['reference_answer'].tolist()
-                                    generated_answers = []
-                                    contexts_list = []
-                                    
-                                    progress_bar = st.progress(0)
-                                    for i, question in enumerate(questions):
-                                        try:
-                                            response = pipeline.query(question, k=retrieval_k)
-                                            generated_answers.append(response['answer'])
-                                            contexts_list.append(response.get('context', ''))
-                                        except Exception as e:
-                                            generated_answers.append(f"Error: {e}")
-                                            contexts_list.append("")
-                                        progress_bar.progress((i + 1) / len(questions))
+                                    questions, references, generated_answers, contexts_list = answer_for_evaluation(
+                                        pipeline, questions, references, retrieval_k, progress_bar=st.progress(0)
+                                    )
                                     
                                     # Evaluate
                                     evaluator = RAGEvaluator()
@@ -853,7 +1178,7 @@ def main():
                         "How is cardiovascular disease prevented?"
                     ]
                     
-                    pipeline = load_rag_pipeline(model_path if model_exists else "demo_mode", index_path)
+                    pipeline = load_rag_pipeline(model_path if model_exists else "demo_mode", index_path, retrieval_mode)
                     if pipeline:
                         st.success("✅ Quick test completed!")
                         st.info("💡 Use Manual Input mode for full evaluation with reference answers")
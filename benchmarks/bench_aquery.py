@@ -0,0 +1,82 @@
+"""Load test: aquery throughput and latency as concurrent clients increase.
+
+Usage: python benchmarks/bench_aquery.py INDEX_PATH MODEL_PATH [requests_per_client]
+
+Caches are disabled so every request embeds, searches and generates. With
+MODEL_PATH missing, answers are extractive and the test measures retrieval
+alone.
+"""
+
+import asyncio
+import csv
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag_pipeline import RAGPipeline
+
+DATASET = Path(__file__).parent.parent / "data" / "evaluation_dataset.csv"
+CLIENT_COUNTS = (1, 2, 4, 8, 16)
+
+
+def load_questions() -> list:
+    """Questions of the bundled evaluation dataset."""
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        return [row["question"] for row in csv.DictReader(f)]
+
+
+async def run_clients(pipeline: RAGPipeline, questions: list, clients: int, per_client: int) -> dict:
+    """Each client sends its requests back to back; returns throughput and latency percentiles."""
+    latencies = []
+
+    async def client(offset: int) -> None:
+        for idx in range(per_client):
+            started = time.perf_counter()
+            await pipeline.aquery(questions[(offset + idx) % len(questions)])
+            latencies.append(time.perf_counter() - started)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'queries_per_second': len(latencies) / elapsed,
+        'p50_latency_s': latencies[len(latencies) // 2],
+        'p95_latency_s': latencies[int(0.95 * (len(latencies) - 1))]
+    }
+
+
+def bench_aquery(index_path: str, model_path: str, per_client: int = 8) -> None:
+    """Print throughput and latency for each client count, against sequential `query` calls."""
+    pipeline = RAGPipeline(
+        model_path=model_path,
+        index_path=index_path,
+        semantic_cache_threshold=None,
+        response_cache_path=None,
+        usage_log_path=None
+    )
+    pipeline.load_index(warm_llm=True)
+    questions = load_questions()
+
+    # Warm up the embedder, the index pages and the LLM
+    pipeline.query(questions[0])
+    start = time.perf_counter()
+    for idx in range(per_client):
+        pipeline.query(questions[idx % len(questions)])
+    print(f"sequential query(): {per_client / (time.perf_counter() - start):6.2f} queries/s")
+
+    for clients in CLIENT_COUNTS:
+        result = asyncio.run(run_clients(pipeline, questions, clients, per_client))
+        print(
+            f"{clients:3d} clients: {result['queries_per_second']:6.2f} queries/s  "
+            f"p50 {result['p50_latency_s']:6.2f} s  p95 {result['p95_latency_s']:6.2f} s"
+        )
+    pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(__doc__)
+    bench_aquery(sys.argv[1], sys.argv[2], per_client=int(sys.argv[3]) if len(sys.argv) > 3 else 8)
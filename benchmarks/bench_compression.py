@@ -0,0 +1,67 @@
+"""Faithfulness impact of context compression on the evaluation dataset.
+
+Usage: python benchmarks/bench_compression.py INDEX_PATH MODEL_PATH [compression_ratio]
+
+Each question is answered twice, with the full retrieved context and with
+the compressed one, and RAGEvaluator.compare_context_compression reports
+faithfulness for both along with the fraction of context kept. Caches are
+disabled so every answer is generated. With MODEL_PATH missing, answers are
+extractive.
+"""
+
+import csv
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.evaluation import RAGEvaluator
+from src.rag_pipeline import RAGPipeline
+
+DATASET = Path(__file__).parent.parent / "data" / "evaluation_dataset.csv"
+
+
+def load_questions() -> list:
+    """Questions of the bundled evaluation dataset."""
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        return [row["question"] for row in csv.DictReader(f)]
+
+
+def bench_compression(index_path: str, model_path: str, compression_ratio: float = 0.5) -> None:
+    """Print the compression report for the dataset's questions."""
+    pipeline = RAGPipeline(
+        model_path=model_path,
+        index_path=index_path,
+        compression_ratio=compression_ratio,
+        semantic_cache_threshold=None,
+        response_cache_path=None,
+        usage_log_path=None
+    )
+    pipeline.load_index(warm_llm=True)
+    questions = load_questions()
+
+    full = pipeline.query_batch(questions, compress=False)
+    compressed = pipeline.query_batch(questions, compress=True)
+    answered = [
+        (f, c) for f, c in zip(full, compressed)
+        if 'error' not in f and 'error' not in c
+    ]
+    report = RAGEvaluator().compare_context_compression(
+        full_answers=[f['answer'] for f, _ in answered],
+        full_contexts=[f.get('context', '') for f, _ in answered],
+        compressed_answers=[c['answer'] for _, c in answered],
+        compressed_contexts=[c.get('context', '') for _, c in answered]
+    )
+    print(f"compression_ratio {compression_ratio}, {report['num_questions']} of {len(questions)} questions answered")
+    for name in (
+        'full_faithfulness', 'compressed_faithfulness',
+        'compressed_faithfulness_to_full_context', 'faithfulness_delta', 'mean_context_kept_ratio'
+    ):
+        print(f"{name:42s} {report[name]:7.3f}")
+    pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(__doc__)
+    bench_compression(sys.argv[1], sys.argv[2], compression_ratio=float(sys.argv[3]) if len(sys.argv) > 3 else 0.5)
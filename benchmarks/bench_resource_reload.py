@@ -0,0 +1,74 @@
+"""Reload time after an index rebuild: whole pipeline versus index only.
+
+Usage: python benchmarks/bench_resource_reload.py INDEX_PATH MODEL_PATH [repeats]
+
+"Before" rebuilds what clearing every cached resource used to: a new
+pipeline with its embedder, index and LLM, ready to answer. "After" reloads
+the index alone through IndexCache, as the app does once an index is
+rebuilt, and separately the LLM alone, as it does when the model changes.
+"""
+
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.collection_manager import IndexCache
+from src.embeddings import Embedder
+from src.generation import AnswerGenerator
+from src.rag_pipeline import RAGPipeline
+
+
+def timed(action) -> float:
+    """Seconds taken by a call."""
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+def reload_everything(index_path: str, model_path: str) -> None:
+    """Build a pipeline from nothing and wait for its LLM."""
+    pipeline = RAGPipeline(
+        model_path=model_path,
+        index_path=index_path,
+        semantic_cache_threshold=None,
+        response_cache_path=None,
+        usage_log_path=None
+    )
+    pipeline.load_index(warm_llm=True)
+    pipeline.generator.wait_until_ready()
+    pipeline.shutdown()
+
+
+def reload_llm(model_path: str) -> None:
+    """Load and warm up the LLM alone."""
+    generator = AnswerGenerator(model_path=model_path)
+    generator.start_background_load()
+    generator.wait_until_ready()
+    generator.shutdown()
+
+
+def bench_resource_reload(index_path: str, model_path: str, repeats: int = 3) -> None:
+    """Print the median reload time of each strategy."""
+    cache = IndexCache(Embedder())
+    cache.get(index_path)
+
+    def reload_index() -> None:
+        cache.invalidate(index_path)
+        cache.get(index_path)
+
+    results = {
+        'before: embedder + index + LLM': [timed(lambda: reload_everything(index_path, model_path)) for _ in range(repeats)],
+        'after:  index only': [timed(reload_index) for _ in range(repeats)],
+        'after:  LLM only': [timed(lambda: reload_llm(model_path)) for _ in range(repeats)]
+    }
+    for name, seconds in results.items():
+        print(f"{name:32s} {statistics.median(seconds):7.2f} s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(__doc__)
+    bench_resource_reload(sys.argv[1], sys.argv[2], repeats=int(sys.argv[3]) if len(sys.argv) > 3 else 3)
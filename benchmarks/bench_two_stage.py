@@ -0,0 +1,71 @@
+"""Benchmark coarse-to-fine (document, then chunk) search against flat search."""
+
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.embeddings.centroid_index import DocumentCentroidIndex
+from src.retrieval.metadata_filter import IDFilter
+
+
+def make_corpus(num_docs: int, chunks_per_doc: int, dim: int, seed: int = 0):
+    """Synthetic corpus: each document's chunks scatter around a topic vector."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((num_docs, dim)).astype(np.float32)
+    vectors = np.repeat(topics, chunks_per_doc, axis=0)
+    vectors += 1.5 * rng.standard_normal(vectors.shape).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    sources = [f"doc_{i}.pdf" for i in range(num_docs) for _ in range(chunks_per_doc)]
+    return vectors, sources
+
+
+def make_queries(vectors: np.ndarray, num_queries: int, seed: int = 1) -> np.ndarray:
+    """Queries near random chunks."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(vectors), num_queries)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((num_queries, vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def bench_two_stage(
+    num_docs: int = 2000,
+    chunks_per_doc: int = 50,
+    dim: int = 384,
+    k: int = 5,
+    top_ds=(10, 50, 200),
+    num_queries: int = 200
+) -> None:
+    """Print recall@k against flat search and mean latency per query."""
+    vectors, sources = make_corpus(num_docs, chunks_per_doc, dim)
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    centroids = DocumentCentroidIndex.build(index, sources)
+    queries = make_queries(vectors, num_queries)
+
+    # Single-query searches, as the pipeline issues them
+    start = time.perf_counter()
+    exact = [index.search(query[None, :], k)[1][0] for query in queries]
+    flat_ms = (time.perf_counter() - start) * 1000 / num_queries
+    print(f"{len(vectors)} chunks, {num_docs} documents, dim={dim}, k={k}")
+    print(f"  flat            recall@{k}=1.000  {flat_ms:7.3f} ms/query")
+
+    for top_d in top_ds:
+        hits = 0
+        start = time.perf_counter()
+        for query, truth in zip(queries, exact):
+            documents = centroids.search(query, top_d)
+            id_filter = IDFilter(centroids.chunk_mask([code for code, _ in documents]))
+            _, found = index.search(query[None, :], k, params=id_filter.params)
+            hits += len(set(found[0]) & set(truth))
+        elapsed_ms = (time.perf_counter() - start) * 1000 / num_queries
+        print(f"  two-stage D={top_d:<4d} recall@{k}={hits / (k * num_queries):.3f}  {elapsed_ms:7.3f} ms/query")
+
+
+if __name__ == "__main__":
+    bench_two_stage()
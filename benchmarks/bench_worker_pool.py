@@ -0,0 +1,92 @@
+"""Find the workers x threads split of the CPUs with the best answer throughput.
+
+Usage: python benchmarks/bench_worker_pool.py models/llama-3-8b.Q4_K_M.gguf [requests]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.generation import AnswerGenerator, GenerationScheduler, PRIORITY_BATCH
+
+CONTEXT = (
+    "[1] Source: guideline.pdf, Page 3\n"
+    "Metformin is the preferred initial pharmacologic agent for type 2 diabetes. "
+    "It lowers hepatic glucose production and rarely causes hypoglycemia. "
+    "Common adverse effects are gastrointestinal and usually transient."
+)
+QUESTIONS = [
+    "What is the first-line medication for type 2 diabetes?",
+    "How does metformin lower blood glucose?",
+    "What are the common side effects of metformin?",
+    "Does metformin cause hypoglycemia?",
+]
+
+
+def candidate_splits(cpus: int):
+    """Splits (workers, threads) using all CPUs, from one big instance to many small ones."""
+    yield 1, cpus
+    # Each worker holds its own KV cache, so stop at two threads per worker
+    workers = 2
+    while cpus // workers >= 2:
+        yield workers, cpus // workers
+        workers *= 2
+
+
+def bench_split(model_path: str, workers: int, threads: int, num_requests: int, max_tokens: int) -> dict:
+    """Answers per second and latency with all requests queued at once."""
+    generator = AnswerGenerator(
+        model_path=model_path,
+        n_threads=threads,
+        max_tokens=max_tokens,
+        n_workers=workers
+    )
+    if not generator.load_model() or (generator.pool is not None and not generator.pool.wait_ready()):
+        raise RuntimeError(f"Could not load {model_path}")
+    scheduler = GenerationScheduler(generator, max_queue_size=num_requests, concurrency=workers)
+
+    start = time.perf_counter()
+    tickets = [
+        scheduler.submit(QUESTIONS[idx % len(QUESTIONS)], CONTEXT, priority=PRIORITY_BATCH)
+        for idx in range(num_requests)
+    ]
+    latencies = []
+    for ticket in tickets:
+        ticket.result()
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start
+
+    scheduler.shutdown()
+    generator.shutdown()
+    latencies.sort()
+    return {
+        'answers_per_second': num_requests / elapsed,
+        'mean_latency_s': sum(latencies) / len(latencies),
+        'p95_latency_s': latencies[int(0.95 * (len(latencies) - 1))]
+    }
+
+
+def bench_worker_pool(model_path: str, num_requests: int = 16, max_tokens: int = 64) -> None:
+    """Print throughput for each split and the best one."""
+    cpus = os.cpu_count() or 1
+    print(f"{cpus} CPUs, {num_requests} concurrent requests, max_tokens={max_tokens}")
+    results = {}
+    for workers, threads in candidate_splits(cpus):
+        result = bench_split(model_path, workers, threads, num_requests, max_tokens)
+        results[(workers, threads)] = result
+        print(
+            f"  {workers:3d} workers x {threads:3d} threads: "
+            f"{result['answers_per_second']:6.2f} answers/s  "
+            f"mean {result['mean_latency_s']:6.1f} s  p95 {result['p95_latency_s']:6.1f} s"
+        )
+    best = max(results, key=lambda split: results[split]['answers_per_second'])
+    print(f"Best: LLM_WORKERS={best[0]} LLM_N_THREADS={best[1]}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    bench_worker_pool(sys.argv[1], num_requests=int(sys.argv[2]) if len(sys.argv) > 2 else 16)
@@ -32,15 +32,64 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 
 # Retrieval configuration
 RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # "dense" or "hybrid" (dense + BM25)
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")  # e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"; empty disables
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS")) if os.getenv("RERANK_BUDGET_MS") else None
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA")) if os.getenv("MMR_LAMBDA") else None  # enables MMR diversity selection
+MAX_CHUNKS_PER_PAGE = int(os.getenv("MAX_CHUNKS_PER_PAGE")) if os.getenv("MAX_CHUNKS_PER_PAGE") else None
+# Minimum cosine similarity (-1..1) for dense hits; uses FAISS range search
 SCORE_THRESHOLD = float(os.getenv("SCORE_THRESHOLD", "0.0")) if os.getenv("SCORE_THRESHOLD") else None
+# Neighbouring chunks added around each hit (small-to-big retrieval; pair with a smaller CHUNK_SIZE)
+CHUNK_EXPAND_WINDOW = int(os.getenv("CHUNK_EXPAND_WINDOW", "0"))
+# Documents selected by centroid similarity before the chunk search (unset searches all chunks)
+COARSE_TOP_D = int(os.getenv("COARSE_TOP_D")) if os.getenv("COARSE_TOP_D") else None
+
+# Cache configuration
+# Cosine similarity at which a previous answer is reused, e.g. "0.95"; empty disables the semantic cache
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD")) if os.getenv("SEMANTIC_CACHE_THRESHOLD") else None
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", str(MODELS_DIR / "response_cache.sqlite"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
 
 # Generation configuration
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "512"))
 LLM_N_CTX = int(os.getenv("LLM_N_CTX", "4096"))
 LLM_N_THREADS = int(os.getenv("LLM_N_THREADS", "0")) if os.getenv("LLM_N_THREADS") else None
+# Model instances in separate processes; LLM_N_THREADS is then per instance
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+# Load and warm up the LLM in the background when the index loads
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+# Queries during the background load: "wait" for it or "fallback" to extractive answers
+LLM_NOT_READY_POLICY = os.getenv("LLM_NOT_READY_POLICY", "wait")
+LLM_READY_TIMEOUT_S = float(os.getenv("LLM_READY_TIMEOUT_S")) if os.getenv("LLM_READY_TIMEOUT_S") else None
+# File persisting the KV state of the fixed prompt prefix (unset keeps it in memory only)
+PREFIX_CACHE_PATH = os.getenv("PREFIX_CACHE_PATH") or None
+# Optional cap on retrieved-context tokens in the prompt (n_ctx - max_tokens always applies)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET")) if os.getenv("CONTEXT_TOKEN_BUDGET") else None
+# Fraction of retrieved context kept by sentence-level compression (unset disables it)
+CONTEXT_COMPRESSION_RATIO = float(os.getenv("CONTEXT_COMPRESSION_RATIO")) if os.getenv("CONTEXT_COMPRESSION_RATIO") else None
 
 # Logging configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Rotating JSONL log of per-response token and timing usage (empty disables it)
+USAGE_LOG_PATH = os.getenv("USAGE_LOG_PATH", str(BASE_DIR / "logs" / "usage.jsonl")) or None
+
+
+# HTTP query service (serve.py)
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+# Pre-forked worker processes; each maps the same FAISS index file read-only
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "1"))
+# When set, the Streamlit app queries this service instead of loading its own pipeline
+RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL") or None
+
+# Collections: named indexes (e.g. one per specialty) sharing one embedder and LLM
+COLLECTIONS_DIR = os.getenv("COLLECTIONS_DIR", str(MODELS_DIR / "collections"))
+# Unload idle collections, least recently used first, beyond this many MB of index (unset never unloads)
+COLLECTION_MEMORY_BUDGET_MB = float(os.getenv("COLLECTION_MEMORY_BUDGET_MB")) if os.getenv("COLLECTION_MEMORY_BUDGET_MB") else None
 
+# Background ingestion: job records (progress, state) and worker logs
+INGESTION_JOBS_DIR = os.getenv("INGESTION_JOBS_DIR", str(BASE_DIR / "logs" / "ingestion_jobs"))
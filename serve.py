@@ -0,0 +1,65 @@
+"""Run the HTTP query service over the configured index and model.
+
+Usage: python serve.py [--host HOST] [--port PORT] [--workers N]
+
+Endpoints: GET /health, GET /sources, POST /query, POST /query_batch and
+POST /retrieve (JSON bodies). Settings not given on the command line come
+from config.py and the environment.
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+import config
+from src.rag_pipeline import RAGPipeline
+from src.service import serve
+
+logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+
+
+def build_pipeline() -> RAGPipeline:
+    """Pipeline from the configuration, with its index memory-mapped and the LLM warming up."""
+    pipeline = RAGPipeline(
+        model_path=config.LLAMA_MODEL_PATH,
+        index_path=config.FAISS_INDEX_PATH,
+        embedding_model=config.EMBEDDING_MODEL,
+        retrieval_k=config.RETRIEVAL_K,
+        retrieval_mode=config.RETRIEVAL_MODE,
+        score_threshold=config.SCORE_THRESHOLD,
+        rerank_model=config.RERANK_MODEL or None,
+        rerank_fetch_k=config.RERANK_FETCH_K,
+        rerank_budget_ms=config.RERANK_BUDGET_MS,
+        mmr_lambda=config.MMR_LAMBDA,
+        max_chunks_per_page=config.MAX_CHUNKS_PER_PAGE,
+        semantic_cache_threshold=config.SEMANTIC_CACHE_THRESHOLD,
+        semantic_cache_size=config.SEMANTIC_CACHE_SIZE,
+        response_cache_path=config.RESPONSE_CACHE_PATH,
+        response_cache_ttl=config.RESPONSE_CACHE_TTL,
+        context_token_budget=config.CONTEXT_TOKEN_BUDGET,
+        compression_ratio=config.CONTEXT_COMPRESSION_RATIO,
+        expand_window=config.CHUNK_EXPAND_WINDOW,
+        coarse_top_d=config.COARSE_TOP_D,
+        prefix_cache_path=config.PREFIX_CACHE_PATH,
+        llm_workers=config.LLM_WORKERS,
+        llm_threads_per_worker=config.LLM_N_THREADS,
+        llm_not_ready_policy=config.LLM_NOT_READY_POLICY,
+        llm_ready_timeout_s=config.LLM_READY_TIMEOUT_S,
+        usage_log_path=config.USAGE_LOG_PATH,
+        mmap_index=True
+    )
+    pipeline.load_index(warm_llm=config.LLM_WARMUP)
+    return pipeline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve RAG queries over HTTP")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVICE_WORKERS)
+    args = parser.parse_args()
+    serve(build_pipeline, host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,6 @@
+"""Caching module for answers to repeated questions."""
+
+from .semantic_cache import SemanticCache
+from .response_cache import ResponseCache, normalize_question
+
+__all__ = ["SemanticCache", "ResponseCache", "normalize_question"]
@@ -0,0 +1,164 @@
+"""Exact-match response cache persisted in SQLite."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize case, whitespace and trailing punctuation of a question."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class ResponseCache:
+    """Persistent exact-match cache of pipeline responses with TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        max_entries: int = 10000
+    ):
+        """
+        Initialize the response cache.
+
+        Args:
+            db_path: Path to the SQLite database file (created on first use)
+            ttl_seconds: Maximum age of an entry (None keeps entries forever)
+            max_entries: Maximum entries; least recently used are evicted
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(question: str, k: int, **components) -> str:
+        """
+        Build a cache key for a question.
+
+        Args:
+            question: User question (normalized before hashing)
+            k: Number of documents retrieved
+            **components: Everything else that changes the answer, e.g. index
+                version, embedding model, prompt template hash, LLM parameters
+
+        Returns:
+            Hex digest identifying the request
+        """
+        payload = {'question': normalize_question(question), 'k': k, **components}
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily; caller holds the lock."""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            # WAL lets several server processes share the cache file
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Key from `make_key`
+
+        Returns:
+            Cached response with 'cache' metadata, or None
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+
+        response = json.loads(row[0])
+        response['cache'] = {'type': 'exact', 'age_seconds': now - row[1]}
+        return response
+
+    def put(self, key: str, response: Dict) -> None:
+        """
+        Store a response, evicting expired and least recently used entries.
+
+        Args:
+            key: Key from `make_key`
+            response: JSON-serializable response dictionary
+        """
+        encoded = json.dumps(response, default=str)
+        now = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, encoded, now, now)
+            )
+            if self.ttl_seconds is not None:
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+            overflow = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+            conn.commit()
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Hit/miss counters and entry count for monitoring."""
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
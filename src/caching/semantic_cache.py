@@ -0,0 +1,156 @@
+"""Semantic answer cache keyed by question embeddings."""
+
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Returns cached responses for questions that are near-duplicates of earlier ones."""
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 1000,
+        search_k: int = 4
+    ):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            similarity_threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum cached responses; least recently used are evicted
+            search_k: Neighbouring questions checked per lookup
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.search_k = search_k
+        self.index_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+
+        self._index: Optional[faiss.IndexIDMap2] = None
+        self._entries: "OrderedDict[int, Tuple[int, Optional[str], Dict]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(question_vector: List[float]) -> np.ndarray:
+        """Convert an embedding to a normalized (1, dim) float32 matrix."""
+        vector = np.array([question_vector], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _check_version(self, index_version: Optional[str]) -> None:
+        """Drop all entries when the underlying document index changed."""
+        if index_version != self.index_version:
+            if self._entries:
+                logger.info("Document index changed; clearing semantic cache")
+            self._clear()
+            self.index_version = index_version
+
+    def _clear(self) -> None:
+        """Remove all entries; caller holds the lock."""
+        self._entries.clear()
+        if self._index is not None:
+            self._index.reset()
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._clear()
+
+    def lookup(
+        self,
+        question_vector: List[float],
+        k: int,
+        index_version: Optional[str],
+        generator: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Find a cached response for a near-duplicate question.
+
+        Args:
+            question_vector: Embedding of the new question
+            k: Number of retrieved documents the response must have used
+            index_version: Version of the document index being queried
+            generator: Identity of the answer generator (e.g. its cache
+                fingerprint) the response must come from
+
+        Returns:
+            Copy of the cached response with 'cache' metadata, or None
+        """
+        with self._lock:
+            self._check_version(index_version)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            similarities, entry_ids = self._index.search(self._normalize(question_vector), self.search_k)
+            for similarity, entry_id in zip(similarities[0], entry_ids[0]):
+                if entry_id == -1 or similarity < self.similarity_threshold:
+                    break
+                entry_k, entry_generator, response = self._entries[int(entry_id)]
+                if entry_k != k or entry_generator != generator:
+                    continue
+
+                self._entries.move_to_end(int(entry_id))
+                self.hits += 1
+                cached = copy.deepcopy(response)
+                cached['cache'] = {'type': 'semantic', 'similarity': float(similarity), 'question': response['question']}
+                return cached
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        question_vector: List[float],
+        k: int,
+        index_version: Optional[str],
+        response: Dict,
+        generator: Optional[str] = None
+    ) -> None:
+        """
+        Cache a response for a question.
+
+        Args:
+            question_vector: Embedding of the question
+            k: Number of retrieved documents used for the response
+            index_version: Version of the document index that was queried
+            response: Response dictionary to cache
+            generator: Identity of the answer generator that produced it
+        """
+        with self._lock:
+            self._check_version(index_version)
+            vector = self._normalize(question_vector)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (k, generator, copy.deepcopy(response))
+
+            if len(self._entries) > self.max_entries:
+                evicted_id, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([evicted_id], dtype=np.int64))
+
+    def get_stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring."""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,515 @@
+"""Named indexes (collections) sharing one embedder and LLM, loaded on demand."""
+
+import logging
+import re
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+from langchain.schema import Document
+
+from .embeddings import Embedder, VectorIndexer
+from .evaluation.usage_log import UsageLog
+from .generation import AnswerGenerator, GenerationScheduler, PRIORITY_INTERACTIVE
+from .rag_pipeline import RAGPipeline
+from .retrieval import CrossEncoderReranker
+from .retrieval.retriever import reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class IndexCache:
+    """
+    Loaded indexes by path, shared by every pipeline built over them.
+
+    An index reloads on its own when its saved version changes (e.g. after
+    a rebuild) or when invalidated, without touching the embedder or the
+    LLM. When the loaded indexes exceed the memory budget, the least
+    recently used ones no query is using are unloaded.
+    """
+
+    def __init__(self, embedder: Embedder, memory_budget_mb: Optional[float] = None, mmap: bool = False):
+        """
+        Initialize the cache; no index is loaded yet.
+
+        Args:
+            embedder: Embedder the indexes were built with
+            memory_budget_mb: Optional limit on the loaded indexes' size,
+                estimated from their files (None never unloads)
+            mmap: Memory-map the FAISS vectors read-only
+        """
+        self.embedder = embedder
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024 if memory_budget_mb is not None else None
+        self.mmap = mmap
+        # Loaded indexes, least recently used first, and their sizes
+        self._entries: "OrderedDict[str, VectorIndexer]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._load_ms: Dict[str, float] = {}
+        self._in_use: Counter = Counter()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._unload_listeners: List[weakref.WeakMethod] = []
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(index_path: Union[str, Path]) -> str:
+        """Cache key of an index path, the same however the path is spelled."""
+        return str(Path(index_path).resolve())
+
+    def add_unload_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        Call a bound method with the key of every index unloaded or replaced.
+
+        Held weakly, so listening does not keep the listener alive.
+        """
+        with self._lock:
+            self._unload_listeners.append(weakref.WeakMethod(callback))
+
+    def get(self, index_path: Union[str, Path]) -> VectorIndexer:
+        """
+        A loaded index, loading or reloading it if needed.
+
+        An index unloaded later keeps working for callers still holding it.
+        """
+        with self.checkout([index_path]) as indexers:
+            return indexers[0]
+
+    @contextmanager
+    def checkout(self, index_paths: List[Union[str, Path]]) -> Iterator[List[VectorIndexer]]:
+        """Loaded indexes at the given paths, kept from eviction while in use."""
+        indexers, counted = [], []
+        try:
+            for index_path in index_paths:
+                key = self.key(index_path)
+                with self._lock:
+                    # Counted before loading, so a concurrent eviction skips it
+                    self._in_use[key] += 1
+                    counted.append(key)
+                indexers.append(self._current(key))
+            self._evict()
+            yield indexers
+        finally:
+            with self._lock:
+                for key in counted:
+                    self._in_use[key] -= 1
+                    if self._in_use[key] <= 0:
+                        del self._in_use[key]
+
+    def _current(self, key: str) -> VectorIndexer:
+        """The loaded index at a key, (re)loading it once however many queries ask meanwhile."""
+        path = Path(key)
+        if not path.exists():
+            self.invalidate(key)
+            raise ValueError(f"No index at {path}")
+        saved_version = VectorIndexer.read_index_version(path)
+        with self._lock:
+            indexer = self._entries.get(key)
+            if indexer is not None and indexer.index_version == saved_version:
+                self._entries.move_to_end(key)
+                return indexer
+            lock = self._load_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                indexer = self._entries.get(key)
+                if indexer is not None and indexer.index_version == saved_version:
+                    return indexer
+            start = time.perf_counter()
+            indexer = VectorIndexer(embeddings=self.embedder.embeddings, index_path=key)
+            indexer.load_index(mmap=self.mmap)
+            load_ms = (time.perf_counter() - start) * 1000
+            size = sum(entry.stat().st_size for entry in path.iterdir() if entry.is_file())
+            with self._lock:
+                replaced = key in self._entries
+                self._entries[key] = indexer
+                self._entries.move_to_end(key)
+                self._sizes[key] = size
+                self._load_ms[key] = load_ms
+                self.loads += 1
+            logger.info(f"{'Reloaded' if replaced else 'Loaded'} index {key} ({size / 1e6:.1f} MB) in {load_ms:.0f} ms")
+            if replaced:
+                self._notify_unloaded(key)
+            return indexer
+
+    def _evict(self) -> None:
+        """Unload least recently used idle indexes until the loaded ones fit the budget."""
+        if self.memory_budget_bytes is None:
+            return
+        evicted = []
+        with self._lock:
+            for key in list(self._entries):
+                if sum(self._sizes.values()) <= self.memory_budget_bytes:
+                    break
+                if self._in_use[key] == 0:
+                    del self._entries[key]
+                    self._sizes.pop(key)
+                    self.evictions += 1
+                    evicted.append(key)
+            over_budget = sum(self._sizes.values()) > self.memory_budget_bytes
+        for key in evicted:
+            logger.info(f"Unloaded idle index {key} to stay within the memory budget")
+            self._notify_unloaded(key)
+        if over_budget:
+            logger.warning("Indexes in use exceed the memory budget")
+
+    def invalidate(self, index_path: Union[str, Path]) -> None:
+        """Unload an index, so its next use reloads it."""
+        key = self.key(index_path)
+        with self._lock:
+            unloaded = self._entries.pop(key, None) is not None
+            self._sizes.pop(key, None)
+        if unloaded:
+            self._notify_unloaded(key)
+
+    def _notify_unloaded(self, key: str) -> None:
+        """Tell the listeners an index was unloaded or replaced."""
+        with self._lock:
+            self._unload_listeners = [listener for listener in self._unload_listeners if listener() is not None]
+            callbacks = [listener() for listener in self._unload_listeners]
+        for callback in callbacks:
+            if callback is not None:
+                callback(key)
+
+    def get_stats(self) -> Dict[str, any]:
+        """Loaded index keys (least recently used first), their load times and size against the budget."""
+        with self._lock:
+            return {
+                'loaded': list(self._entries),
+                'load_ms': {key: self._load_ms[key] for key in self._entries},
+                'memory_bytes': sum(self._sizes.values()),
+                'memory_budget_bytes': self.memory_budget_bytes,
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
+
+
+class CollectionManager:
+    """
+    Serves many indexes, e.g. one per specialty, from one process.
+
+    Every collection's pipeline shares the manager's embedder, reranker,
+    answer generator, scheduler and usage log, so adding a collection costs
+    only its index. Indexes come from an IndexCache, which loads them on first
+    use and unloads idle ones over its memory budget; managers for
+    different models can share one. A query targets one collection or fans
+    out across several.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        collections_dir: str = "models/collections",
+        memory_budget_mb: Optional[float] = None,
+        embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        prefix_cache_path: Optional[str] = None,
+        generation_queue_size: int = 32,
+        llm_workers: int = 1,
+        llm_threads_per_worker: Optional[int] = None,
+        usage_log_path: Optional[str] = None,
+        embedder: Optional[Embedder] = None,
+        generator: Optional[AnswerGenerator] = None,
+        scheduler: Optional[GenerationScheduler] = None,
+        usage_log: Optional[UsageLog] = None,
+        index_cache: Optional[IndexCache] = None,
+        **pipeline_options
+    ):
+        """
+        Initialize the manager; no index is loaded yet.
+
+        Args:
+            model_path: Path to Llama-3 GGUF model
+            collections_dir: Directory holding one index directory per
+                collection, named after it
+            memory_budget_mb: Optional limit on the loaded indexes' size,
+                estimated from their files (None never unloads); ignored
+                with a shared index_cache
+            embedding_model: HuggingFace embedding model name
+            prefix_cache_path: Optional file persisting the prompt prefix KV state
+            generation_queue_size: Maximum LLM requests waiting for the model
+            llm_workers: Model instances in separate processes
+            llm_threads_per_worker: Optional threads per model instance
+            usage_log_path: Optional rotating JSONL usage log shared by all
+                collections (None disables it)
+            embedder: Optional embedder shared beyond this manager
+            generator: Optional answer generator shared beyond this manager
+                (the LLM settings above are then its own)
+            scheduler: Optional scheduler over the shared generator
+            usage_log: Optional usage log shared beyond this manager
+            index_cache: Optional index cache shared beyond this manager
+            **pipeline_options: Further RAGPipeline settings applied to
+                every collection (retrieval_mode, rerank_model, ...)
+
+        Shared components are not shut down with the manager.
+        """
+        self.model_path = model_path
+        self.collections_dir = Path(collections_dir)
+        self.pipeline_options = pipeline_options
+        self.embedder = embedder or Embedder(model_name=embedding_model)
+        self._owns_generation = generator is None
+        self.generator = generator or AnswerGenerator(
+            model_path=model_path,
+            n_threads=llm_threads_per_worker,
+            prefix_cache_path=prefix_cache_path,
+            n_workers=llm_workers
+        )
+        self.scheduler = scheduler or GenerationScheduler(
+            self.generator,
+            max_queue_size=generation_queue_size,
+            concurrency=llm_workers
+        )
+        self._owns_usage_log = usage_log is None
+        self.usage_log = usage_log or (UsageLog(usage_log_path) if usage_log_path else None)
+        rerank_model = pipeline_options.get('rerank_model')
+        self.reranker = CrossEncoderReranker(
+            model_name=rerank_model,
+            latency_budget_ms=pipeline_options.get('rerank_budget_ms')
+        ) if rerank_model else None
+        self.index_cache = index_cache or IndexCache(self.embedder, memory_budget_mb=memory_budget_mb)
+        self.index_cache.add_unload_listener(self._forget_index)
+        # Collections registered by path, in addition to those in collections_dir
+        self._paths: Dict[str, Path] = {}
+        # Pipelines over the currently loaded index of each collection
+        self._pipelines: Dict[str, RAGPipeline] = {}
+        # Queries using each pipeline; one dropped meanwhile is shut down after the last
+        self._checked_out: Counter = Counter()
+        self._retired: List[RAGPipeline] = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, index_path: str) -> None:
+        """
+        Make an index outside collections_dir available as a collection.
+
+        Args:
+            name: Collection name
+            index_path: Index directory
+        """
+        self._check_name(name)
+        path = Path(index_path)
+        with self._lock:
+            if self._paths.get(name) != path:
+                self._paths[name] = path
+                self._pipelines.pop(name, None)
+
+    def list_collections(self) -> List[str]:
+        """Names of the collections whose indexes exist on disk."""
+        names = set(name for name, path in self._paths.items() if path.exists())
+        if self.collections_dir.is_dir():
+            names.update(
+                entry.name for entry in self.collections_dir.iterdir()
+                if (entry / "index.faiss").exists() and COLLECTION_NAME.match(entry.name)
+            )
+        return sorted(names)
+
+    def collection_path(self, name: str) -> Path:
+        """Index directory of a collection."""
+        self._check_name(name)
+        return self._paths.get(name, self.collections_dir / name)
+
+    @staticmethod
+    def _check_name(name: str) -> None:
+        """Reject names that are not plain directory names."""
+        if not COLLECTION_NAME.match(name):
+            raise ValueError(f"Invalid collection name {name!r}: use letters, digits, '_', '.' and '-'")
+
+    def get(self, name: str) -> RAGPipeline:
+        """
+        The pipeline of a collection, loading its index if needed.
+
+        A pipeline unloaded later keeps working for callers still holding it.
+
+        Args:
+            name: Collection name
+
+        Returns:
+            RAGPipeline over the collection's index
+        """
+        with self._checkout([name]) as pipelines:
+            return pipelines[0]
+
+    def _new_pipeline(self, name: str, indexer: Optional[VectorIndexer] = None) -> RAGPipeline:
+        """A pipeline over a collection's index, built on the shared components."""
+        return RAGPipeline(
+            model_path=self.model_path,
+            index_path=str(self.collection_path(name)),
+            embedder=self.embedder,
+            generator=self.generator,
+            scheduler=self.scheduler,
+            usage_log=self.usage_log,
+            usage_log_path=None,
+            indexer=indexer,
+            reranker=self.reranker,
+            **self.pipeline_options
+        )
+
+    @contextmanager
+    def _checkout(self, names: List[str]) -> Iterator[List[RAGPipeline]]:
+        """Pipelines of the named collections, their indexes kept from eviction while in use."""
+        paths = []
+        for name in names:
+            path = self.collection_path(name)
+            if not path.exists():
+                raise ValueError(f"Unknown collection {name!r}: no index at {path}")
+            paths.append(path)
+        with self.index_cache.checkout(paths) as indexers:
+            pipelines = []
+            with self._lock:
+                for name, indexer in zip(names, indexers):
+                    pipeline = self._pipelines.get(name)
+                    if pipeline is None or pipeline.indexer is not indexer:
+                        pipeline = self._pipelines[name] = self._new_pipeline(name, indexer)
+                    pipelines.append(pipeline)
+                self._checked_out.update(pipelines)
+            try:
+                yield pipelines
+            finally:
+                done = []
+                with self._lock:
+                    for pipeline in pipelines:
+                        self._checked_out[pipeline] -= 1
+                        if self._checked_out[pipeline] <= 0:
+                            del self._checked_out[pipeline]
+                            if pipeline in self._retired:
+                                self._retired.remove(pipeline)
+                                done.append(pipeline)
+                for pipeline in done:
+                    pipeline.shutdown()
+
+    def _forget_index(self, key: str) -> None:
+        """
+        Drop pipelines over an index the cache unloaded, so its memory is freed.
+
+        A pipeline still answering a query is shut down once that query ends.
+        """
+        with self._lock:
+            forgotten = [
+                self._pipelines.pop(name) for name in list(self._pipelines)
+                if IndexCache.key(self.collection_path(name)) == key
+            ]
+            idle = [pipeline for pipeline in forgotten if self._checked_out[pipeline] <= 0]
+            self._retired.extend(pipeline for pipeline in forgotten if pipeline not in idle)
+        for pipeline in idle:
+            pipeline.shutdown()
+
+    def unload(self, name: str) -> None:
+        """Unload a collection's index, e.g. after it was rebuilt elsewhere."""
+        self.index_cache.invalidate(self.collection_path(name))
+
+    def ingest(self, name: str, pdf_path: str) -> None:
+        """
+        Build (or rebuild) a collection's index from PDFs.
+
+        Args:
+            name: Collection name
+            pdf_path: Path to PDF file or directory
+        """
+        pipeline = self._new_pipeline(name)
+        try:
+            pipeline.ingest_documents(pdf_path)
+        finally:
+            pipeline.shutdown()
+        self.unload(name)
+
+    def query(
+        self,
+        question: str,
+        collections: Union[str, List[str], None] = None,
+        k: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout_s: Optional[float] = None,
+        deadline_ms: Optional[float] = None
+    ) -> Dict:
+        """
+        Answer a question from one collection or several.
+
+        Across several collections the question is embedded once, each
+        index is searched, and the result lists are merged by reciprocal
+        rank fusion (scores of different indexes are not comparable)
+        before one answer is generated; citations then name their
+        collection. Deadlines apply to single-collection queries only.
+
+        Args:
+            question: User question
+            collections: A collection name, a list of names, or None for all
+            k: Optional number of documents to retrieve in total
+            filters: Optional metadata filters applied in every collection
+            priority: Generation queue priority
+            timeout_s: Optional seconds within which generation must start
+            deadline_ms: Optional milliseconds within which the answer is due
+                (single collection only)
+
+        Returns:
+            Dictionary with answer, citations, and metadata, plus the
+            'collections' searched
+        """
+        if collections is None:
+            names = self.list_collections()
+        elif isinstance(collections, str):
+            names = [collections]
+        else:
+            names = list(dict.fromkeys(collections))
+        if not names:
+            raise ValueError("No collections to query")
+
+        with self._checkout(names) as pipelines:
+            if len(pipelines) == 1:
+                response = pipelines[0].query(
+                    question, k=k, filters=filters, priority=priority, timeout_s=timeout_s, deadline_ms=deadline_ms
+                )
+                return dict(response, collections=names)
+            if deadline_ms is not None:
+                raise ValueError("deadline_ms is only supported when querying one collection")
+
+            k = k if k is not None else pipelines[0].retrieval_k
+            question_embedding = self.embedder.embed_query(question)
+            ranked = {}
+            for name, pipeline in zip(names, pipelines):
+                documents = pipeline.retriever.retrieve(
+                    question, k=k, filters=filters, query_embedding=question_embedding
+                )
+                ranked[name] = [
+                    Document(page_content=doc.page_content, metadata={**doc.metadata, 'collection': name})
+                    for doc in documents
+                ]
+            fused = reciprocal_rank_fusion(
+                [[((name, rank), 0.0) for rank in range(len(documents))] for name, documents in ranked.items()],
+                k
+            )
+            documents = [ranked[name][rank] for (name, rank), _ in fused]
+            response = pipelines[0].answer_documents(
+                question, documents, question_embedding=question_embedding, priority=priority, timeout_s=timeout_s
+            )
+            return dict(response, collections=names)
+
+    def start_llm_load(self) -> None:
+        """Load and warm up the shared LLM in the background, if the model file exists."""
+        if Path(self.model_path).exists():
+            self.generator.start_background_load()
+
+    def get_stats(self) -> Dict[str, any]:
+        """Loaded collections (least recently used first), their load times, size against the budget, loads and evictions."""
+        stats = self.index_cache.get_stats()
+        with self._lock:
+            names = {IndexCache.key(self.collection_path(name)): name for name in self._pipelines}
+        stats['loaded'] = [names[key] for key in stats['loaded'] if key in names]
+        stats['load_ms'] = {names[key]: ms for key, ms in stats['load_ms'].items() if key in names}
+        return stats
+
+    def shutdown(self) -> None:
+        """Drop every collection's pipeline and stop the components this manager created."""
+        with self._lock:
+            pipelines = list(self._pipelines.values())
+            self._pipelines.clear()
+        for pipeline in pipelines:
+            pipeline.shutdown()
+        if self._owns_generation:
+            self.scheduler.shutdown()
+            self.generator.shutdown()
+        if self.usage_log is not None and self._owns_usage_log:
+            self.usage_log.close()
@@ -2,6 +2,8 @@
 
 from .embedder import Embedder
 from .indexer import VectorIndexer
+from .bm25_index import BM25Index
+from .centroid_index import DocumentCentroidIndex
 
-__all__ = ["Embedder", "VectorIndexer"]
+__all__ = ["Embedder", "VectorIndexer", "BM25Index", "DocumentCentroidIndex"]
 
@@ -0,0 +1,309 @@
+"""Compressed on-disk BM25 inverted index for keyword retrieval."""
+
+import json
+import logging
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keeps dosages ("500mg"), ICD codes ("e11.9") and hyphenated drug names intact
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+_TOKEN_SPLIT_PATTERN = re.compile(r"[.\-/]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize text for keyword matching.
+
+    Compound tokens such as "e11.9" or "metformin-induced" are emitted
+    whole and followed by their parts, so both exact and partial terms match.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of lowercase tokens
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _TOKEN_SPLIT_PATTERN.split(token) if part)
+    return tokens
+
+
+def _varint_lengths(values: np.ndarray) -> np.ndarray:
+    """Number of bytes each value occupies when varint-encoded."""
+    values = np.asarray(values, dtype=np.uint64)
+    num_bytes = np.ones(values.size, dtype=np.int64)
+    remainder = values >> np.uint64(7)
+    while remainder.any():
+        num_bytes += remainder > 0
+        remainder >>= np.uint64(7)
+    return num_bytes
+
+
+def _encode_varints(values: np.ndarray) -> np.ndarray:
+    """Encode non-negative integers as LEB128 varints (7 bits per byte)."""
+    values = np.asarray(values, dtype=np.uint64)
+    if values.size == 0:
+        return np.empty(0, dtype=np.uint8)
+
+    num_bytes = _varint_lengths(values)
+    starts = np.cumsum(num_bytes) - num_bytes
+    encoded = np.empty(int(num_bytes.sum()), dtype=np.uint8)
+    for byte_idx in range(int(num_bytes.max())):
+        mask = num_bytes > byte_idx
+        payload = (values[mask] >> np.uint64(7 * byte_idx)) & np.uint64(0x7F)
+        continuation = (num_bytes[mask] > byte_idx + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[mask] + byte_idx] = (payload | continuation).astype(np.uint8)
+    return encoded
+
+
+def _decode_varints(buffer: np.ndarray) -> np.ndarray:
+    """Decode a buffer of LEB128 varints into an int64 array."""
+    buffer = np.asarray(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(buffer < 0x80)
+    if ends.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+
+    values = np.zeros(ends.size, dtype=np.int64)
+    for byte_idx in range(int(lengths.max())):
+        mask = lengths > byte_idx
+        payload = buffer[starts[mask] + byte_idx].astype(np.int64) & 0x7F
+        values[mask] |= payload << (7 * byte_idx)
+    return values
+
+
+class BM25Index:
+    """
+    BM25 inverted index with varint-compressed postings.
+
+    Document IDs are positions in the FAISS index, so keyword and dense
+    results refer to the same chunks. Postings are stored as interleaved
+    (doc-id gap, term frequency) varints and are memory-mapped on load.
+    """
+
+    VOCAB_FILE = "bm25_vocab.json"
+    META_FILE = "bm25_meta.json"
+    OFFSETS_FILE = "bm25_offsets.npy"
+    DOC_FREQS_FILE = "bm25_doc_freqs.npy"
+    DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+    POSTINGS_FILE = "bm25_postings.bin"
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        offsets: np.ndarray,
+        doc_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        postings: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        """
+        Initialize the index from its components.
+
+        Args:
+            vocabulary: Mapping of term to term ID
+            offsets: Byte offset of each term's postings (length = terms + 1)
+            doc_freqs: Number of documents containing each term
+            doc_lengths: Token count of each document
+            postings: Varint-encoded postings buffer
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_freqs = doc_freqs
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(doc_lengths)
+        self.avg_doc_length = float(doc_lengths.mean()) if self.num_docs else 0.0
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Build an index over a list of texts.
+
+        Args:
+            texts: Document texts; the list position becomes the document ID
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+
+        Returns:
+            BM25Index instance
+        """
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_postings.setdefault(term, []).append((doc_id, freq))
+
+        terms = sorted(term_postings)
+        vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        doc_freqs = np.array([len(term_postings[t]) for t in terms], dtype=np.int32)
+
+        # Flatten to interleaved (gap, tf) pairs; doc IDs are already ascending
+        values = np.empty(2 * int(doc_freqs.sum()), dtype=np.int64)
+        position = 0
+        for term in terms:
+            pairs = np.array(term_postings[term], dtype=np.int64)
+            gaps = np.diff(pairs[:, 0], prepend=0)
+            values[position:position + 2 * len(pairs):2] = gaps
+            values[position + 1:position + 2 * len(pairs):2] = pairs[:, 1]
+            position += 2 * len(pairs)
+
+        byte_lengths = _varint_lengths(values)
+        value_boundaries = np.concatenate(([0], np.cumsum(2 * doc_freqs)))
+        byte_boundaries = np.concatenate(([0], np.cumsum(byte_lengths)))
+        offsets = byte_boundaries[value_boundaries].astype(np.int64)
+
+        postings = _encode_varints(values)
+        logger.info(
+            f"Built BM25 index: {len(terms)} terms, {len(texts)} documents, "
+            f"{postings.nbytes / 1024:.1f} KiB postings"
+        )
+        return cls(vocabulary, offsets, doc_freqs, doc_lengths, postings, k1=k1, b=b)
+
+    def save(self, path: str) -> None:
+        """
+        Save the index files into a directory.
+
+        Args:
+            path: Directory to write into (usually the FAISS index directory)
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(path / self.VOCAB_FILE, "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(path / self.META_FILE, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "num_docs": self.num_docs}, f)
+
+        np.save(path / self.OFFSETS_FILE, np.asarray(self.offsets))
+        np.save(path / self.DOC_FREQS_FILE, np.asarray(self.doc_freqs))
+        np.save(path / self.DOC_LENGTHS_FILE, np.asarray(self.doc_lengths))
+        np.asarray(self.postings, dtype=np.uint8).tofile(path / self.POSTINGS_FILE)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        """Check whether a saved index is present in a directory."""
+        return (Path(path) / cls.META_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "BM25Index":
+        """
+        Load an index saved with `save`.
+
+        Args:
+            path: Directory containing the index files
+            mmap: Memory-map arrays instead of reading them into RAM
+
+        Returns:
+            BM25Index instance
+        """
+        path = Path(path)
+        if not cls.exists(path):
+            raise FileNotFoundError(f"BM25 index not found at {path}")
+
+        mmap_mode = "r" if mmap else None
+        with open(path / cls.VOCAB_FILE, "r", encoding="utf-8") as f:
+            vocabulary = {term: term_id for term_id, term in enumerate(json.load(f))}
+        with open(path / cls.META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        postings_path = path / cls.POSTINGS_FILE
+        if mmap and postings_path.stat().st_size > 0:
+            postings = np.memmap(postings_path, dtype=np.uint8, mode="r")
+        else:
+            postings = np.fromfile(postings_path, dtype=np.uint8)
+
+        return cls(
+            vocabulary=vocabulary,
+            offsets=np.load(path / cls.OFFSETS_FILE, mmap_mode=mmap_mode),
+            doc_freqs=np.load(path / cls.DOC_FREQS_FILE, mmap_mode=mmap_mode),
+            doc_lengths=np.load(path / cls.DOC_LENGTHS_FILE, mmap_mode=mmap_mode),
+            postings=postings,
+            k1=meta.get("k1", 1.5),
+            b=meta.get("b", 0.75)
+        )
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of a term (0.0 if unknown)."""
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return 0.0
+        df = int(self.doc_freqs[term_id])
+        return math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decode the postings list of a term.
+
+        Args:
+            term: Token produced by `tokenize`
+
+        Returns:
+            Tuple of (document IDs, term frequencies)
+        """
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        values = _decode_varints(self.postings[start:end])
+        return np.cumsum(values[0::2]), values[1::2]
+
+    def search(self, query: str, k: int = 5, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Score documents against a query with BM25.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            allowed: Optional boolean mask of searchable document IDs
+
+        Returns:
+            List of (document ID, BM25 score) tuples, best first
+        """
+        if self.num_docs == 0:
+            return []
+
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        length_norm = self.k1 * (1.0 - self.b + self.b * doc_lengths / max(self.avg_doc_length, 1e-9))
+
+        for term in set(tokenize(query)):
+            doc_ids, freqs = self.get_postings(term)
+            if doc_ids.size == 0:
+                continue
+            freqs = freqs.astype(np.float32)
+            scores[doc_ids] += self.idf(term) * freqs * (self.k1 + 1.0) / (freqs + length_norm[doc_ids])
+
+        if allowed is not None:
+            scores[~allowed] = 0.0
+        candidates = np.flatnonzero(scores)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
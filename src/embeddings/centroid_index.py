@@ -0,0 +1,168 @@
+"""Per-document centroid index for coarse-to-fine retrieval."""
+
+import json
+import logging
+from pathlib import Path
+from typing import List, Optional, Tuple
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCentroidIndex:
+    """
+    Mean chunk embedding of every source document.
+
+    Chunks of a document are stored as runs of consecutive FAISS positions,
+    so selecting documents maps straight to chunk ID ranges without reading
+    chunk metadata at query time.
+    """
+
+    CENTROIDS_FILE = "doc_centroids.npy"
+    RUNS_FILE = "doc_centroid_runs.npy"
+    SOURCES_FILE = "doc_centroid_sources.json"
+
+    def __init__(
+        self,
+        source_names: List[str],
+        centroids: np.ndarray,
+        runs: np.ndarray,
+        num_chunks: int
+    ):
+        """
+        Initialize the centroid index.
+
+        Args:
+            source_names: Source document names; position is the source code
+            centroids: Normalized centroid of each source, shape (sources, dim)
+            runs: (start, end, source code) rows of consecutive chunk positions
+            num_chunks: Number of chunks in the FAISS index
+        """
+        self.source_names = source_names
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.runs = runs
+        self.num_chunks = num_chunks
+
+        self._index = faiss.IndexFlatIP(self.centroids.shape[1])
+        self._index.add(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.source_names)
+
+    @classmethod
+    def build(cls, index: faiss.Index, sources: List[str], batch_size: int = 65536) -> "DocumentCentroidIndex":
+        """
+        Compute document centroids from the vectors stored in a FAISS index.
+
+        Args:
+            index: FAISS index holding the chunk embeddings
+            sources: Source name of each chunk, by FAISS position
+            batch_size: Vectors reconstructed at a time, bounding memory use
+
+        Returns:
+            DocumentCentroidIndex instance
+        """
+        num_chunks = index.ntotal
+        if len(sources) != num_chunks:
+            raise ValueError(f"Expected {num_chunks} source names, got {len(sources)}")
+
+        source_lookup = {}
+        codes = np.fromiter(
+            (source_lookup.setdefault(source, len(source_lookup)) for source in sources),
+            dtype=np.int64,
+            count=num_chunks
+        )
+
+        sums = np.zeros((len(source_lookup), index.d), dtype=np.float64)
+        for start in range(0, num_chunks, batch_size):
+            end = min(start + batch_size, num_chunks)
+            vectors = index.reconstruct_n(start, end - start)
+            np.add.at(sums, codes[start:end], vectors)
+
+        centroids = sums.astype(np.float32)
+        faiss.normalize_L2(centroids)
+
+        boundaries = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.concatenate(([0], boundaries)) if num_chunks else np.array([], dtype=np.int64)
+        ends = np.concatenate((boundaries, [num_chunks])) if num_chunks else np.array([], dtype=np.int64)
+        runs = np.stack([starts, ends, codes[starts]], axis=1).astype(np.int64)
+
+        logger.info(f"Built centroid index for {len(source_lookup)} documents over {num_chunks} chunks")
+        return cls(list(source_lookup), centroids, runs, num_chunks)
+
+    def save(self, path: str) -> None:
+        """
+        Save the index files into a directory.
+
+        Args:
+            path: Directory to write into (usually the FAISS index directory)
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        np.save(path / self.CENTROIDS_FILE, self.centroids)
+        np.save(path / self.RUNS_FILE, self.runs)
+        with open(path / self.SOURCES_FILE, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.source_names, "num_chunks": self.num_chunks}, f)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        """Check whether a saved index is present in a directory."""
+        return (Path(path) / cls.SOURCES_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentCentroidIndex":
+        """
+        Load an index saved with `save`.
+
+        Args:
+            path: Directory containing the index files
+
+        Returns:
+            DocumentCentroidIndex instance
+        """
+        path = Path(path)
+        if not cls.exists(path):
+            raise FileNotFoundError(f"Centroid index not found at {path}")
+
+        with open(path / cls.SOURCES_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            source_names=meta["sources"],
+            centroids=np.load(path / cls.CENTROIDS_FILE),
+            runs=np.load(path / cls.RUNS_FILE),
+            num_chunks=meta["num_chunks"]
+        )
+
+    def search(self, query_vector: np.ndarray, top_d: int) -> List[Tuple[int, float]]:
+        """
+        Find the documents whose centroids are closest to a query.
+
+        Args:
+            query_vector: Query embedding, shape (dim,) or (1, dim)
+            top_d: Number of documents to return
+
+        Returns:
+            List of (source code, cosine similarity) tuples, best first
+        """
+        query = np.array(query_vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(query)
+        scores, codes = self._index.search(query, min(top_d, len(self)))
+        return [(int(code), float(score)) for code, score in zip(codes[0], scores[0]) if code != -1]
+
+    def chunk_mask(self, source_codes: List[int], num_chunks: Optional[int] = None) -> np.ndarray:
+        """
+        Boolean mask over FAISS positions of the chunks of some documents.
+
+        Args:
+            source_codes: Codes of the selected documents
+            num_chunks: Mask length (defaults to the indexed chunk count)
+
+        Returns:
+            Boolean array, True for chunks of the selected documents
+        """
+        mask = np.zeros(num_chunks or self.num_chunks, dtype=bool)
+        for start, end, _ in self.runs[np.isin(self.runs[:, 2], source_codes)]:
+            mask[start:end] = True
+        return mask
@@ -77,6 +77,23 @@ class Embedder:
             logger.error(f"Error generating query embedding: {e}")
             raise
     
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for many queries in one batched model call.
+        
+        Args:
+            queries: Query texts
+            
+        Returns:
+            One embedding vector per query
+        """
+        try:
+            # HuggingFaceEmbeddings encodes queries and documents the same way
+            return self.embeddings.embed_documents(list(queries))
+        except Exception as e:
+            logger.error(f"Error generating query embeddings: {e}")
+            raise
+    
     def get_embedding_dimension(self) -> int:
         """Get the dimension of embeddings produced by this model."""
         # Test embedding to get dimension
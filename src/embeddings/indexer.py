@@ -2,20 +2,28 @@
 
 import logging
 import pickle
+import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional
 import faiss
 import numpy as np
 from langchain.schema import Document
 from langchain_community.vectorstores import FAISS
 from langchain_core.embeddings import Embeddings
 
+from .bm25_index import BM25Index
+from .centroid_index import DocumentCentroidIndex
+
 logger = logging.getLogger(__name__)
 
 
 class VectorIndexer:
     """Manages FAISS vector index creation, saving, and loading."""
     
+    VERSION_FILE = "index_version.txt"
+    # Chunks embedded per call while creating an index, between progress reports
+    EMBED_BATCH_SIZE = 256
+    
     def __init__(self, embeddings: Embeddings, index_path: Optional[str] = None):
         """
         Initialize the vector indexer.
@@ -27,13 +35,25 @@ class VectorIndexer:
         self.embeddings = embeddings
         self.index_path = Path(index_path) if index_path else None
         self.vectorstore: Optional[FAISS] = None
+        self.keyword_index: Optional[BM25Index] = None
+        self.centroid_index: Optional[DocumentCentroidIndex] = None
+        # Changes whenever the indexed content changes; used to invalidate caches
+        self.index_version: Optional[str] = None
+        # Whether the FAISS vectors are a read-only view of the index file
+        self.memory_mapped = False
     
-    def create_index(self, documents: List[Document]) -> FAISS:
+    def create_index(
+        self,
+        documents: List[Document],
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> FAISS:
         """
         Create FAISS index from documents.
         
         Args:
             documents: List of LangChain Document objects
+            progress: Optional callback receiving (chunks embedded, chunks
+                total) after each batch of EMBED_BATCH_SIZE chunks
             
         Returns:
             FAISS vectorstore instance
@@ -44,11 +64,21 @@ class VectorIndexer:
         logger.info(f"Creating FAISS index from {len(documents)} documents")
         
         try:
-            self.vectorstore = FAISS.from_documents(
-                documents=documents,
-                embedding=self.embeddings
+            texts = [doc.page_content for doc in documents]
+            vectors = []
+            for start in range(0, len(texts), self.EMBED_BATCH_SIZE):
+                vectors.extend(self.embeddings.embed_documents(texts[start:start + self.EMBED_BATCH_SIZE]))
+                if progress is not None:
+                    progress(len(vectors), len(texts))
+            self.vectorstore = FAISS.from_embeddings(
+                text_embeddings=list(zip(texts, vectors)),
+                embedding=self.embeddings,
+                metadatas=[doc.metadata for doc in documents]
             )
+            self.memory_mapped = False
             logger.info(f"Successfully created FAISS index with {len(documents)} vectors")
+            self._build_auxiliary_indexes()
+            self.index_version = uuid.uuid4().hex
             return self.vectorstore
         except Exception as e:
             logger.error(f"Error creating FAISS index: {e}")
@@ -73,17 +103,25 @@ class VectorIndexer:
         logger.info(f"Saving FAISS index to {save_path}")
         try:
             self.vectorstore.save_local(str(save_path))
+            if self.keyword_index is not None:
+                self.keyword_index.save(str(save_path))
+            if self.centroid_index is not None:
+                self.centroid_index.save(str(save_path))
+            (save_path / self.VERSION_FILE).write_text(self.index_version)
             logger.info(f"Successfully saved index to {save_path}")
         except Exception as e:
             logger.error(f"Error saving index: {e}")
             raise
     
-    def load_index(self, load_path: Optional[str] = None) -> FAISS:
+    def load_index(self, load_path: Optional[str] = None, mmap: bool = False) -> FAISS:
         """
         Load FAISS index from disk.
         
         Args:
             load_path: Optional custom path to load index from
+            mmap: Memory-map the vectors read-only instead of reading them
+                into memory, so processes loading the same index share its
+                pages; documents cannot be added to a mapped index
             
         Returns:
             FAISS vectorstore instance
@@ -97,16 +135,64 @@ class VectorIndexer:
         
         logger.info(f"Loading FAISS index from {load_path}")
         try:
-            self.vectorstore = FAISS.load_local(
-                str(load_path),
-                embeddings=self.embeddings
-            )
+            if mmap:
+                self.vectorstore = self._load_mapped(load_path)
+            else:
+                self.vectorstore = FAISS.load_local(
+                    str(load_path),
+                    embeddings=self.embeddings,
+                    allow_dangerous_deserialization=True
+                )
+            self.memory_mapped = mmap
+            if BM25Index.exists(str(load_path)):
+                self.keyword_index = BM25Index.load(str(load_path))
+            else:
+                logger.warning(f"No BM25 index at {load_path}; keyword search disabled")
+                self.keyword_index = None
+            if DocumentCentroidIndex.exists(str(load_path)):
+                self.centroid_index = DocumentCentroidIndex.load(str(load_path))
+            else:
+                logger.warning(f"No centroid index at {load_path}; coarse-to-fine search disabled")
+                self.centroid_index = None
+            self.index_version = self.read_index_version(load_path)
             logger.info(f"Successfully loaded index from {load_path}")
             return self.vectorstore
         except Exception as e:
             logger.error(f"Error loading index: {e}")
             raise
     
+    def _load_mapped(self, load_path: Path) -> FAISS:
+        """Load the vectorstore with its FAISS vectors memory-mapped read-only."""
+        # Older FAISS builds can only map IVF lists, not flat vector storage
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        index = faiss.read_index(str(load_path / "index.faiss"), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        with open(load_path / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+    
+    @classmethod
+    def read_index_version(cls, load_path: Path) -> str:
+        """Read the version of the index saved at a path, deriving one for older indexes."""
+        load_path = Path(load_path)
+        version_file = load_path / cls.VERSION_FILE
+        if version_file.exists():
+            return version_file.read_text().strip()
+        stat = (load_path / "index.faiss").stat()
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+    
+    def _build_auxiliary_indexes(self) -> None:
+        """Rebuild the BM25 and centroid indexes so their IDs match FAISS positions."""
+        index_to_docstore_id = self.vectorstore.index_to_docstore_id
+        documents = [
+            self.vectorstore.docstore.search(index_to_docstore_id[position])
+            for position in range(len(index_to_docstore_id))
+        ]
+        self.keyword_index = BM25Index.build([doc.page_content for doc in documents])
+        self.centroid_index = DocumentCentroidIndex.build(
+            self.vectorstore.index,
+            [str(doc.metadata.get('source', 'Unknown')) for doc in documents]
+        )
+    
     def get_vectorstore(self) -> FAISS:
         """Get the current vectorstore instance."""
         if self.vectorstore is None:
@@ -122,10 +208,14 @@ class VectorIndexer:
         """
         if self.vectorstore is None:
             raise ValueError("No existing index. Create index first.")
+        if self.memory_mapped:
+            raise ValueError("Index is memory-mapped read-only; load it without mmap to add documents")
         
         logger.info(f"Adding {len(documents)} documents to existing index")
         try:
             self.vectorstore.add_documents(documents)
+            self._build_auxiliary_indexes()
+            self.index_version = uuid.uuid4().hex
             logger.info(f"Successfully added {len(documents)} documents")
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
@@ -1,6 +1,6 @@
 """Evaluation module for RAG system metrics."""
 
 from .evaluator import RAGEvaluator
+from .usage_log import UsageLog, UsageStats
 
-__all__ = ["RAGEvaluator"]
-
+__all__ = ["RAGEvaluator", "UsageLog", "UsageStats"]
@@ -139,6 +139,54 @@ class RAGEvaluator:
             'total_sentences': total_sentences
         }
     
+    def compare_context_compression(
+        self,
+        full_answers: List[str],
+        full_contexts: List[str],
+        compressed_answers: List[str],
+        compressed_contexts: List[str]
+    ) -> Dict[str, any]:
+        """
+        Report the faithfulness impact of context compression.
+        
+        Answers generated from compressed context are scored against both the
+        compressed context the model saw and the full retrieved context.
+        
+        Args:
+            full_answers: Answers generated with the full context
+            full_contexts: Full retrieved contexts
+            compressed_answers: Answers to the same questions with compression
+            compressed_contexts: Compressed contexts
+            
+        Returns:
+            Dictionary with mean faithfulness per setting, the change in
+            faithfulness, and the mean fraction of context kept
+        """
+        if not (len(full_answers) == len(full_contexts) == len(compressed_answers) == len(compressed_contexts)):
+            raise ValueError("All answer and context lists must have same length")
+        if not full_answers:
+            raise ValueError("At least one answer is required")
+        
+        def mean_faithfulness(answers: List[str], contexts: List[str]) -> float:
+            scores = [self.compute_faithfulness(a, c)['faithfulness_score'] for a, c in zip(answers, contexts)]
+            return sum(scores) / len(scores)
+        
+        full = mean_faithfulness(full_answers, full_contexts)
+        compressed = mean_faithfulness(compressed_answers, compressed_contexts)
+        kept_ratios = [
+            len(compressed_ctx) / len(full_ctx) if full_ctx else 1.0
+            for full_ctx, compressed_ctx in zip(full_contexts, compressed_contexts)
+        ]
+        
+        return {
+            'num_questions': len(full_answers),
+            'full_faithfulness': full,
+            'compressed_faithfulness': compressed,
+            'compressed_faithfulness_to_full_context': mean_faithfulness(compressed_answers, full_contexts),
+            'faithfulness_delta': compressed - full,
+            'mean_context_kept_ratio': sum(kept_ratios) / len(kept_ratios)
+        }
+    
     def _split_sentences(self, text: str) -> List[str]:
         """Split text into sentences."""
         # Simple sentence splitting
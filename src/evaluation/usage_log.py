@@ -0,0 +1,86 @@
+"""Generation usage accounting: running totals and a rotating JSONL log."""
+
+import json
+import logging
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class UsageStats:
+    """Running totals of response usage, e.g. over one UI session."""
+
+    def __init__(self):
+        self.queries = 0
+        self.by_source: Counter = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prefill_ms = 0.0
+        self.decode_ms = 0.0
+        self._ttft_ms: List[float] = []
+
+    def add(self, usage: Dict) -> None:
+        """
+        Add one response's usage.
+
+        Args:
+            usage: The 'usage' dictionary of a pipeline response
+        """
+        self.queries += 1
+        self.by_source[usage.get('answer_source', 'unknown')] += 1
+        self.prompt_tokens += usage.get('prompt_tokens', 0)
+        self.completion_tokens += usage.get('completion_tokens', 0)
+        self.prefill_ms += usage.get('prefill_ms', 0.0)
+        self.decode_ms += usage.get('decode_ms', 0.0)
+        if usage.get('ttft_ms') is not None:
+            self._ttft_ms.append(usage['ttft_ms'])
+
+    def summary(self) -> Dict[str, float]:
+        """Query counts by answer source, token totals, TTFT and decode throughput."""
+        ttft = sorted(self._ttft_ms)
+        return {
+            'queries': self.queries,
+            'by_source': dict(self.by_source),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'prefill_ms': self.prefill_ms,
+            'decode_ms': self.decode_ms,
+            'mean_ttft_ms': sum(ttft) / len(ttft) if ttft else 0.0,
+            'p95_ttft_ms': ttft[int(0.95 * (len(ttft) - 1))] if ttft else 0.0,
+            'tokens_per_second': self.completion_tokens / (self.decode_ms / 1000) if self.decode_ms > 0 else 0.0
+        }
+
+
+class UsageLog:
+    """Appends one JSON line per response to a size-rotated log file."""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        """
+        Open the usage log.
+
+        Args:
+            path: Log file path; rotated files get .1, .2, ... suffixes
+            max_bytes: Size at which the file is rotated
+            backup_count: Rotated files kept
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        # A private logger, so records never reach the application's handlers
+        self._logger = logging.Logger(f"{__name__}:{self.path}", level=logging.INFO)
+        self._logger.addHandler(self._handler)
+
+    def write(self, record: Dict) -> None:
+        """Append a record as one JSON line."""
+        try:
+            self._logger.info(json.dumps(record, default=str))
+        except Exception as e:
+            logger.warning(f"Could not write usage record to {self.path}: {e}")
+
+    def close(self) -> None:
+        """Flush and close the log file."""
+        self._handler.close()
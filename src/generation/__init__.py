@@ -1,6 +1,28 @@
 """Generation module for LLM inference."""
 
 from .generator import AnswerGenerator
+from .prefix_cache import PrefixCache
+from .extractive import ExtractiveAnswerer
+from .worker_pool import LLMWorkerPool
+from .scheduler import (
+    GenerationScheduler,
+    GenerationTicket,
+    QueueFullError,
+    DeadlineExceededError,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BATCH,
+)
 
-__all__ = ["AnswerGenerator"]
+__all__ = [
+    "AnswerGenerator",
+    "PrefixCache",
+    "ExtractiveAnswerer",
+    "LLMWorkerPool",
+    "GenerationScheduler",
+    "GenerationTicket",
+    "QueueFullError",
+    "DeadlineExceededError",
+    "PRIORITY_INTERACTIVE",
+    "PRIORITY_BATCH",
+]
 
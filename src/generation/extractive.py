@@ -0,0 +1,224 @@
+"""BM25 sentence extraction answering from retrieved context without an LLM."""
+
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..embeddings.bm25_index import BM25Index, tokenize
+from ..retrieval.context_packer import CONTEXT_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# Header written by format_citation_header above each chunk
+_CITATION_HEADER = re.compile(r"\[(\d+)\] Source: [^\n]*\n")
+
+# Sentence ends become ". " and whitespace a single space, one character each
+_BOUNDARY_TABLE = str.maketrans({"!": ".", "?": ".", "\n": " ", "\t": " ", "\r": " ", "\x00": "."})
+
+# Question words that carry no content; BM25 IDF handles the rest
+_QUESTION_STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'is', 'are', 'was', 'were', 'be', 'do', 'does', 'can', 'what', 'how', 'why', 'when',
+    'where', 'which', 'who'
+})
+
+
+class ChunkSentences(NamedTuple):
+    """Sentences of one chunk body and the term frequencies of each."""
+
+    texts: Tuple[str, ...]
+    lengths: Tuple[int, ...]
+    total_length: int
+    # Term -> (sentence indexes, frequencies)
+    postings: Dict[str, Tuple[Tuple[int, ...], Tuple[int, ...]]]
+
+
+class ExtractiveAnswerer:
+    """
+    Answers with the context sentences that best match the question under BM25.
+
+    Each distinct chunk body is split into sentences and its term
+    frequencies counted once, then kept in an LRU cache, so a query only
+    looks up its terms per chunk and scores only the sentences that contain
+    them. Terms match whole tokens, so "in" never
+    matches "insulin". IDF comes from the corpus BM25 index when available,
+    otherwise from the sentences.
+    """
+
+    def __init__(
+        self,
+        keyword_index: Optional[BM25Index] = None,
+        max_sentences: int = 5,
+        max_chars: int = 500,
+        min_sentence_chars: int = 20,
+        k1: float = 1.2,
+        b: float = 0.75,
+        cache_size: int = 4096
+    ):
+        """
+        Initialize the extractive answerer.
+
+        Args:
+            keyword_index: Optional corpus BM25 index supplying term IDF
+            max_sentences: Maximum sentences in an answer
+            max_chars: Maximum answer length in characters
+            min_sentence_chars: Shorter sentences (fragments, headings) are skipped
+            k1: BM25 term frequency saturation
+            b: BM25 sentence length normalization
+            cache_size: Chunk bodies whose sentences and term counts are kept
+        """
+        self.keyword_index = keyword_index
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+        self.min_sentence_chars = min_sentence_chars
+        self.k1 = k1
+        self.b = b
+        self.cache_size = cache_size
+        self._chunks: "OrderedDict[str, ChunkSentences]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def analyze_chunk(self, body: str) -> ChunkSentences:
+        """
+        Split a chunk body into sentences and count their terms, once per distinct body.
+
+        Args:
+            body: Chunk text without its citation header
+
+        Returns:
+            The chunk's sentences (with their terminal punctuation), their
+            lengths in characters and per-term postings
+        """
+        with self._lock:
+            analyzed = self._chunks.get(body)
+            if analyzed is not None:
+                self._chunks.move_to_end(body)
+                return analyzed
+
+        texts: List[str] = []
+        lengths: List[int] = []
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        start = 0
+        # Translations map one character to one, so offsets in pieces are offsets in body
+        for idx, piece in enumerate(body.translate(_BOUNDARY_TABLE).split(". ")):
+            texts.append(" ".join(body[start:start + len(piece) + 1].replace("\x00", " ").split()))
+            lengths.append(len(piece))
+            start += len(piece) + 2
+            for term, count in Counter(tokenize(piece)).items():
+                rows, counts = postings.setdefault(term, ([], []))
+                rows.append(idx)
+                counts.append(count)
+        # Tuples of ints are untracked by the garbage collector, which would
+        # otherwise rescan every cached posting list on each collection
+        analyzed = ChunkSentences(
+            tuple(texts),
+            tuple(lengths),
+            sum(lengths),
+            {term: (tuple(rows), tuple(counts)) for term, (rows, counts) in postings.items()}
+        )
+
+        with self._lock:
+            self._chunks[body] = analyzed
+            if len(self._chunks) > self.cache_size:
+                self._chunks.popitem(last=False)
+        return analyzed
+
+    def score_sentences(
+        self,
+        question: str,
+        context: str
+    ) -> Tuple[List[ChunkSentences], List[int], Dict[Tuple[int, int], float]]:
+        """
+        BM25 score of every context sentence sharing a term with the question.
+
+        Chunks come from the cache when seen before; per query, only the
+        question terms are looked up in each chunk's postings, so the cost
+        grows with the matching sentences rather than the context length.
+        Sentence length is measured in characters.
+
+        Args:
+            question: User question
+            context: Packed context with citation headers
+
+        Returns:
+            Tuple of (chunks, citation number of each chunk or -1, scores by
+            (chunk index, sentence index)); sentences without a question
+            term are left out
+        """
+        chunks: List[ChunkSentences] = []
+        citations: List[int] = []
+        for section in context.split(CONTEXT_SEPARATOR):
+            header = _CITATION_HEADER.match(section)
+            citations.append(int(header.group(1)) if header else -1)
+            chunks.append(self.analyze_chunk(section[header.end():] if header else section))
+
+        terms = [t for t in dict.fromkeys(tokenize(question)) if t not in _QUESTION_STOPWORDS]
+        num_sentences = sum(len(chunk.texts) for chunk in chunks)
+        scores: Dict[Tuple[int, int], float] = {}
+        if not terms or not num_sentences:
+            return chunks, citations, scores
+        mean_length = max(sum(chunk.total_length for chunk in chunks) / num_sentences, 1.0)
+
+        k1, b = self.k1, self.b
+        for term in terms:
+            matches = [
+                (chunk_idx, chunk.postings[term])
+                for chunk_idx, chunk in enumerate(chunks) if term in chunk.postings
+            ]
+            if not matches:
+                continue
+            idf = self._idf(term, num_sentences, sum(len(rows) for _, (rows, _) in matches))
+            for chunk_idx, (rows, counts) in matches:
+                lengths = chunks[chunk_idx].lengths
+                for row, tf in zip(rows, counts):
+                    norm = k1 * (1.0 - b + b * lengths[row] / mean_length)
+                    key = (chunk_idx, row)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+        return chunks, citations, scores
+
+    def _idf(self, term: str, num_sentences: int, sentence_freq: int) -> float:
+        """Corpus IDF of a term, falling back to IDF over the sentences."""
+        if self.keyword_index is not None:
+            corpus_idf = self.keyword_index.idf(term)
+            if corpus_idf > 0.0:
+                return corpus_idf
+        return math.log1p((num_sentences - sentence_freq + 0.5) / (sentence_freq + 0.5))
+
+    def answer(self, question: str, context: str) -> Optional[str]:
+        """
+        Build an answer from the best-matching context sentences.
+
+        Sentences are ordered by score and tagged with their chunk's citation
+        number, within max_sentences and max_chars.
+
+        Args:
+            question: User question
+            context: Packed context with citation headers
+
+        Returns:
+            Answer text, or None if no sentence matches the question
+        """
+        chunks, citations, scores = self.score_sentences(question, context)
+
+        candidates = [
+            (score, -chunk, -row) for (chunk, row), score in scores.items()
+            if chunks[chunk].lengths[row] > self.min_sentence_chars
+        ]
+        if not candidates:
+            return None
+        best = heapq.nlargest(self.max_sentences, candidates)
+
+        parts: List[str] = []
+        length = 0
+        for _, negative_chunk, negative_row in best:
+            text = chunks[-negative_chunk].texts[-negative_row]
+            if citations[-negative_chunk] >= 0:
+                text += f" [{citations[-negative_chunk]}]"
+            if parts and length + 1 + len(text) > self.max_chars:
+                continue
+            parts.append(text)
+            length += len(text) + (1 if len(parts) > 1 else 0)
+        return " ".join(parts)[:self.max_chars]
@@ -1,11 +1,21 @@
 """Answer generation with Llama-3 and anti-hallucination prompting."""
 
+import hashlib
 import logging
-from typing import List, Dict, Optional
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Dict, Optional
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 from langchain.chains import LLMChain
 
+from ..retrieval.retriever import estimate_tokens
+from .prefix_cache import PrefixCache
+from .worker_pool import LLMWorkerPool
+from .extractive import ExtractiveAnswerer
+
 logger = logging.getLogger(__name__)
 
 # Try to import LlamaCpp, handle gracefully if not available
@@ -20,13 +30,18 @@ except ImportError as e:
 class AnswerGenerator:
     """Generates answers using Llama-3 with strict anti-hallucination prompts."""
     
+    WARMUP_TOKENS = 4
+    
     def __init__(
         self,
         model_path: str,
         n_ctx: int = 4096,
         n_threads: Optional[int] = None,
         temperature: float = 0.1,
-        max_tokens: int = 512
+        max_tokens: int = 512,
+        prefix_cache: bool = True,
+        prefix_cache_path: Optional[str] = None,
+        n_workers: int = 1
     ):
         """
         Initialize the answer generator.
@@ -34,9 +49,17 @@ class AnswerGenerator:
         Args:
             model_path: Path to Llama-3 GGUF model file
             n_ctx: Context window size
-            n_threads: Number of threads (None for auto)
+            n_threads: Number of threads per model instance (None for auto;
+                with several workers, the CPU count divided among them)
             temperature: Sampling temperature (lower = more deterministic)
             max_tokens: Maximum tokens to generate
+            prefix_cache: Evaluate the fixed instruction prefix once and reuse
+                its KV state for every request
+            prefix_cache_path: Optional file persisting the prefix state, so
+                warm restarts skip its prefill too
+            n_workers: Model instances run in separate worker processes so
+                that many answers generate in parallel (1 keeps the model in
+                this process)
         """
         self.model_path = model_path
         self.temperature = temperature
@@ -45,6 +68,19 @@ class AnswerGenerator:
         self.n_threads = n_threads
         self.llm = None
         self._initialized = False
+        self._init_lock = threading.Lock()
+        self.use_prefix_cache = prefix_cache
+        self.prefix_cache_path = prefix_cache_path
+        self.prefix_cache: Optional[PrefixCache] = None
+        self.n_workers = n_workers
+        self.pool: Optional[LLMWorkerPool] = None
+        # Background load and warm-up state, see start_background_load
+        self._loader: Optional[threading.Thread] = None
+        self.load_ms: Optional[float] = None
+        self.warmup_ms: Optional[float] = None
+        self.load_error: Optional[str] = None
+        # Demo mode and LLM-failure fallback; the pipeline supplies corpus IDF
+        self.extractive = ExtractiveAnswerer()
         
         # Don't initialize LLM here - do it lazily when needed
         if not LLAMA_AVAILABLE:
@@ -73,6 +109,152 @@ Answer (based ONLY on the provided context):"""
         # Chain will be created when LLM is initialized
         self.chain = None
     
+    def get_cache_fingerprint(self, use_demo_mode: bool = False) -> Dict[str, any]:
+        """
+        Describe everything that determines generated answers.
+        
+        Args:
+            use_demo_mode: Whether the answer will come from demo mode
+            
+        Returns:
+            Dictionary suitable for building response cache keys
+        """
+        if use_demo_mode or not LLAMA_AVAILABLE:
+            return {'model': 'demo', 'answerer': 'bm25-sentences'}
+        
+        model_file = Path(self.model_path)
+        return {
+            'model': self.model_path,
+            'model_size': model_file.stat().st_size if model_file.exists() else None,
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'n_ctx': self.n_ctx,
+            'prompt_template': hashlib.sha256(self.prompt_template.template.encode("utf-8")).hexdigest()
+        }
+    
+    def load_model(self) -> bool:
+        """
+        Load the LLM now rather than on first generation.
+        
+        Returns:
+            True if the LLM is loaded and usable
+        """
+        if not LLAMA_AVAILABLE:
+            return False
+        try:
+            start = time.perf_counter()
+            self._initialize_llm()
+            if self.load_ms is None:
+                self.load_ms = (time.perf_counter() - start) * 1000
+            self.load_error = None
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load LLM: {e}")
+            self.load_error = str(e)
+            return False
+    
+    def warm_up(self) -> bool:
+        """
+        Load the LLM and run one short generation.
+        
+        The first generation pays one-off costs (page faults on the
+        memory-mapped weights, allocating buffers); paying them here keeps
+        them out of the first user's request.
+        
+        Returns:
+            True if the LLM is loaded and usable
+        """
+        if not self.load_model():
+            return False
+        start = time.perf_counter()
+        try:
+            if self.pool is not None:
+                # Workers warm themselves up after loading
+                if not self.pool.wait_ready():
+                    self.load_error = "LLM workers could not load the model"
+                    return False
+            else:
+                self._restore_prefix()
+                prompt = self.prompt_template.format(context="[1] Source: warm-up\nWarm-up.", question="Ready?")
+                self.llm.invoke(prompt, max_tokens=self.WARMUP_TOKENS)
+        except Exception as e:
+            # The model loaded; only the warm-up failed
+            logger.warning(f"LLM warm-up generation failed: {e}")
+        self.warmup_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"LLM warm-up took {self.warmup_ms:.0f} ms")
+        return True
+    
+    def start_background_load(self) -> None:
+        """Load and warm up the LLM on a background thread; no-op if already started."""
+        if not LLAMA_AVAILABLE or self._initialized or self._loader is not None:
+            return
+        self._loader = threading.Thread(target=self.warm_up, name="llm-loader", daemon=True)
+        self._loader.start()
+    
+    def is_loading(self) -> bool:
+        """Whether a background load or warm-up is still running."""
+        return self._loader is not None and self._loader.is_alive()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a background load to finish.
+        
+        Args:
+            timeout: Maximum seconds to wait (None waits until done)
+            
+        Returns:
+            True if the LLM is loaded and warmed up
+        """
+        if self._loader is not None:
+            self._loader.join(timeout)
+        return self.get_readiness()['state'] == 'ready'
+    
+    def get_readiness(self) -> Dict[str, any]:
+        """LLM state ('not_loaded', 'loading', 'ready' or 'failed') with load and warm-up times."""
+        if self.is_loading():
+            state = 'loading'
+        elif self._initialized and self.load_error is None:
+            state = 'ready'
+        elif self.load_error is not None:
+            state = 'failed'
+        else:
+            state = 'not_loaded'
+        return {'state': state, 'load_ms': self.load_ms, 'warmup_ms': self.warmup_ms, 'error': self.load_error}
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        Count tokens with the Llama tokenizer.
+        
+        Falls back to an estimate when the model is not loaded (demo mode).
+        
+        Args:
+            text: Text to count
+            
+        Returns:
+            Number of tokens
+        """
+        if self._initialized:
+            return len(self.llm.client.tokenize(text.encode("utf-8"), add_bos=False))
+        return estimate_tokens(text)
+    
+    def count_prompt_tokens(self, question: str, context: str = "") -> int:
+        """Tokens of the full prompt for a question and context."""
+        return self.count_tokens(self.prompt_template.format(context=context, question=question))
+    
+    def get_context_token_budget(self, question: str, reserve_tokens: int = 16) -> int:
+        """
+        Tokens left for retrieved context in the model's window.
+        
+        Args:
+            question: User question
+            reserve_tokens: Safety margin for tokenization differences
+            
+        Returns:
+            Context token budget (n_ctx minus answer, template and question)
+        """
+        overhead = self.count_prompt_tokens(question)
+        return max(0, self.n_ctx - self.max_tokens - overhead - reserve_tokens)
+    
     def _initialize_llm(self):
         """Lazily initialize the LLM when first needed."""
         if self._initialized:
@@ -84,58 +266,104 @@ Answer (based ONLY on the provided context):"""
                 "Please install it: pip install llama-cpp-python --extra-index-url https://abetlen.github.io/llama-cpp-python/whl/cpu"
             )
         
-        logger.info(f"Initializing Llama-3 model from {self.model_path}")
-        
-        try:
-            self.llm = LlamaCpp(
-                model_path=self.model_path,
-                n_ctx=self.n_ctx,
-                n_threads=self.n_threads,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                verbose=False
-            )
-            self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
+        # Sessions may trigger loading concurrently; only one loads the model
+        with self._init_lock:
+            if self._initialized:
+                return
+            
+            if self.n_workers > 1:
+                self._start_worker_pool()
+                self._initialized = True
+                return
+            
+            logger.info(f"Initializing Llama-3 model from {self.model_path}")
+            
+            try:
+                self.llm = LlamaCpp(
+                    model_path=self.model_path,
+                    n_ctx=self.n_ctx,
+                    n_threads=self.n_threads,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    verbose=False
+                )
+                self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
+                logger.info("Successfully initialized Llama-3 model")
+            except Exception as e:
+                logger.error(f"Error initializing Llama-3 model: {e}")
+                raise
+            
+            if self.use_prefix_cache:
+                self._warm_prefix_cache()
             self._initialized = True
-            logger.info("Successfully initialized Llama-3 model")
+    
+    def _start_worker_pool(self) -> None:
+        """Load the tokenizer here and the model weights in the worker processes."""
+        n_threads = self.n_threads or max(1, (os.cpu_count() or 1) // self.n_workers)
+        logger.info(f"Starting {self.n_workers} Llama-3 workers with {n_threads} threads each")
+        try:
+            # Token counting for context packing needs only the vocabulary
+            self.llm = LlamaCpp(model_path=self.model_path, n_ctx=self.n_ctx, vocab_only=True, verbose=False)
         except Exception as e:
-            logger.error(f"Error initializing Llama-3 model: {e}")
+            logger.error(f"Error loading Llama-3 tokenizer: {e}")
             raise
+        self.pool = LLMWorkerPool(
+            {
+                'model_path': self.model_path,
+                'n_ctx': self.n_ctx,
+                'n_threads': n_threads,
+                'temperature': self.temperature,
+                'max_tokens': self.max_tokens,
+                'prefix_cache': self.use_prefix_cache,
+                'prefix_cache_path': self.prefix_cache_path
+            },
+            n_workers=self.n_workers
+        )
+    
+    def shutdown(self) -> None:
+        """Stop the worker processes, if any."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+            self._initialized = False
+    
+    def _warm_prefix_cache(self) -> None:
+        """Evaluate the instruction prefix once; generation works without it on failure."""
+        fingerprint = self.get_cache_fingerprint()
+        try:
+            self.prefix_cache = PrefixCache(
+                self.llm.client,
+                self.prompt_template.template.split("{context}")[0],
+                state_path=self.prefix_cache_path,
+                cache_key=f"{fingerprint['model']}:{fingerprint['model_size']}:{self.n_ctx}"
+            )
+            self.prefix_cache.warm()
+        except Exception as e:
+            logger.warning(f"Prompt prefix cache disabled: {e}")
+            self.prefix_cache = None
+    
+    def _restore_prefix(self) -> Optional[Dict[str, float]]:
+        """Put the cached prefix KV state back before a request."""
+        if self.prefix_cache is None:
+            return None
+        try:
+            return self.prefix_cache.restore()
+        except Exception as e:
+            logger.warning(f"Could not restore prompt prefix state: {e}")
+            return None
     
     def generate_demo(self, question: str, context: str, citations: Optional[List[Dict]] = None) -> Dict[str, any]:
         """
         Generate answer using demo mode (extracts relevant context without LLM).
-        This works without llama-cpp-python installed.
+        This works without llama-cpp-python installed and is the fallback
+        whenever the LLM fails.
         """
         logger.info(f"Generating demo answer for question: {question[:50]}...")
+        start = time.perf_counter()
         
-        # Extract relevant sentences from context that match the question
-        question_lower = question.lower()
-        question_words = set(question_lower.split())
-        
-        # Remove stopwords
-        stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'what', 'how', 'why', 'when', 'where'}
-        question_words = question_words - stopwords
-        
-        # Split context into sentences
-        sentences = context.split('. ')
-        relevant_sentences = []
-        
-        for sentence in sentences:
-            sentence_lower = sentence.lower()
-            # Count matching words
-            matches = sum(1 for word in question_words if word in sentence_lower)
-            if matches > 0 and len(sentence.strip()) > 20:
-                relevant_sentences.append((matches, sentence.strip()))
-        
-        # Sort by relevance and take top sentences
-        relevant_sentences.sort(reverse=True)
-        top_sentences = [s[1] for s in relevant_sentences[:5]]
-        
-        if top_sentences:
-            answer = '. '.join(top_sentences) + '.'
-            answer = answer[:500]  # Limit length
-        else:
+        # Best-matching context sentences under BM25, tagged with citations
+        answer = self.extractive.answer(question, context)
+        if answer is None:
             answer = f"Based on the provided context, I found information related to your question. Here are the relevant details:\n\n{context[:400]}..."
         
         # Format citations if provided
@@ -148,6 +376,7 @@ Answer (based ONLY on the provided context):"""
             'context_length': len(context),
             'model': 'Demo Mode (Context Extraction)'
         }
+        response['usage'] = self._usage('demo', self.count_tokens(answer), 0.0, time.perf_counter() - start)
         
         logger.info("Successfully generated demo answer")
         return response
@@ -157,7 +386,8 @@ Answer (based ONLY on the provided context):"""
         question: str,
         context: str,
         citations: Optional[List[Dict]] = None,
-        use_demo_mode: bool = False
+        use_demo_mode: bool = False,
+        max_tokens: Optional[int] = None
     ) -> Dict[str, any]:
         """
         Generate answer from question and context.
@@ -167,6 +397,7 @@ Answer (based ONLY on the provided context):"""
             context: Retrieved context from documents
             citations: Optional list of citation dictionaries
             use_demo_mode: If True, use demo mode (no LLM required)
+            max_tokens: Optional cap on answer tokens below the configured max_tokens
             
         Returns:
             Dictionary with answer, citations, and metadata
@@ -182,59 +413,207 @@ Answer (based ONLY on the provided context):"""
             logger.warning(f"LLM initialization failed, falling back to demo mode: {e}")
             return self.generate_demo(question, context, citations)
         
+        if self.pool is not None:
+            try:
+                return self.pool.generate(question, context, citations, max_tokens=max_tokens)
+            except Exception as e:
+                logger.warning(f"LLM worker failed, falling back to demo mode: {e}")
+                return self.generate_demo(question, context, citations)
+        
         logger.info(f"Generating answer for question: {question[:50]}...")
         
-        try:
-            # Generate answer using the chain
-            result = self.chain.run(context=context, question=question)
-            
-            answer = result.strip()
-            
-            # Format citations if provided
-            formatted_citations = self._format_citations(citations) if citations else []
-            
-            response = {
-                'answer': answer,
-                'citations': formatted_citations,
-                'question': question,
-                'context_length': len(context),
-                'model': 'Llama-3'
-            }
-            
-            logger.info("Successfully generated answer")
-            return response
-            
-        except Exception as e:
-            logger.warning(f"LLM generation failed, falling back to demo mode: {e}")
+        # Consume the token stream so prefill and decode are timed separately
+        response = None
+        for event in self._stream_llm(question, context, citations, time.perf_counter(), max_tokens):
+            if event['type'] == 'done':
+                response = event['response']
+        
+        if 'stream_error' in response:
+            logger.warning(f"LLM generation failed, falling back to demo mode: {response['stream_error']}")
             return self.generate_demo(question, context, citations)
+        
+        logger.info("Successfully generated answer")
+        return response
     
     def _format_citations(self, citations: List[Dict]) -> List[Dict]:
         """Format citations for display."""
         formatted = []
         for cit in citations:
-            formatted.append({
+            citation = {
                 'index': cit.get('index', 0),
                 'source': cit.get('source', 'Unknown'),
                 'page_number': cit.get('page_number', 'N/A'),
                 'preview': cit.get('text_preview', '')
-            })
+            }
+            if 'collection' in cit:
+                citation['collection'] = cit['collection']
+            formatted.append(citation)
         return formatted
     
-    def generate_streaming(self, question: str, context: str):
+    @staticmethod
+    def _usage(answer_source: str, completion_tokens: int, prefill_seconds: float, decode_seconds: float) -> Dict[str, any]:
+        """
+        Token and timing accounting of one generation.
+        
+        Args:
+            answer_source: 'llm' or 'demo'
+            completion_tokens: Tokens generated
+            prefill_seconds: Prompt evaluation time, up to the first token
+            decode_seconds: Time generating the remaining tokens
+        """
+        return {
+            'answer_source': answer_source,
+            'completion_tokens': completion_tokens,
+            'prefill_ms': prefill_seconds * 1000,
+            'decode_ms': decode_seconds * 1000,
+            'tokens_per_second': (completion_tokens - 1) / decode_seconds if completion_tokens > 1 and decode_seconds > 0 else 0.0
+        }
+    
+    @staticmethod
+    def _stream_stats(start: float, first_token_at: float, end: float, completion_tokens: int) -> Dict[str, float]:
+        """Time to first token and decode throughput of a streamed answer."""
+        decode_seconds = end - first_token_at
+        return {
+            'first_token_ms': (first_token_at - start) * 1000,
+            'generation_ms': (end - start) * 1000,
+            'completion_tokens': completion_tokens,
+            'tokens_per_second': (completion_tokens - 1) / decode_seconds if completion_tokens > 1 and decode_seconds > 0 else 0.0
+        }
+    
+    def _stream_demo(self, question: str, context: str, citations: Optional[List[Dict]], start: float) -> Iterator[Dict]:
+        """Stream a demo-mode answer as a single token event."""
+        response = self.generate_demo(question, context, citations)
+        first_token_at = time.perf_counter()
+        yield {'type': 'token', 'text': response['answer']}
+        response['streaming'] = self._stream_stats(
+            start, first_token_at, time.perf_counter(), self.count_tokens(response['answer'])
+        )
+        yield {'type': 'done', 'response': response}
+    
+    def generate_streaming(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]] = None,
+        use_demo_mode: bool = False,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[Dict]:
         """
         Generate answer with streaming (for UI).
         
+        Falls back to demo mode like `generate` when the LLM is unavailable
+        or fails before producing any text.
+        
         Args:
             question: User question
             context: Retrieved context
+            citations: Optional list of citation dictionaries
+            use_demo_mode: If True, use demo mode (no LLM required)
+            max_tokens: Optional cap on answer tokens below the configured max_tokens
             
         Yields:
-            Chunks of generated text
+            {'type': 'token', 'text': ...} events as text is generated, then a
+            {'type': 'done', 'response': ...} event with the response `generate`
+            would return plus 'streaming' timings
         """
-        # Note: Streaming support depends on LlamaCpp implementation
-        # This is a placeholder for future enhancement
+        start = time.perf_counter()
+        if use_demo_mode or not self.load_model():
+            yield from self._stream_demo(question, context, citations, start)
+            return
+        
+        if self.pool is not None:
+            yield from self._stream_from_pool(question, context, citations, start, max_tokens)
+            return
+        
+        logger.info(f"Streaming answer for question: {question[:50]}...")
+        yield from self._stream_llm(question, context, citations, start, max_tokens)
+    
+    def _stream_llm(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]],
+        start: float,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """Stream from the in-process model; falls back to demo mode if no token arrives."""
         prompt = self.prompt_template.format(context=context, question=question)
+        # Per-request caps only ever lower the configured answer length
+        overrides = {'max_tokens': min(max_tokens, self.max_tokens)} if max_tokens is not None else {}
+        prefix_report = self._restore_prefix()
+        pieces: List[str] = []
+        first_token_at = None
+        stream_error = None
         
-        for chunk in self.llm.stream(prompt):
-            yield chunk
-
+        llm_start = time.perf_counter()
+        try:
+            # llama.cpp streams one token per chunk
+            for chunk in self.llm.stream(prompt, **overrides):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                pieces.append(chunk)
+                yield {'type': 'token', 'text': chunk}
+        except Exception as e:
+            if not pieces:
+                logger.warning(f"LLM streaming failed, falling back to demo mode: {e}")
+                yield from self._stream_demo(question, context, citations, start)
+                return
+            logger.error(f"LLM streaming failed after {len(pieces)} tokens: {e}")
+            stream_error = str(e)
+        
+        end = time.perf_counter()
+        response = {
+            'answer': "".join(pieces).strip(),
+            'citations': self._format_citations(citations) if citations else [],
+            'question': question,
+            'context_length': len(context),
+            'model': 'Llama-3',
+            'streaming': self._stream_stats(start, first_token_at or end, end, len(pieces)),
+            'usage': self._usage('llm', len(pieces), (first_token_at or end) - llm_start, end - (first_token_at or end))
+        }
+        if prefix_report is not None:
+            response['prefix_cache'] = prefix_report
+        if stream_error is not None:
+            response['stream_error'] = stream_error
+        yield {'type': 'done', 'response': response}
+    
+    def _stream_from_pool(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]],
+        start: float,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """Relay a worker's stream, with the same fallbacks as streaming in-process."""
+        events = self.pool.generate_streaming(question, context, citations, max_tokens=max_tokens)
+        pieces: List[str] = []
+        first_token_at = None
+        try:
+            for event in events:
+                if event['type'] == 'token':
+                    first_token_at = first_token_at or time.perf_counter()
+                    pieces.append(event['text'])
+                yield event
+            return
+        except Exception as e:
+            if not pieces:
+                logger.warning(f"LLM worker failed, falling back to demo mode: {e}")
+                yield from self._stream_demo(question, context, citations, start)
+                return
+            logger.error(f"LLM worker failed after {len(pieces)} tokens: {e}")
+            stream_error = str(e)
+        finally:
+            events.close()
+        
+        end = time.perf_counter()
+        yield {'type': 'done', 'response': {
+            'answer': "".join(pieces).strip(),
+            'citations': self._format_citations(citations) if citations else [],
+            'question': question,
+            'context_length': len(context),
+            'model': 'Llama-3',
+            'streaming': self._stream_stats(start, first_token_at, end, len(pieces)),
+            'usage': self._usage('llm', len(pieces), first_token_at - start, end - first_token_at),
+            'stream_error': stream_error
+        }}
@@ -0,0 +1,138 @@
+"""KV-state cache for the fixed instruction prefix of the prompt."""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _common_prefix(a: List[int], b: List[int]) -> List[int]:
+    """Longest common prefix of two token lists."""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return list(a[:length])
+
+
+class PrefixCache:
+    """
+    Evaluates the static prompt prefix once and restores its KV state per request.
+
+    llama.cpp reuses the evaluated tokens that a new prompt shares with the
+    tokens already in its context, so restoring the prefix state before a
+    request skips prefill of the whole instruction preamble.
+    """
+
+    def __init__(self, client, prefix_text: str, state_path: Optional[str] = None, cache_key: str = ""):
+        """
+        Initialize the prefix cache.
+
+        Args:
+            client: llama_cpp.Llama instance (LlamaCpp.client)
+            prefix_text: Prompt text that precedes every request-specific part
+            state_path: Optional file to persist the prefix state across restarts
+            cache_key: Identifies the model and settings the saved state belongs to
+        """
+        self.client = client
+        self.prefix_text = prefix_text
+        self.state_path = Path(state_path) if state_path else None
+        self.cache_key = hashlib.sha256(f"{cache_key}\n{prefix_text}".encode("utf-8")).hexdigest()
+
+        # Tokens at the end of the prefix can merge with what follows it, so
+        # only the tokens shared with a continued prompt are cached
+        prefix_tokens = client.tokenize(prefix_text.encode("utf-8"), add_bos=True)
+        continued = client.tokenize((prefix_text + "[1] Source:").encode("utf-8"), add_bos=True)
+        self.prefix_tokens = _common_prefix(prefix_tokens, continued)
+
+        self.prefill_ms: Optional[float] = None
+        self.restores = 0
+        self.requests = 0
+        self._state = None
+
+    def warm(self) -> None:
+        """Evaluate the prefix, or load its saved state, and keep the KV state."""
+        if self._load():
+            logger.info(f"Loaded prompt prefix state ({len(self.prefix_tokens)} tokens) from {self.state_path}")
+            return
+
+        start = time.perf_counter()
+        self.client.reset()
+        self.client.eval(self.prefix_tokens)
+        self.prefill_ms = (time.perf_counter() - start) * 1000
+        self._state = self.client.save_state()
+        logger.info(f"Evaluated prompt prefix: {len(self.prefix_tokens)} tokens in {self.prefill_ms:.0f} ms")
+        self._save()
+
+    def _load(self) -> bool:
+        """Load a persisted prefix state if it matches this model and prefix."""
+        if self.state_path is None or not self.state_path.exists():
+            return False
+        try:
+            with open(self.state_path, "rb") as f:
+                saved = pickle.load(f)
+            if saved.get('cache_key') != self.cache_key:
+                logger.info("Saved prompt prefix state is for another model or prompt; re-evaluating")
+                return False
+            self.client.load_state(saved['state'])
+        except Exception as e:
+            logger.warning(f"Could not load prompt prefix state from {self.state_path}: {e}")
+            return False
+        self._state = saved['state']
+        self.prefill_ms = saved['prefill_ms']
+        return True
+
+    def _save(self) -> None:
+        """Persist the prefix state so warm restarts skip the prefill."""
+        if self.state_path is None:
+            return
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            # Per-process name: pool workers may save the same state concurrently
+            tmp_path = self.state_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump({'cache_key': self.cache_key, 'state': self._state, 'prefill_ms': self.prefill_ms}, f)
+            tmp_path.replace(self.state_path)
+        except Exception as e:
+            logger.warning(f"Could not save prompt prefix state to {self.state_path}: {e}")
+
+    def restore(self) -> Dict[str, float]:
+        """
+        Make sure the prefix KV state is in the context before a request.
+
+        Returns:
+            Per-request report: prefix tokens reused, whether the state had to
+            be reloaded, restore time and the measured prefill time the
+            restore saved (0 when llama.cpp still held the prefix on its own)
+        """
+        self.requests += 1
+        n_prefix = len(self.prefix_tokens)
+        in_context = self.client.n_tokens >= n_prefix and list(self.client.input_ids[:n_prefix]) == self.prefix_tokens
+
+        start = time.perf_counter()
+        if not in_context:
+            self.client.load_state(self._state)
+            self.restores += 1
+        restore_ms = (time.perf_counter() - start) * 1000
+
+        return {
+            'prefix_tokens': n_prefix,
+            'restored': not in_context,
+            'restore_ms': restore_ms,
+            'prefill_ms_saved': max(0.0, (self.prefill_ms or 0.0) - restore_ms) if not in_context else 0.0
+        }
+
+    def get_stats(self) -> Dict[str, float]:
+        """Prefix size, measured prefill cost and reuse counters."""
+        return {
+            'prefix_tokens': len(self.prefix_tokens),
+            'prefill_ms': self.prefill_ms,
+            'requests': self.requests,
+            'restores': self.restores
+        }
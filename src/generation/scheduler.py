@@ -0,0 +1,271 @@
+"""Priority request queue in front of the LLM worker(s)."""
+
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from typing import Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the generation queue has no room for another request."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a request's deadline passes before it completes."""
+
+
+class GenerationTicket(Future):
+    """
+    Future for a queued generation request.
+
+    Streaming tickets also deliver events through `events()`. `cancel()`
+    removes a waiting request and stops a running stream at the next token.
+    """
+
+    def __init__(self, request: tuple, priority: int, deadline: Optional[float], stream: bool):
+        super().__init__()
+        self.request = request
+        self.priority = priority
+        self.deadline = deadline
+        self.stream = stream
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.abort_requested = threading.Event()
+        self._events: "queue.Queue[Optional[Dict]]" = queue.Queue()
+
+    def cancel(self) -> bool:
+        """Cancel a waiting request, or ask a running stream to stop."""
+        self.abort_requested.set()
+        return super().cancel()
+
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def events(self) -> Iterator[Dict]:
+        """
+        Iterate the events of a streaming request as the worker produces them.
+
+        Yields:
+            Events from `AnswerGenerator.generate_streaming`
+
+        Raises:
+            The request's exception if it was cancelled, expired or failed
+        """
+        if not self.stream:
+            raise ValueError("events() is only available for streaming tickets")
+        while True:
+            try:
+                event = self._events.get(timeout=0.1)
+            except queue.Empty:
+                if self.done() and self._events.empty():
+                    self.result()  # raises the request's exception
+                    return
+                continue
+            if event is None:
+                self.result()
+                return
+            yield event
+
+
+class GenerationScheduler:
+    """Runs generation requests in priority order, `concurrency` at a time."""
+
+    def __init__(self, generator, max_queue_size: int = 32, metrics_window: int = 1000, concurrency: int = 1):
+        """
+        Initialize the scheduler and start its workers.
+
+        Args:
+            generator: AnswerGenerator whose model the workers drive
+            max_queue_size: Maximum waiting requests before submissions are rejected
+            metrics_window: Number of recent requests wait times are computed over
+            concurrency: Requests run at once; 1 for an in-process model, the
+                generator's n_workers when it runs a worker pool
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        self.generator = generator
+        self.max_queue_size = max_queue_size
+        self.concurrency = concurrency
+
+        self._heap: List = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._running: Set[GenerationTicket] = set()
+        self._wait_ms: "deque[float]" = deque(maxlen=metrics_window)
+        self._counters = {'completed': 0, 'failed': 0, 'cancelled': 0, 'expired': 0, 'rejected': 0}
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"llm-scheduler-{idx}", daemon=True)
+            for idx in range(concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]] = None,
+        use_demo_mode: bool = False,
+        priority: int = PRIORITY_INTERACTIVE,
+        deadline: Optional[float] = None,
+        stream: bool = False,
+        max_tokens: Optional[int] = None
+    ) -> GenerationTicket:
+        """
+        Queue a generation request.
+
+        Args:
+            question: User question
+            context: Packed context
+            citations: Optional list of citation dictionaries
+            use_demo_mode: If True, use demo mode (no LLM required)
+            priority: Lower runs first (PRIORITY_INTERACTIVE before PRIORITY_BATCH)
+            deadline: Optional `time.monotonic()` time by which the request must finish
+            stream: Deliver token events through the ticket's `events()`
+            max_tokens: Optional cap on answer tokens for this request
+
+        Returns:
+            Ticket resolving to the response dictionary
+
+        Raises:
+            QueueFullError: If max_queue_size requests are already waiting
+        """
+        ticket = GenerationTicket((question, context, citations, use_demo_mode, max_tokens), priority, deadline, stream)
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+            if len(self._heap) >= self.max_queue_size:
+                # Make room held by requests cancelled while waiting
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled()]
+                heapq.heapify(self._heap)
+            if len(self._heap) >= self.max_queue_size:
+                self._counters['rejected'] += 1
+                raise QueueFullError(f"Generation queue is full ({self.max_queue_size} waiting)")
+            heapq.heappush(self._heap, (priority, next(self._sequence), ticket))
+            self._condition.notify()
+        return ticket
+
+    def _next_ticket(self) -> Optional[GenerationTicket]:
+        """Block until a request is waiting; None on shutdown."""
+        with self._condition:
+            while not self._heap and not self._shutdown:
+                self._condition.wait()
+            if self._shutdown and not self._heap:
+                return None
+            _, _, ticket = heapq.heappop(self._heap)
+            return ticket
+
+    def _run(self) -> None:
+        """Worker loop: the only threads that call into the model."""
+        while True:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+
+            if not ticket.set_running_or_notify_cancel():
+                self._count('cancelled')
+                continue
+            if ticket.expired():
+                self._count('expired')
+                ticket.set_exception(DeadlineExceededError("Deadline passed while queued"))
+                ticket._events.put(None)
+                continue
+
+            ticket.started_at = time.monotonic()
+            with self._condition:
+                self._wait_ms.append((ticket.started_at - ticket.submitted_at) * 1000)
+                self._running.add(ticket)
+            try:
+                self._execute(ticket)
+            finally:
+                with self._condition:
+                    self._running.discard(ticket)
+                ticket._events.put(None)
+
+    def _count(self, counter: str) -> None:
+        """Increment a request counter; workers finish requests concurrently."""
+        with self._condition:
+            self._counters[counter] += 1
+
+    def _execute(self, ticket: GenerationTicket) -> None:
+        """Run one request, settling its future."""
+        question, context, citations, use_demo_mode, max_tokens = ticket.request
+        try:
+            if not ticket.stream:
+                response = self.generator.generate(question, context, citations, use_demo_mode, max_tokens=max_tokens)
+                ticket.set_result(response)
+                self._count('completed')
+                return
+
+            events = self.generator.generate_streaming(question, context, citations, use_demo_mode, max_tokens=max_tokens)
+            try:
+                for event in events:
+                    if ticket.abort_requested.is_set():
+                        raise CancelledError()
+                    if ticket.expired():
+                        raise DeadlineExceededError("Deadline passed while generating")
+                    if event['type'] == 'done':
+                        ticket.set_result(event['response'])
+                        self._count('completed')
+                    ticket._events.put(event)
+            finally:
+                events.close()
+            if not ticket.done():
+                raise RuntimeError("Generation stream ended without a response")
+        except CancelledError as e:
+            self._count('cancelled')
+            ticket.set_exception(e)
+        except DeadlineExceededError as e:
+            self._count('expired')
+            ticket.set_exception(e)
+        except Exception as e:
+            logger.error(f"Generation request failed: {e}")
+            self._count('failed')
+            ticket.set_exception(e)
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Queue depth, wait times and request counters for monitoring."""
+        with self._condition:
+            depth = sum(1 for _, _, ticket in self._heap if not ticket.cancelled())
+            waits = sorted(self._wait_ms)
+        return {
+            'queue_depth': depth,
+            'in_flight': len(self._running),
+            'concurrency': self.concurrency,
+            'max_queue_size': self.max_queue_size,
+            'mean_wait_ms': sum(waits) / len(waits) if waits else 0.0,
+            'p95_wait_ms': waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            **self._counters
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop accepting requests and cancel waiting ones.
+
+        Args:
+            wait: Block until the running requests finish
+        """
+        with self._condition:
+            self._shutdown = True
+            pending = [ticket for _, _, ticket in self._heap]
+            self._heap.clear()
+            self._condition.notify_all()
+        for ticket in pending:
+            ticket.cancel()
+        if wait:
+            for worker in self._workers:
+                worker.join()
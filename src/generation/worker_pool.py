@@ -0,0 +1,353 @@
+"""Pool of LLM worker processes, each running its own llama.cpp instance."""
+
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future, InvalidStateError, TimeoutError
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Worker -> parent message kinds
+_READY = 'ready'
+_TOKEN = 'token'
+_DONE = 'done'
+_ERROR = 'error'
+_CANCELLED = 'cancelled'
+_TERMINAL = (_DONE, _ERROR, _CANCELLED)
+# Seconds between worker liveness checks while waiting on results
+_LIVENESS_POLL_S = 1.0
+
+
+def _worker_main(worker_id: int, generator_kwargs: Dict, requests, results, cancel_id) -> None:
+    """
+    Worker process: load and warm up one model, then serve requests until told to stop.
+
+    llama.cpp memory-maps the GGUF file by default, so the weights of all
+    workers share the same page-cache pages instead of one copy each.
+    """
+    from .generator import AnswerGenerator
+
+    generator = AnswerGenerator(**generator_kwargs)
+    results.put((worker_id, None, _READY, generator.warm_up()))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            return
+        request_id, question, context, citations, stream, max_tokens = message
+        if cancel_id.value == request_id:
+            results.put((worker_id, request_id, _CANCELLED, None))
+            continue
+        try:
+            if not stream:
+                results.put((worker_id, request_id, _DONE, generator.generate(question, context, citations, max_tokens=max_tokens)))
+                continue
+            events = generator.generate_streaming(question, context, citations, max_tokens=max_tokens)
+            for event in events:
+                if cancel_id.value == request_id:
+                    events.close()
+                    results.put((worker_id, request_id, _CANCELLED, None))
+                    break
+                if event['type'] == 'token':
+                    results.put((worker_id, request_id, _TOKEN, event['text']))
+                else:
+                    results.put((worker_id, request_id, _DONE, event['response']))
+        except Exception as e:
+            results.put((worker_id, request_id, _ERROR, f"{type(e).__name__}: {e}"))
+
+
+class PoolRequest:
+    """A request dispatched to one worker of an `LLMWorkerPool`."""
+
+    def __init__(self, request_id: int, worker_id: int, stream: bool):
+        self.request_id = request_id
+        self.worker_id = worker_id
+        self.stream = stream
+        self.future: Future = Future()
+        self.events: "queue.Queue[Optional[Dict]]" = queue.Queue()
+
+
+class LLMWorkerPool:
+    """
+    Runs N model workers in separate processes and balances requests across them.
+
+    Each worker owns a full llama.cpp context with its own thread count, so
+    N requests generate in parallel. Requests go to the live worker with the
+    fewest outstanding requests.
+    """
+
+    def __init__(self, generator_kwargs: Dict, n_workers: int):
+        """
+        Start the worker processes.
+
+        Args:
+            generator_kwargs: AnswerGenerator arguments for each worker's model
+                (model_path, n_threads per worker, n_ctx, ...)
+            n_workers: Number of worker processes
+        """
+        if n_workers < 1:
+            raise ValueError(f"n_workers must be at least 1, got {n_workers}")
+        self.n_workers = n_workers
+        self.generator_kwargs = dict(generator_kwargs, n_workers=1)
+
+        # Spawned workers don't inherit the parent's threads, locks or torch state
+        context = multiprocessing.get_context("spawn")
+        self._results = context.Queue()
+        self._requests = [context.Queue() for _ in range(n_workers)]
+        self._cancel_ids = [context.Value('q', -1, lock=False) for _ in range(n_workers)]
+        self._processes = [
+            context.Process(
+                target=_worker_main,
+                args=(worker_id, self.generator_kwargs, self._requests[worker_id], self._results, self._cancel_ids[worker_id]),
+                name=f"llm-worker-{worker_id}",
+                daemon=True
+            )
+            for worker_id in range(n_workers)
+        ]
+
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._dispatches = itertools.count()
+        self._pending: Dict[int, PoolRequest] = {}
+        self._outstanding = [0] * n_workers
+        self._completed = [0] * n_workers
+        self._alive = [True] * n_workers
+        self._loaded: List[Optional[bool]] = [None] * n_workers
+        self._ready = threading.Condition(self._lock)
+        self._closed = False
+
+        for process in self._processes:
+            process.start()
+        self._collector = threading.Thread(target=self._collect, name="llm-pool-collector", daemon=True)
+        self._collector.start()
+        logger.info(f"Started {n_workers} LLM worker processes ({self.generator_kwargs.get('n_threads')} threads each)")
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every live worker has finished loading its model.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if all live workers loaded the model successfully
+        """
+        with self._ready:
+            self._ready.wait_for(
+                lambda: all(loaded is not None or not alive for loaded, alive in zip(self._loaded, self._alive)),
+                timeout
+            )
+            return any(self._alive) and all(
+                loaded is True for loaded, alive in zip(self._loaded, self._alive) if alive
+            )
+
+    def _pick_worker(self) -> int:
+        """Live worker with the fewest outstanding requests, rotating between ties."""
+        live = [worker_id for worker_id in range(self.n_workers) if self._alive[worker_id]]
+        if not live:
+            raise RuntimeError("No LLM worker processes are running")
+        offset = next(self._dispatches) % self.n_workers
+        return min(live, key=lambda w: (self._outstanding[w], (w - offset) % self.n_workers))
+
+    def submit(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]] = None,
+        stream: bool = False,
+        max_tokens: Optional[int] = None
+    ) -> PoolRequest:
+        """
+        Dispatch a request to the least-loaded worker.
+
+        Args:
+            question: User question
+            context: Packed context
+            citations: Optional list of citation dictionaries
+            stream: Deliver token events through the request's `events` queue
+            max_tokens: Optional cap on answer tokens
+
+        Returns:
+            PoolRequest whose future resolves to the response dictionary
+        """
+        # Don't dispatch to a worker that died since the last check
+        self._check_workers()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool has been shut down")
+            worker_id = self._pick_worker()
+            request = PoolRequest(next(self._request_ids), worker_id, stream)
+            self._pending[request.request_id] = request
+            self._outstanding[worker_id] += 1
+        self._requests[worker_id].put((request.request_id, question, context, citations, stream, max_tokens))
+        return request
+
+    def generate(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, any]:
+        """Generate an answer on a worker; same response as `AnswerGenerator.generate`."""
+        request = self.submit(question, context, citations, max_tokens=max_tokens)
+        while True:
+            try:
+                return request.future.result(timeout=_LIVENESS_POLL_S)
+            except TimeoutError:
+                self._check_workers()
+
+    def generate_streaming(
+        self,
+        question: str,
+        context: str,
+        citations: Optional[List[Dict]] = None,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Stream an answer from a worker.
+
+        Yields:
+            The events of `AnswerGenerator.generate_streaming`
+
+        Raises:
+            RuntimeError: If the worker failed or died
+        """
+        request = self.submit(question, context, citations, stream=True, max_tokens=max_tokens)
+        try:
+            while True:
+                try:
+                    event = request.events.get(timeout=_LIVENESS_POLL_S)
+                except queue.Empty:
+                    self._check_workers()
+                    continue
+                if event is None:
+                    request.future.result()  # raises the worker's error
+                    return
+                yield event
+                if event['type'] == 'done':
+                    return
+        finally:
+            if not request.future.done():
+                self.cancel(request)
+
+    def cancel(self, request: PoolRequest) -> None:
+        """
+        Ask the worker to drop a request, or stop streaming it at the next token.
+
+        Each worker holds one cancellation slot; with the scheduler running
+        one request per worker that is the request being generated.
+        """
+        self._cancel_ids[request.worker_id].value = request.request_id
+        if request.future.cancel():
+            request.events.put(None)
+
+    def _collect(self) -> None:
+        """Route worker messages to their requests; fail requests of dead workers."""
+        last_check = time.monotonic()
+        while True:
+            # Checked under steady load too, when results never stop arriving
+            if time.monotonic() - last_check >= _LIVENESS_POLL_S:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                worker_id, request_id, kind, payload = self._results.get(timeout=_LIVENESS_POLL_S)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+
+            if kind == _READY:
+                with self._ready:
+                    self._loaded[worker_id] = bool(payload)
+                    self._ready.notify_all()
+                if not payload:
+                    logger.warning(f"LLM worker {worker_id} could not load the model; it will answer in demo mode")
+                continue
+
+            with self._lock:
+                request = self._pending.get(request_id)
+                if kind in _TERMINAL:
+                    self._pending.pop(request_id, None)
+                    self._outstanding[worker_id] -= 1
+                    if kind == _DONE:
+                        self._completed[worker_id] += 1
+            if request is None or request.future.cancelled():
+                continue
+
+            try:
+                if kind == _TOKEN:
+                    request.events.put({'type': 'token', 'text': payload})
+                elif kind == _DONE:
+                    payload['worker'] = worker_id
+                    request.future.set_result(payload)
+                    request.events.put({'type': 'done', 'response': payload})
+                elif kind == _ERROR:
+                    request.future.set_exception(RuntimeError(f"LLM worker {worker_id} failed: {payload}"))
+                    request.events.put(None)
+                else:
+                    request.future.set_exception(CancelledError())
+                    request.events.put(None)
+            except InvalidStateError:
+                # Cancelled by the caller since the check above
+                pass
+
+    def _check_workers(self) -> None:
+        """Mark exited workers dead and fail the requests they held."""
+        for worker_id, process in enumerate(self._processes):
+            if not self._alive[worker_id] or process.is_alive():
+                continue
+            with self._ready:
+                if not self._alive[worker_id]:
+                    # Another thread noticed first
+                    continue
+                self._alive[worker_id] = False
+                orphans = [r for r in self._pending.values() if r.worker_id == worker_id]
+                for request in orphans:
+                    del self._pending[request.request_id]
+                self._outstanding[worker_id] = 0
+                self._ready.notify_all()
+            logger.error(f"LLM worker {worker_id} exited with code {process.exitcode}")
+            for request in orphans:
+                try:
+                    request.future.set_exception(RuntimeError(f"LLM worker {worker_id} exited"))
+                except InvalidStateError:
+                    pass
+                request.events.put(None)
+
+    def get_stats(self) -> Dict[str, any]:
+        """Per-worker liveness, load state, outstanding and completed requests."""
+        with self._lock:
+            return {
+                'workers': self.n_workers,
+                'threads_per_worker': self.generator_kwargs.get('n_threads'),
+                'alive': sum(self._alive),
+                'outstanding': list(self._outstanding),
+                'completed': list(self._completed),
+                'loaded': list(self._loaded)
+            }
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """
+        Stop the workers after the requests already queued to them.
+
+        Args:
+            timeout: Seconds to wait for each worker before terminating it
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._collector.join(timeout)
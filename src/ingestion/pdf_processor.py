@@ -2,7 +2,7 @@
 
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import PyPDF2
 from pypdf import PdfReader
 
@@ -61,12 +61,18 @@ class PDFProcessor:
             logger.error(f"Error processing PDF {pdf_path}: {e}")
             raise
     
-    def process_directory(self, directory_path: str) -> List[Dict[str, any]]:
+    def process_directory(
+        self,
+        directory_path: str,
+        progress: Optional[Callable[[int, int, int], None]] = None
+    ) -> List[Dict[str, any]]:
         """
         Process all PDF files in a directory.
         
         Args:
             directory_path: Path to directory containing PDF files
+            progress: Optional callback receiving (files done, files total,
+                pages extracted) before the first file and after each one
             
         Returns:
             List of all pages from all PDFs
@@ -83,14 +89,17 @@ class PDFProcessor:
             return all_pages
         
         logger.info(f"Found {len(pdf_files)} PDF files in {directory}")
+        if progress is not None:
+            progress(0, len(pdf_files), 0)
         
-        for pdf_file in pdf_files:
+        for files_done, pdf_file in enumerate(pdf_files, start=1):
             try:
                 pages = self.process_pdf(str(pdf_file))
                 all_pages.extend(pages)
             except Exception as e:
                 logger.error(f"Failed to process {pdf_file}: {e}")
-                continue
+            if progress is not None:
+                progress(files_done, len(pdf_files), len(all_pages))
         
         return all_pages
 
@@ -0,0 +1,257 @@
+"""Background ingestion jobs: one worker process per job, its progress kept in a JSON record."""
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .rag_pipeline import RAGPipeline
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+# Directory from which worker processes import the `src` package
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+class JobCancelled(Exception):
+    """Raised in a worker to stop a job that was cancelled."""
+
+
+def _write_record(path: Path, record: Dict) -> None:
+    """Replace a job record at once, so readers never see it half-written."""
+    partial = path.with_suffix(".partial")
+    partial.write_text(json.dumps(record, indent=2))
+    os.replace(partial, path)
+
+
+def _stage_eta_s(counts: Dict[str, any], stage_elapsed_s: float) -> Optional[float]:
+    """Seconds left in the current stage, extrapolated from its rate so far."""
+    if counts['stage'] == 'extracting':
+        done, total = counts['files_done'], counts['files_total']
+    elif counts['stage'] == 'embedding':
+        done, total = counts['chunks_embedded'], counts['chunks_total']
+    else:
+        return None
+    if not done or not total:
+        return None
+    return stage_elapsed_s * (total - done) / done
+
+
+def _swap_into_place(staging: Path, target: Path) -> None:
+    """Replace the index directory at target with the one built in staging."""
+    previous = None
+    if target.exists():
+        previous = target.with_name(f".{target.name}.previous-{uuid.uuid4().hex}")
+        os.replace(target, previous)
+    os.replace(staging, target)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+class IngestionJobRunner:
+    """
+    Runs ingestion in worker processes and reports their progress.
+
+    A job builds its index in a staging directory next to the target and
+    swaps it in only once saved, so queries keep using the current index
+    meanwhile and a failed or cancelled job leaves it untouched. Records
+    are JSON files in jobs_dir, written only by the worker, so progress
+    survives page reloads and restarts of the app.
+    """
+
+    def __init__(self, jobs_dir: str = "logs/ingestion_jobs"):
+        """
+        Initialize the runner.
+
+        Args:
+            jobs_dir: Directory holding job records, cancel markers and
+                worker logs
+        """
+        self.jobs_dir = Path(jobs_dir).resolve()
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        # Workers started here, polled so their exit is noticed (and reaped)
+        self._processes: Dict[str, subprocess.Popen] = {}
+
+    def _record_path(self, job_id: str) -> Path:
+        if not JOB_ID.match(job_id):
+            raise ValueError(f"Invalid job ID: {job_id!r}")
+        return self.jobs_dir / f"{job_id}.json"
+
+    def submit(
+        self,
+        pdf_path: str,
+        index_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    ) -> str:
+        """
+        Start building an index from PDFs in a worker process.
+
+        Args:
+            pdf_path: Path to PDF file or directory
+            index_path: Index directory to replace once the job succeeds
+            chunk_size: Document chunk size
+            chunk_overlap: Overlap between chunks
+            embedding_model: HuggingFace embedding model name
+
+        Returns:
+            The job ID
+        """
+        if not Path(pdf_path).exists():
+            raise ValueError(f"Invalid path: {pdf_path}")
+        index_path = str(Path(index_path).resolve())
+        for job in self.list_jobs():
+            if job['state'] in ACTIVE_STATES and job['index_path'] == index_path:
+                raise ValueError(f"Job {job['job_id']} is already building {index_path}")
+
+        job_id = uuid.uuid4().hex
+        record_path = self._record_path(job_id)
+        _write_record(record_path, {
+            'job_id': job_id,
+            'pdf_path': str(Path(pdf_path).resolve()),
+            'index_path': index_path,
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap,
+            'embedding_model': embedding_model,
+            'state': 'queued',
+            'stage': None,
+            'pid': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'updated_at': None,
+            'finished_at': None,
+            'files_done': 0,
+            'files_total': 0,
+            'pages_extracted': 0,
+            'chunks_embedded': 0,
+            'chunks_total': 0,
+            'eta_s': None,
+            'error': None
+        })
+        with open(self.jobs_dir / f"{job_id}.log", "ab") as log:
+            # A session of its own, so stopping the app doesn't stop the job
+            self._processes[job_id] = subprocess.Popen(
+                [sys.executable, "-m", "src.ingestion_jobs", str(record_path)],
+                cwd=str(PROJECT_ROOT),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        logger.info(f"Started ingestion job {job_id}: {pdf_path} -> {index_path}")
+        return job_id
+
+    def _worker_alive(self, record: Dict) -> bool:
+        """Whether the worker of an active job is still running."""
+        process = self._processes.get(record['job_id'])
+        if process is not None:
+            return process.poll() is None
+        if record['pid'] is None or os.name != "posix":
+            # Queued by another app process, or no portable way to check
+            return True
+        try:
+            os.kill(record['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def get(self, job_id: str) -> Dict:
+        """
+        A job's record: state ('queued', 'running', 'succeeded', 'failed' or
+        'cancelled'), stage, files, pages and chunks so far, and the
+        seconds left in the current stage ('eta_s').
+        """
+        record_path = self._record_path(job_id)
+        if not record_path.exists():
+            raise ValueError(f"Unknown ingestion job: {job_id}")
+        record = json.loads(record_path.read_text())
+        if record['state'] in ACTIVE_STATES and not self._worker_alive(record):
+            # The worker can no longer update its record, so mark it here
+            record = json.loads(record_path.read_text())
+            if record['state'] in ACTIVE_STATES:
+                record.update(state='failed', error="Worker exited unexpectedly", eta_s=None, finished_at=time.time())
+                _write_record(record_path, record)
+        return record
+
+    def list_jobs(self) -> List[Dict]:
+        """Every job's record, newest first."""
+        records = [self.get(path.stem) for path in self.jobs_dir.glob("*.json") if JOB_ID.match(path.stem)]
+        return sorted(records, key=lambda record: record['created_at'], reverse=True)
+
+    def cancel(self, job_id: str) -> None:
+        """Ask a job to stop; its worker does after the current file or embedding batch."""
+        if self.get(job_id)['state'] in ACTIVE_STATES:
+            self._record_path(job_id).with_suffix(".cancel").touch()
+
+
+def run_job(record_path: str) -> None:
+    """
+    Run the job of a record in this process, keeping the record up to date.
+
+    Args:
+        record_path: Path to the job's JSON record
+    """
+    record_path = Path(record_path)
+    record = json.loads(record_path.read_text())
+    cancel_marker = record_path.with_suffix(".cancel")
+    target = Path(record['index_path'])
+    staging = target.with_name(f".{target.name}.{record['job_id']}")
+    stage_started = {}
+
+    def on_progress(counts: Dict[str, any]) -> None:
+        if cancel_marker.exists():
+            raise JobCancelled()
+        now = time.time()
+        stage_elapsed_s = now - stage_started.setdefault(counts['stage'], now)
+        record.update(counts, updated_at=now, eta_s=_stage_eta_s(counts, stage_elapsed_s))
+        _write_record(record_path, record)
+
+    record.update(state='running', pid=os.getpid(), started_at=time.time())
+    _write_record(record_path, record)
+    pipeline = None
+    try:
+        pipeline = RAGPipeline(
+            model_path="demo_mode",
+            index_path=str(staging),
+            chunk_size=record['chunk_size'],
+            chunk_overlap=record['chunk_overlap'],
+            embedding_model=record['embedding_model'],
+            semantic_cache_threshold=None,
+            response_cache_path=None,
+            usage_log_path=None
+        )
+        pipeline.ingest_documents(record['pdf_path'], progress=on_progress)
+        if cancel_marker.exists():
+            raise JobCancelled()
+        _swap_into_place(staging, target)
+        record.update(state='succeeded', stage='done')
+        logger.info(f"Ingestion job {record['job_id']} built {target}")
+    except JobCancelled:
+        record.update(state='cancelled')
+        logger.info(f"Ingestion job {record['job_id']} cancelled")
+    except Exception as e:
+        record.update(state='failed', error=str(e))
+        logger.exception(f"Ingestion job {record['job_id']} failed")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        cancel_marker.unlink(missing_ok=True)
+        record.update(eta_s=None, finished_at=time.time())
+        _write_record(record_path, record)
+        if pipeline is not None:
+            pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    run_job(sys.argv[1])
@@ -0,0 +1,138 @@
+"""Per-query latency budgets and the stage cost estimates that drive them."""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Share of the remaining time given to each stage still to run. Generation
+# is last, so it also inherits whatever earlier stages did not use.
+DEFAULT_STAGE_SHARES = {
+    'embed': 0.05,
+    'search': 0.1,
+    'rerank': 0.15,
+    'compress': 0.05,
+    'generate': 0.65
+}
+
+
+class StageLatencyModel:
+    """Exponential moving averages of observed stage costs, shared by all queries."""
+
+    def __init__(self, smoothing: float = 0.2):
+        """
+        Initialize the latency model.
+
+        Args:
+            smoothing: Weight of each new observation
+        """
+        self.smoothing = smoothing
+        self._estimates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Fold an observed cost into its estimate.
+
+        Args:
+            name: Cost name, e.g. 'embed_ms' or 'decode_ms_per_token'
+            value: Observed value
+        """
+        with self._lock:
+            previous = self._estimates.get(name)
+            self._estimates[name] = value if previous is None else (1 - self.smoothing) * previous + self.smoothing * value
+
+    def estimate(self, name: str) -> Optional[float]:
+        """Current estimate of a cost, or None if it was never observed."""
+        with self._lock:
+            return self._estimates.get(name)
+
+    def snapshot(self) -> Dict[str, float]:
+        """All current estimates."""
+        with self._lock:
+            return dict(self._estimates)
+
+
+class QueryBudget:
+    """
+    The deadline of one query, split into per-stage budgets.
+
+    Each stage's budget is its share of the time remaining when it starts,
+    among the stages not yet run, so time saved early flows to later
+    stages. Degradations applied to stay within the deadline are recorded
+    for the response.
+    """
+
+    def __init__(self, deadline_ms: float, stage_shares: Optional[Dict[str, float]] = None):
+        """
+        Start the clock for a query.
+
+        Args:
+            deadline_ms: Milliseconds from now within which the answer is due
+            stage_shares: Optional relative weights per stage (see DEFAULT_STAGE_SHARES)
+        """
+        if deadline_ms <= 0:
+            raise ValueError(f"deadline_ms must be positive, got {deadline_ms}")
+        self.deadline_ms = deadline_ms
+        self.started_at = time.monotonic()
+        # `time.monotonic()` deadline, as the generation scheduler expects
+        self.deadline = self.started_at + deadline_ms / 1000
+        self.stage_shares = dict(stage_shares or DEFAULT_STAGE_SHARES)
+        self._pending: List[str] = list(self.stage_shares)
+        self.stage_ms: Dict[str, float] = {}
+        self.degradations: List[str] = []
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the query started."""
+        return (time.monotonic() - self.started_at) * 1000
+
+    def remaining_ms(self) -> float:
+        """Milliseconds left before the deadline (0 once it has passed)."""
+        return max(0.0, (self.deadline - time.monotonic()) * 1000)
+
+    def stage_budget_ms(self, stage: str) -> float:
+        """
+        Milliseconds available to a stage that has not run yet.
+
+        Args:
+            stage: Stage name from the shares
+
+        Returns:
+            The stage's share of the remaining time
+        """
+        pending = [name for name in self._pending if name in self.stage_shares]
+        total = sum(self.stage_shares[name] for name in pending)
+        if stage not in pending or total <= 0:
+            return self.remaining_ms()
+        return self.remaining_ms() * self.stage_shares[stage] / total
+
+    def finish_stage(self, stage: str, elapsed_ms: float) -> None:
+        """Record a stage's duration; later stages share the remaining time."""
+        self.stage_ms[stage] = self.stage_ms.get(stage, 0.0) + elapsed_ms
+        if stage in self._pending:
+            self._pending.remove(stage)
+
+    def skip_stage(self, stage: str, degradation: str, detail: str = "") -> None:
+        """Drop an optional stage, recording the degradation."""
+        if stage in self._pending:
+            self._pending.remove(stage)
+        self.degrade(degradation, detail)
+
+    def degrade(self, degradation: str, detail: str = "") -> None:
+        """Record a degradation applied to meet the deadline."""
+        if degradation not in self.degradations:
+            self.degradations.append(degradation)
+        logger.info(f"Deadline {self.deadline_ms:.0f} ms, {self.remaining_ms():.0f} ms left: {degradation} {detail}".rstrip())
+
+    def report(self) -> Dict[str, any]:
+        """Deadline, elapsed time, per-stage durations and degradations, for the response."""
+        elapsed = self.elapsed_ms()
+        return {
+            'deadline_ms': self.deadline_ms,
+            'elapsed_ms': elapsed,
+            'met': elapsed <= self.deadline_ms,
+            'stage_ms': dict(self.stage_ms),
+            'degradations': list(self.degradations)
+        }
@@ -1,13 +1,29 @@
 """Main RAG pipeline orchestrator."""
 
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Optional, Dict, List
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, Optional, Dict, List, Tuple
 from pathlib import Path
 
 from .ingestion import PDFProcessor, DocumentChunker
 from .embeddings import Embedder, VectorIndexer
-from .retrieval import Retriever
-from .generation import AnswerGenerator
+from .retrieval import Retriever, CrossEncoderReranker, ContextCompressor
+from .generation import (
+    AnswerGenerator,
+    GenerationScheduler,
+    GenerationTicket,
+    DeadlineExceededError,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE
+)
+from .caching import SemanticCache, ResponseCache
+from .evaluation.usage_log import UsageLog
+from .query_budget import QueryBudget, StageLatencyModel
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +31,11 @@ logger = logging.getLogger(__name__)
 class RAGPipeline:
     """Orchestrates the complete RAG pipeline from ingestion to generation."""
     
+    # Under a deadline, answers are not capped below this many tokens...
+    MIN_ANSWER_TOKENS = 64
+    # ...nor is the context shrunk below this many; past both, answers are extractive
+    MIN_CONTEXT_TOKENS = 256
+    
     def __init__(
         self,
         model_path: str,
@@ -22,7 +43,40 @@ class RAGPipeline:
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
-        retrieval_k: int = 5
+        retrieval_k: int = 5,
+        retrieval_mode: str = "hybrid",
+        score_threshold: Optional[float] = None,
+        rerank_model: Optional[str] = None,
+        rerank_fetch_k: int = 20,
+        rerank_budget_ms: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+        max_chunks_per_source: Optional[int] = None,
+        max_chunks_per_page: Optional[int] = None,
+        semantic_cache_threshold: Optional[float] = None,
+        semantic_cache_size: int = 1000,
+        response_cache_path: Optional[str] = None,
+        response_cache_ttl: Optional[float] = 7 * 24 * 3600,
+        context_token_budget: Optional[int] = None,
+        compression_ratio: Optional[float] = None,
+        expand_window: int = 0,
+        coarse_top_d: Optional[int] = None,
+        prefix_cache_path: Optional[str] = None,
+        generation_queue_size: int = 32,
+        llm_workers: int = 1,
+        llm_threads_per_worker: Optional[int] = None,
+        llm_not_ready_policy: str = "wait",
+        llm_ready_timeout_s: Optional[float] = None,
+        usage_log_path: Optional[str] = None,
+        stage_budget_shares: Optional[Dict[str, float]] = None,
+        embed_workers: int = 1,
+        search_workers: int = 4,
+        mmap_index: bool = False,
+        embedder: Optional[Embedder] = None,
+        generator: Optional[AnswerGenerator] = None,
+        scheduler: Optional[GenerationScheduler] = None,
+        usage_log: Optional[UsageLog] = None,
+        indexer: Optional[VectorIndexer] = None,
+        reranker: Optional[CrossEncoderReranker] = None
     ):
         """
         Initialize the RAG pipeline.
@@ -34,9 +88,71 @@ class RAGPipeline:
             chunk_size: Document chunk size
             chunk_overlap: Chunk overlap size
             retrieval_k: Number of documents to retrieve
+            retrieval_mode: "dense" or "hybrid" (dense + BM25 keyword search)
+            score_threshold: Optional minimum cosine similarity for dense hits
+            rerank_model: Optional cross-encoder model name; enables reranking
+            rerank_fetch_k: Candidates over-fetched for the reranker
+            rerank_budget_ms: Optional latency budget for reranking
+            mmr_lambda: Optional MMR relevance/diversity trade-off; enables MMR
+            max_chunks_per_source: Optional MMR cap on chunks from one source
+            max_chunks_per_page: Optional MMR cap on chunks from one page
+            semantic_cache_threshold: Optional cosine similarity at which a
+                previous question's answer is reused (None disables the cache)
+            semantic_cache_size: Maximum number of cached answers
+            response_cache_path: Optional SQLite file for the persistent
+                exact-match response cache (None disables it)
+            response_cache_ttl: Maximum age of exact-match entries in seconds
+            context_token_budget: Optional cap on prompt context tokens; the
+                model's window (n_ctx minus answer and template) always applies
+            compression_ratio: Optional fraction of retrieved context characters
+                kept by extractive sentence compression (None disables it)
+            expand_window: Neighbouring chunks added around each hit when
+                building the prompt; pair with a small chunk_size (0 disables)
+            coarse_top_d: Optional number of documents picked by centroid
+                similarity before the chunk search (for very large corpora)
+            prefix_cache_path: Optional file persisting the KV state of the
+                prompt's instruction prefix across restarts
+            generation_queue_size: Maximum LLM requests waiting for the model
+            llm_workers: Model instances in separate processes answering in
+                parallel (1 runs the model in this process)
+            llm_threads_per_worker: Optional threads per model instance
+                (default divides the CPUs among the workers)
+            llm_not_ready_policy: What queries do while a background LLM load
+                runs: "wait" for it, or "fallback" to an extractive answer
+            llm_ready_timeout_s: Optional maximum wait under the "wait" policy,
+                after which the query falls back
+            usage_log_path: Optional rotating JSONL file receiving each
+                response's token and timing usage (None disables it)
+            stage_budget_shares: Optional relative split of a query deadline
+                between 'embed', 'search', 'rerank', 'compress' and 'generate'
+                (see query_budget.DEFAULT_STAGE_SHARES)
+            embed_workers: Threads embedding questions for `aquery`
+            search_workers: Threads running cache lookups, retrieval and
+                context packing for `aquery`
+            mmap_index: Memory-map the loaded FAISS vectors read-only, so
+                server worker processes share one copy in the page cache
+            embedder: Optional embedder shared with other pipelines, in place
+                of loading embedding_model
+            generator: Optional answer generator shared with other pipelines
+                (model_path and the LLM settings are then its own)
+            scheduler: Optional scheduler over the shared generator
+            usage_log: Optional usage log shared with other pipelines, in
+                place of opening usage_log_path
+            indexer: Optional index shared with other pipelines; when already
+                loaded, the pipeline is ready to query without `load_index`
+            reranker: Optional cross-encoder shared with other pipelines, in
+                place of loading rerank_model
+        
+        Shared components are not shut down with this pipeline.
         """
+        if llm_not_ready_policy not in ("wait", "fallback"):
+            raise ValueError(f"llm_not_ready_policy must be 'wait' or 'fallback', got {llm_not_ready_policy!r}")
         self.model_path = model_path
         self.index_path = index_path or "models/faiss_index"
+        self.mmap_index = mmap_index
+        self.retrieval_k = retrieval_k
+        self.retrieval_mode = retrieval_mode
+        self.score_threshold = score_threshold
         
         # Initialize components
         self.pdf_processor = PDFProcessor()
@@ -44,35 +160,103 @@ class RAGPipeline:
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
-        self.embedder = Embedder(model_name=embedding_model)
-        self.indexer = VectorIndexer(
+        self.embedder = embedder or Embedder(model_name=embedding_model)
+        self.indexer = indexer or VectorIndexer(
             embeddings=self.embedder.embeddings,
             index_path=self.index_path
         )
+        self.reranker = reranker or (CrossEncoderReranker(
+            model_name=rerank_model,
+            latency_budget_ms=rerank_budget_ms
+        ) if rerank_model else None)
+        self._owns_reranker = reranker is None
+        self.rerank_fetch_k = rerank_fetch_k
+        self.context_token_budget = context_token_budget
+        self.compressor = ContextCompressor(
+            embed_texts=self.embedder.embeddings.embed_documents,
+            compression_ratio=compression_ratio
+        ) if compression_ratio is not None else None
+        self.mmr_lambda = mmr_lambda
+        self.max_chunks_per_source = max_chunks_per_source
+        self.max_chunks_per_page = max_chunks_per_page
+        self.expand_window = expand_window
+        self.coarse_top_d = coarse_top_d
         self.retriever: Optional[Retriever] = None
+        self.semantic_cache = SemanticCache(
+            similarity_threshold=semantic_cache_threshold,
+            max_entries=semantic_cache_size
+        ) if semantic_cache_threshold is not None else None
+        self.response_cache = ResponseCache(
+            db_path=response_cache_path,
+            ttl_seconds=response_cache_ttl
+        ) if response_cache_path else None
         # Initialize generator lazily - don't fail if llama-cpp-python not installed
         # Generator is only needed for querying, not ingestion
-        self.generator = None
-        self._generator_initialized = False
+        self.generator = generator
+        self._generator_initialized = generator is not None
+        # A shared generator and scheduler belong to whoever created them
+        self._owns_generation = generator is None
         self._model_path = model_path  # Store for lazy initialization
+        self.prefix_cache_path = prefix_cache_path
+        # All LLM calls go through the scheduler: one request per model instance
+        # at a time, since a llama.cpp context is not thread-safe
+        self.generation_queue_size = generation_queue_size
+        self.llm_workers = llm_workers
+        self.llm_threads_per_worker = llm_threads_per_worker
+        self.llm_not_ready_policy = llm_not_ready_policy
+        self.llm_ready_timeout_s = llm_ready_timeout_s
+        self._owns_usage_log = usage_log is None
+        self.usage_log = usage_log or (UsageLog(usage_log_path) if usage_log_path else None)
+        self.stage_budget_shares = stage_budget_shares
+        # Observed stage and per-token costs that deadline-bound queries plan with
+        self.stage_latency = StageLatencyModel()
+        # Executors for aquery, created on first use
+        self.embed_workers = embed_workers
+        self.search_workers = search_workers
+        self._embed_executor: Optional[ThreadPoolExecutor] = None
+        self._search_executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.scheduler = scheduler
+        if self.indexer.vectorstore is not None:
+            self.retriever = self._create_retriever()
         
         logger.info("RAG Pipeline initialized")
     
-    def ingest_documents(self, pdf_path: str) -> None:
+    def ingest_documents(self, pdf_path: str, progress: Optional[Callable[[Dict[str, any]], None]] = None) -> None:
         """
         Ingest PDF documents and create vector index.
         
         Args:
             pdf_path: Path to PDF file or directory
+            progress: Optional callback receiving the counts so far ('stage',
+                'files_done', 'files_total', 'pages_extracted',
+                'chunks_embedded', 'chunks_total') as ingestion advances; an
+                exception it raises stops ingestion before the index is saved
         """
         logger.info(f"Ingesting documents from: {pdf_path}")
+        counts = {
+            'stage': 'extracting', 'files_done': 0, 'files_total': 0,
+            'pages_extracted': 0, 'chunks_embedded': 0, 'chunks_total': 0
+        }
+        
+        def report(**changes) -> None:
+            counts.update(changes)
+            if progress is not None:
+                progress(dict(counts))
         
         # Process PDFs
         pdf_path_obj = Path(pdf_path)
         if pdf_path_obj.is_file():
+            report(files_total=1)
             pages = self.pdf_processor.process_pdf(pdf_path)
+            report(files_done=1, pages_extracted=len(pages))
         elif pdf_path_obj.is_dir():
-            pages = self.pdf_processor.process_directory(pdf_path)
+            pages = self.pdf_processor.process_directory(
+                pdf_path,
+                progress=lambda done, total, extracted: report(
+                    files_done=done, files_total=total, pages_extracted=extracted
+                )
+            )
         else:
             raise ValueError(f"Invalid path: {pdf_path}")
         
@@ -83,74 +267,1035 @@ class RAGPipeline:
         documents = self.chunker.chunk_pages(pages)
         
         # Create index
-        self.indexer.create_index(documents)
+        report(stage='embedding', chunks_total=len(documents))
+        self.indexer.create_index(documents, progress=lambda done, total: report(chunks_embedded=done))
+        report(stage='saving')
         self.indexer.save_index()
         
         # Initialize retriever
-        self.retriever = Retriever(
-            vectorstore=self.indexer.get_vectorstore(),
-            k=5
-        )
+        self.retriever = self._create_retriever()
         
         logger.info("Document ingestion completed")
     
-    def load_index(self) -> None:
-        """Load existing vector index."""
+    def load_index(self, warm_llm: bool = False) -> None:
+        """
+        Load existing vector index.
+        
+        Args:
+            warm_llm: Also start loading and warming up the LLM on a
+                background thread, so the first query doesn't wait for it
+        """
         logger.info(f"Loading index from: {self.index_path}")
-        self.indexer.load_index()
-        self.retriever = Retriever(
+        self.indexer.load_index(mmap=self.mmap_index)
+        self.retriever = self._create_retriever()
+        logger.info("Index loaded successfully")
+        if warm_llm and Path(self._model_path).exists():
+            self._get_generator().start_background_load()
+    
+    def get_llm_readiness(self) -> Dict[str, any]:
+        """LLM load state and timings (see AnswerGenerator.get_readiness)."""
+        if self.generator is None:
+            return {'state': 'not_loaded', 'load_ms': None, 'warmup_ms': None, 'error': None}
+        return self.generator.get_readiness()
+    
+    def list_sources(self) -> List[str]:
+        """Source documents in the loaded index."""
+        if self.retriever is None:
+            raise ValueError("No index loaded. Load or ingest documents first.")
+        return self.retriever.list_sources()
+    
+    def _llm_still_loading(self) -> bool:
+        """Whether a background LLM load runs and the not-ready policy is to fall back."""
+        return self.llm_not_ready_policy == "fallback" and self._get_generator().is_loading()
+    
+    def _create_retriever(self) -> Retriever:
+        """Create a retriever over the current index."""
+        if self.reranker is not None and self._owns_reranker:
+            # Cached scores are keyed by chunk ID, which a new index reassigns
+            # (a shared reranker keeps each index's scores under its version)
+            self.reranker.clear_cache()
+        # A shared generator's extractive answers serve other indexes too
+        if self.generator is not None and self._owns_generation:
+            self.generator.extractive.keyword_index = self.indexer.keyword_index
+        return Retriever(
             vectorstore=self.indexer.get_vectorstore(),
-            k=5
+            k=self.retrieval_k,
+            score_threshold=self.score_threshold,
+            keyword_index=self.indexer.keyword_index,
+            search_mode=self.retrieval_mode,
+            reranker=self.reranker,
+            rerank_fetch_k=self.rerank_fetch_k,
+            rerank_scope=self.indexer.index_version,
+            mmr_lambda=self.mmr_lambda,
+            max_per_source=self.max_chunks_per_source,
+            max_per_page=self.max_chunks_per_page,
+            expand_window=self.expand_window,
+            centroid_index=self.indexer.centroid_index,
+            coarse_top_d=self.coarse_top_d
         )
-        logger.info("Index loaded successfully")
     
-    def query(self, question: str, k: Optional[int] = None) -> Dict:
+    def _get_generator(self) -> AnswerGenerator:
+        """Create the answer generator on first use (the LLM itself loads lazily)."""
+        if self.generator is None:
+            self.generator = AnswerGenerator(
+                model_path=self._model_path,
+                n_threads=self.llm_threads_per_worker,
+                prefix_cache_path=self.prefix_cache_path,
+                n_workers=self.llm_workers
+            )
+            # Extractive answers weight question terms by corpus IDF
+            self.generator.extractive.keyword_index = self.indexer.keyword_index
+            self._generator_initialized = True
+        return self.generator
+    
+    def _get_scheduler(self) -> GenerationScheduler:
+        """Create the generation scheduler on first use."""
+        if self.scheduler is None:
+            self.scheduler = GenerationScheduler(
+                self._get_generator(),
+                max_queue_size=self.generation_queue_size,
+                concurrency=self.llm_workers
+            )
+        return self.scheduler
+    
+    def get_generation_metrics(self) -> Dict[str, float]:
+        """Generation queue depth, wait times, request counters and worker pool state."""
+        if self.scheduler is None:
+            return {'queue_depth': 0, 'in_flight': 0, 'mean_wait_ms': 0.0, 'p95_wait_ms': 0.0}
+        metrics = self.scheduler.get_metrics()
+        if self.generator is not None and self.generator.pool is not None:
+            metrics['workers'] = self.generator.pool.get_stats()
+        return metrics
+    
+    def shutdown(self) -> None:
+        """Stop the generation scheduler, LLM workers and query executors, and close the usage log."""
+        if self.scheduler is not None and self._owns_generation:
+            self.scheduler.shutdown()
+            self.scheduler = None
+        if self.generator is not None and self._owns_generation:
+            self.generator.shutdown()
+        with self._executor_lock:
+            for executor in (self._embed_executor, self._search_executor):
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            self._embed_executor = self._search_executor = None
+        if self.usage_log is not None and self._owns_usage_log:
+            self.usage_log.close()
+    
+    def _response_cache_key(
+        self,
+        question: str,
+        k: int,
+        filters: Optional[Dict],
+        use_demo: bool,
+        compress: bool
+    ) -> str:
+        """Key covering every setting that changes the answer to a question."""
+        return ResponseCache.make_key(
+            question,
+            k,
+            index_version=self.indexer.index_version,
+            embedding_model=self.embedder.model_name,
+            retrieval={
+                'mode': self.retrieval_mode,
+                'score_threshold': self.score_threshold,
+                'fetch_k': self.retriever.fetch_k,
+                'rrf_k': self.retriever.rrf_k,
+                'rerank_model': self.reranker.model_name if self.reranker else None,
+                'rerank_fetch_k': self.rerank_fetch_k,
+                'mmr_lambda': self.mmr_lambda,
+                'mmr_fetch_k': self.retriever.mmr_fetch_k,
+                'max_chunks_per_source': self.max_chunks_per_source,
+                'max_chunks_per_page': self.max_chunks_per_page,
+                'expand_window': self.expand_window,
+                'coarse_top_d': self.coarse_top_d,
+                'compression_ratio': self.compressor.compression_ratio if compress else None,
+                'context_token_budget': self.context_token_budget
+            },
+            filters=filters,
+            generator=self._get_generator().get_cache_fingerprint(use_demo)
+        )
+    
+    def _semantic_cache_generator(self, use_demo: bool) -> str:
+        """Identity of the answer generator for semantic cache entries, so a demo answer isn't served once a model is installed."""
+        return json.dumps(self._get_generator().get_cache_fingerprint(use_demo), sort_keys=True)
+    
+    @staticmethod
+    def _is_cacheable(response: Dict, use_demo: bool) -> bool:
+        """Don't pin a demo-mode fallback or truncated stream caused by a transient LLM failure."""
+        if 'stream_error' in response:
+            return False
+        return use_demo or response.get('model') != 'Demo Mode (Context Extraction)'
+    
+    def _prepare_query(
+        self,
+        question: str,
+        k: Optional[int],
+        filters: Optional[Dict],
+        compress: Optional[bool],
+        budget: Optional[QueryBudget] = None
+    ) -> Dict:
         """
-        Query the RAG system with a question.
+        Run everything before generation: cache lookups, retrieval and context packing.
+        
+        With a budget, optional stages whose expected cost exceeds their
+        share of the remaining time are skipped or reduced, and the answer
+        length, the context or finally the LLM itself is given up to fit
+        generation into what is left (see `_fit_generation`).
         
-        Args:
-            question: User question
-            k: Optional number of documents to retrieve
-            
         Returns:
-            Dictionary with answer, citations, and metadata
+            Dictionary whose 'response' is set when the question is answered
+            without generation (cache hit or nothing retrieved), with its
+            'answer_source' ('cache' or 'none'); otherwise it
+            holds the prompt inputs and cache bookkeeping for `_finish_query`
+        """
+        state = self._begin_query(question, k, filters, compress)
+        if state['response'] is not None:
+            return state
+        return self._retrieve_and_pack(state, self._embed_question(question, budget), budget)
+    
+    def _begin_query(
+        self,
+        question: str,
+        k: Optional[int],
+        filters: Optional[Dict],
+        compress: Optional[bool],
+        model_exists: Optional[bool] = None
+    ) -> Dict:
+        """
+        Resolve per-query settings and look the question up in the exact-match cache.
+        
+        Args:
+            model_exists: Whether the model file exists, when the caller
+                already checked (batches check once)
         """
         if self.retriever is None:
             raise ValueError("No index loaded. Please ingest documents or load index first.")
         
+        k = k if k is not None else self.retrieval_k
+        if model_exists is None:
+            model_exists = Path(self._model_path).exists()
+        use_demo = not model_exists  # Use demo if model not found
+        # Under the "fallback" policy, answer extractively while the LLM loads
+        llm_loading = not use_demo and self._llm_still_loading()
+        use_demo = use_demo or llm_loading
+        compress = self.compressor is not None if compress is None else compress
+        if compress and self.compressor is None:
+            raise ValueError("Context compression requested but no compression_ratio is configured")
+        
+        response_key = None
+        if self.response_cache is not None:
+            response_key = self._response_cache_key(question, k, filters, use_demo, compress)
+            cached = self.response_cache.get(response_key)
+            if cached is not None:
+                logger.info("Response cache hit")
+                cached['question'] = question
+                return {'response': cached, 'answer_source': 'cache'}
+        
+        return {
+            'response': None,
+            'question': question,
+            'k': k,
+            'filters': filters,
+            'compress': compress,
+            'use_demo': use_demo,
+            'llm_loading': llm_loading,
+            'response_key': response_key
+        }
+    
+    def _embed_question(self, question: str, budget: Optional[QueryBudget] = None) -> List[float]:
+        """Embed the question, timing the stage."""
+        stage_start = time.perf_counter()
+        question_embedding = self.embedder.embed_query(question)
+        self._finish_stage(budget, 'embed', stage_start)
+        return question_embedding
+    
+    def _retrieve_and_pack(self, state: Dict, question_embedding: List[float], budget: Optional[QueryBudget]) -> Dict:
+        """Semantic cache lookup, retrieval, compression and context packing for `_prepare_query`."""
+        cached = self._lookup_semantic_cache(state, question_embedding)
+        if cached is not None:
+            return cached
+        
         # Retrieve relevant documents
-        documents = self.retriever.retrieve(question, k=k)
+        search_mode, rerank, rerank_budget_ms = self._plan_retrieval(budget, state['k'])
+        timings: Dict[str, float] = {}
+        documents = self.retriever.retrieve(
+            state['question'], k=state['k'], filters=state['filters'], query_embedding=question_embedding,
+            search_mode=search_mode, rerank=rerank, rerank_budget_ms=rerank_budget_ms, timings=timings
+        )
+        self.stage_latency.observe(f"search_{search_mode}_ms", timings.get('search_ms', 0.0))
+        if budget is not None:
+            budget.finish_stage('search', timings.get('search_ms', 0.0))
+            budget.finish_stage('rerank', timings.get('rerank_ms', 0.0))
+        return self._pack_documents(state, question_embedding, documents, budget)
+    
+    def _lookup_semantic_cache(self, state: Dict, question_embedding: List[float]) -> Optional[Dict]:
+        """Answer from the semantic cache if a similar question was answered; records whether it applies."""
+        # Filtered queries are scoped differently, so only unfiltered queries with
+        # the pipeline's default compression are cached; a fallback answer given
+        # while the LLM loads must not be served once it is ready
+        state['use_semantic_cache'] = (
+            self.semantic_cache is not None
+            and not state['filters']
+            and state['compress'] == (self.compressor is not None)
+            and not state['llm_loading']
+        )
+        if state['use_semantic_cache']:
+            cached = self.semantic_cache.lookup(
+                question_embedding, state['k'], self.indexer.index_version,
+                generator=self._semantic_cache_generator(state['use_demo'])
+            )
+            if cached is not None:
+                logger.info(f"Semantic cache hit (similarity {cached['cache']['similarity']:.3f})")
+                cached['question'] = state['question']
+                return {'response': cached, 'answer_source': 'cache'}
+        return None
+    
+    def _pack_documents(
+        self,
+        state: Dict,
+        question_embedding: List[float],
+        documents: List,
+        budget: Optional[QueryBudget]
+    ) -> Dict:
+        """Compress and pack retrieved documents into the prompt inputs for generation."""
+        question, compress = state['question'], state['compress']
+        use_demo, llm_loading, response_key = state['use_demo'], state['llm_loading'], state['response_key']
+        use_semantic_cache = state['use_semantic_cache']
         
         if not documents:
-            return {
+            return {'response': {
                 'answer': "I could not find any relevant information to answer this question.",
                 'citations': [],
                 'question': question,
                 'context_length': 0
+            }, 'answer_source': 'none'}
+        
+        compression = None
+        if compress:
+            expected_ms = self.stage_latency.estimate('compress_ms')
+            if budget is not None and expected_ms is not None and expected_ms > budget.stage_budget_ms('compress'):
+                budget.skip_stage('compress', 'skipped_compression', f"(expected {expected_ms:.0f} ms)")
+            else:
+                stage_start = time.perf_counter()
+                documents, compression = self.compressor.compress(question_embedding, documents)
+                self._finish_stage(budget, 'compress', stage_start)
+        
+        # Pack context into the prompt budget, counting with the LLM's tokenizer
+        generator = self._get_generator()
+        if not use_demo and generator.is_loading():
+            timeout = self.llm_ready_timeout_s
+            if budget is not None:
+                timeout = min(timeout, budget.remaining_ms() / 1000) if timeout is not None else budget.remaining_ms() / 1000
+            if not generator.wait_until_ready(timeout):
+                # Waited as long as allowed; this demo answer must not be cached as an LLM one
+                logger.warning("LLM still loading after the ready timeout; answering extractively")
+                use_demo = llm_loading = True
+                response_key = None
+                use_semantic_cache = False
+                if budget is not None:
+                    budget.degrade('extractive_fallback', "(LLM still loading)")
+        if not use_demo:
+            generator.load_model()
+        token_budget = generator.get_context_token_budget(question)
+        if self.context_token_budget is not None:
+            token_budget = min(token_budget, self.context_token_budget)
+        context, packed, packing = self.retriever.pack_context(documents, token_budget, generator.count_tokens)
+        
+        max_tokens = None
+        if budget is not None and not use_demo:
+            use_demo, max_tokens, context_tokens = self._fit_generation(budget, question, context, token_budget)
+            if context_tokens is not None:
+                context, packed, packing = self.retriever.pack_context(documents, context_tokens, generator.count_tokens)
+        
+        return {
+            'response': None,
+            'question': question,
+            'k': state['k'],
+            'use_demo': use_demo,
+            'max_tokens': max_tokens,
+            'response_key': response_key,
+            'question_embedding': question_embedding,
+            'use_semantic_cache': use_semantic_cache,
+            'context': context,
+            'citations': self.retriever.get_citations(packed),
+            'packing': packing,
+            'compression': compression,
+            'llm_loading': llm_loading,
+            'budget': budget
+        }
+    
+    def _finish_stage(self, budget: Optional[QueryBudget], stage: str, stage_start: float) -> None:
+        """Feed a stage's duration to the latency model and the query's budget."""
+        elapsed_ms = (time.perf_counter() - stage_start) * 1000
+        self.stage_latency.observe(f"{stage}_ms", elapsed_ms)
+        if budget is not None:
+            budget.finish_stage(stage, elapsed_ms)
+    
+    def _plan_retrieval(self, budget: Optional[QueryBudget], k: int) -> Tuple[str, bool, Optional[float]]:
+        """
+        Choose the search mode and reranking that fit the budget.
+        
+        Args:
+            budget: The query's budget, if it has a deadline
+            k: Number of documents to retrieve
+            
+        Returns:
+            Tuple of (search mode, whether to rerank, reranking budget in ms)
+        """
+        search_mode = self.retrieval_mode
+        rerank = self.reranker is not None
+        if budget is None:
+            return search_mode, rerank, None
+        
+        expected_ms = self.stage_latency.estimate(f"search_{search_mode}_ms")
+        if search_mode == "hybrid" and expected_ms is not None and expected_ms > budget.stage_budget_ms('search'):
+            search_mode = "dense"
+            budget.degrade('dense_only_search', f"(hybrid expected {expected_ms:.0f} ms)")
+        
+        if not rerank:
+            return search_mode, False, None
+        rerank_budget_ms = budget.stage_budget_ms('rerank')
+        # The reranker always scores k candidates; below that, skip it
+        minimum_ms = self.reranker.estimate_ms(k)
+        if minimum_ms is not None and minimum_ms > rerank_budget_ms:
+            budget.skip_stage('rerank', 'skipped_rerank', f"(expected {minimum_ms:.0f} ms)")
+            return search_mode, False, None
+        # Every fetched candidate is reranked, including MMR's over-fetch
+        fetched = max(k, self.rerank_fetch_k, self.retriever.mmr_fetch_k if self.mmr_lambda is not None else k)
+        full_ms = self.reranker.estimate_ms(fetched)
+        if full_ms is not None and full_ms > rerank_budget_ms:
+            budget.degrade('reduced_rerank', f"({rerank_budget_ms:.0f} of {full_ms:.0f} ms)")
+        return search_mode, True, rerank_budget_ms
+    
+    def _expected_queue_ms(self) -> float:
+        """Expected wait for a generation slot, from the requests ahead and the mean generation time."""
+        generate_ms = self.stage_latency.estimate('generate_ms')
+        if self.scheduler is None or generate_ms is None:
+            return 0.0
+        metrics = self.scheduler.get_metrics()
+        ahead = metrics['queue_depth'] + metrics['in_flight'] - metrics['concurrency'] + 1
+        return max(0, ahead) * generate_ms / metrics['concurrency']
+    
+    def _fit_generation(
+        self,
+        budget: QueryBudget,
+        question: str,
+        context: str,
+        context_token_budget: int
+    ) -> Tuple[bool, Optional[int], Optional[int]]:
+        """
+        Fit LLM generation into the time left, from the measured per-token costs.
+        
+        In order: cap the answer length, shrink the context (prefill time grows
+        with it) to leave room for MIN_ANSWER_TOKENS, or answer extractively.
+        Nothing changes until the LLM has answered once, as there are no
+        costs to go by.
+        
+        Args:
+            budget: The query's budget
+            question: User question
+            context: Packed context
+            context_token_budget: Token budget the context was packed into
+            
+        Returns:
+            Tuple of (answer extractively, max_tokens cap or None, smaller
+            context token budget to repack into or None)
+        """
+        prefill_ms = self.stage_latency.estimate('prefill_ms_per_token')
+        decode_ms = self.stage_latency.estimate('decode_ms_per_token')
+        if prefill_ms is None or decode_ms is None:
+            return False, None, None
+        
+        generator = self._get_generator()
+        available_ms = budget.remaining_ms() - self._expected_queue_ms()
+        prompt_tokens = generator.count_prompt_tokens(question, context)
+        answer_tokens = int((available_ms - prompt_tokens * prefill_ms) / decode_ms)
+        if answer_tokens >= generator.max_tokens:
+            return False, None, None
+        if answer_tokens >= self.MIN_ANSWER_TOKENS:
+            budget.degrade('capped_max_tokens', f"({answer_tokens} of {generator.max_tokens})")
+            return False, answer_tokens, None
+        
+        prompt_overhead = generator.count_prompt_tokens(question)
+        context_tokens = int((available_ms - self.MIN_ANSWER_TOKENS * decode_ms) / prefill_ms) - prompt_overhead
+        if context_tokens >= self.MIN_CONTEXT_TOKENS:
+            context_tokens = min(context_tokens, context_token_budget)
+            budget.degrade('shrunk_context', f"({context_tokens} of {context_token_budget} tokens)")
+            budget.degrade('capped_max_tokens', f"({self.MIN_ANSWER_TOKENS} of {generator.max_tokens})")
+            return False, self.MIN_ANSWER_TOKENS, context_tokens
+        
+        budget.degrade('extractive_fallback', f"({available_ms:.0f} ms left for generation)")
+        return True, None, None
+    
+    def _finish_query(self, prepared: Dict, response: Dict) -> Dict:
+        """Attach prompt details to a generated response and cache it."""
+        response['prompt_tokens'] = self._get_generator().count_prompt_tokens(prepared['question'], prepared['context'])
+        response['context'] = prepared['context']
+        response['context_packing'] = prepared['packing']
+        if prepared['compression'] is not None:
+            response['context_compression'] = prepared['compression']
+        if prepared['llm_loading']:
+            response['fallback_reason'] = 'llm_loading'
+        
+        # An answer degraded to meet one query's deadline must not be served to others
+        degraded = prepared['budget'] is not None and prepared['budget'].degradations
+        if not degraded and self._is_cacheable(response, prepared['use_demo']):
+            if prepared['response_key'] is not None:
+                self.response_cache.put(prepared['response_key'], response)
+            if prepared['use_semantic_cache']:
+                self.semantic_cache.store(
+                    prepared['question_embedding'], prepared['k'], self.indexer.index_version, response,
+                    generator=self._semantic_cache_generator(prepared['use_demo'])
+                )
+        
+        return response
+    
+    def _record_usage(
+        self,
+        response: Dict,
+        start: float,
+        answer_source: Optional[str] = None,
+        ttft_ms: Optional[float] = None,
+        queue_ms: float = 0.0
+    ) -> Dict:
+        """
+        Complete a response's 'usage' accounting and append it to the usage log.
+        
+        Args:
+            response: Response to annotate
+            start: `time.perf_counter()` when the query arrived
+            answer_source: 'cache' or 'none' for answers given without
+                generation; generated answers carry theirs ('llm' or 'demo')
+            ttft_ms: Time from arrival to the first token (defaults to the
+                total time, when the answer appears all at once)
+            queue_ms: Time spent waiting for the model
+            
+        Returns:
+            The response
+        """
+        total_ms = (time.perf_counter() - start) * 1000
+        if answer_source is not None:
+            usage = {
+                'answer_source': answer_source,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'prefill_ms': 0.0,
+                'decode_ms': 0.0,
+                'tokens_per_second': 0.0
             }
+        else:
+            usage = dict(response.get('usage', {}), prompt_tokens=response.get('prompt_tokens', 0))
+            if usage.get('answer_source') == 'llm' and 'stream_error' not in response:
+                self._observe_generation(usage)
+        usage.update(ttft_ms=ttft_ms if ttft_ms is not None else total_ms, queue_ms=queue_ms, total_ms=total_ms)
+        response['usage'] = usage
         
-        # Format context
-        context = self.retriever.format_context(documents)
-        citations = self.retriever.get_citations(documents)
+        if self.usage_log is not None:
+            self.usage_log.write({
+                'timestamp': time.time(),
+                # Questions may hold patient details; a hash still shows repeats
+                'question_hash': hashlib.sha256(response.get('question', '').encode("utf-8")).hexdigest()[:16],
+                'model': response.get('model'),
+                'index_version': self.indexer.index_version,
+                **usage
+            })
+        return response
+    
+    def _observe_generation(self, usage: Dict) -> None:
+        """Update the per-token prefill and decode costs that deadlines plan generation with."""
+        if usage['prompt_tokens'] > 0:
+            self.stage_latency.observe('prefill_ms_per_token', usage['prefill_ms'] / usage['prompt_tokens'])
+        # The first token is part of prefill
+        if usage['completion_tokens'] > 1:
+            self.stage_latency.observe('decode_ms_per_token', usage['decode_ms'] / (usage['completion_tokens'] - 1))
+        self.stage_latency.observe('generate_ms', usage['prefill_ms'] + usage['decode_ms'])
+    
+    @staticmethod
+    def _report_budget(response: Dict, budget: Optional[QueryBudget]) -> Dict:
+        """Attach the deadline report and applied degradations to a response."""
+        if budget is not None:
+            response['deadline'] = budget.report()
+            response['degradations'] = list(budget.degradations)
+        return response
+    
+    def query(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        compress: Optional[bool] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout_s: Optional[float] = None,
+        deadline_ms: Optional[float] = None
+    ) -> Dict:
+        """
+        Query the RAG system with a question.
+        
+        Args:
+            question: User question
+            k: Optional number of documents to retrieve
+            filters: Optional metadata filters ('source', 'page_range', 'chunk_index')
+            compress: Override context compression for this query (None uses
+                the pipeline setting; True requires a compression_ratio)
+            priority: Generation queue priority (PRIORITY_INTERACTIVE runs
+                before PRIORITY_BATCH)
+            timeout_s: Optional seconds within which generation must start
+            deadline_ms: Optional milliseconds within which the answer is due;
+                stages are skipped or reduced to meet it, and the response's
+                'degradations' lists what was given up ('deadline' has the
+                per-stage timings)
+            
+        Returns:
+            Dictionary with answer, citations, and metadata
+        """
+        start = time.perf_counter()
+        budget = QueryBudget(deadline_ms, self.stage_budget_shares) if deadline_ms is not None else None
+        prepared = self._prepare_query(question, k, filters, compress, budget)
+        return self._answer_prepared(prepared, start, priority, timeout_s, budget)
+    
+    def answer_documents(
+        self,
+        question: str,
+        documents: List,
+        question_embedding: Optional[List[float]] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout_s: Optional[float] = None
+    ) -> Dict:
+        """
+        Answer a question from documents retrieved elsewhere, e.g. from several collections.
+        
+        The documents are packed and answered like this pipeline's own
+        retrieval results, bypassing the response and semantic caches.
+        
+        Args:
+            question: User question
+            documents: Retrieved documents, best first
+            question_embedding: Optional embedding of the question, used by
+                context compression
+            priority: Generation queue priority
+            timeout_s: Optional seconds within which generation must start
+            
+        Returns:
+            Dictionary with answer, citations, and metadata
+        """
+        start = time.perf_counter()
+        use_demo = not Path(self._model_path).exists()
+        llm_loading = not use_demo and self._llm_still_loading()
+        state = {
+            'response': None,
+            'question': question,
+            'k': len(documents),
+            'filters': None,
+            'compress': self.compressor is not None and question_embedding is not None,
+            'use_demo': use_demo or llm_loading,
+            'llm_loading': llm_loading,
+            'response_key': None,
+            'use_semantic_cache': False
+        }
+        prepared = self._pack_documents(state, question_embedding, documents, None)
+        return self._answer_prepared(prepared, start, priority, timeout_s, None)
+    
+    def _answer_prepared(
+        self,
+        prepared: Dict,
+        start: float,
+        priority: int,
+        timeout_s: Optional[float],
+        budget: Optional[QueryBudget]
+    ) -> Dict:
+        """Generate and finish the answer to a prepared query, falling back to an extractive one."""
+        if prepared['response'] is not None:
+            return self._complete_early(prepared, start, budget)
         
-        # Initialize generator if not already done (use demo mode if LLM not available)
-        if not self._generator_initialized:
+        if not prepared['use_demo']:
+            submitted = time.perf_counter()
+            ticket = self._submit_generation(prepared, priority, timeout_s, budget)
             try:
-                self.generator = AnswerGenerator(model_path=self._model_path)
-                self._generator_initialized = True
-            except Exception as e:
-                logger.warning(f"Could not initialize generator: {e}. Using demo mode.")
-                self.generator = AnswerGenerator(model_path=self._model_path)
-                self._generator_initialized = True
+                response = ticket.result()
+            except DeadlineExceededError as e:
+                self._fall_back_on_deadline(prepared, budget, e)
+            else:
+                return self._complete_generated(prepared, response, start, submitted, ticket, budget)
         
         # Generate answer (will use demo mode if LLM not available)
-        use_demo = not Path(self._model_path).exists()  # Use demo if model not found
-        response = self.generator.generate(
-            question=question,
-            context=context,
-            citations=citations,
-            use_demo_mode=use_demo
+        return self._complete_extractive(prepared, start, budget)
+    
+    async def aquery(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        compress: Optional[bool] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout_s: Optional[float] = None,
+        deadline_ms: Optional[float] = None
+    ) -> Dict:
+        """
+        Query the RAG system from asyncio code; same arguments and response as `query`.
+        
+        Embedding runs on a shared embedding executor, cache lookups,
+        retrieval and packing on a search executor, and generation through
+        the LLM scheduler, so the event loop never blocks and one request's
+        retrieval overlaps another's generation. Cancelling the coroutine
+        cancels its generation request.
+        
+        Returns:
+            Dictionary with answer, citations, and metadata
+        """
+        loop = asyncio.get_running_loop()
+        embed_executor, search_executor = self._get_executors()
+        start = time.perf_counter()
+        budget = QueryBudget(deadline_ms, self.stage_budget_shares) if deadline_ms is not None else None
+        
+        prepared = await loop.run_in_executor(search_executor, self._begin_query, question, k, filters, compress)
+        if prepared['response'] is None:
+            question_embedding = await loop.run_in_executor(embed_executor, self._embed_question, question, budget)
+            prepared = await loop.run_in_executor(
+                search_executor, self._retrieve_and_pack, prepared, question_embedding, budget
+            )
+        if prepared['response'] is not None:
+            return await loop.run_in_executor(search_executor, self._complete_early, prepared, start, budget)
+        
+        if not prepared['use_demo']:
+            submitted = time.perf_counter()
+            ticket = self._submit_generation(prepared, priority, timeout_s, budget)
+            try:
+                response = await asyncio.wrap_future(ticket)
+            except DeadlineExceededError as e:
+                self._fall_back_on_deadline(prepared, budget, e)
+            else:
+                return await loop.run_in_executor(
+                    search_executor, self._complete_generated, prepared, response, start, submitted, ticket, budget
+                )
+        
+        return await loop.run_in_executor(search_executor, self._complete_extractive, prepared, start, budget)
+    
+    def _get_executors(self) -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        """Create the embedding and search executors used by `aquery` on first use."""
+        with self._executor_lock:
+            if self._embed_executor is None:
+                self._embed_executor = ThreadPoolExecutor(max_workers=self.embed_workers, thread_name_prefix="rag-embed")
+                self._search_executor = ThreadPoolExecutor(max_workers=self.search_workers, thread_name_prefix="rag-search")
+        return self._embed_executor, self._search_executor
+    
+    def _submit_generation(
+        self,
+        prepared: Dict,
+        priority: int,
+        timeout_s: Optional[float],
+        budget: Optional[QueryBudget],
+        stream: bool = False
+    ) -> GenerationTicket:
+        """Queue a prepared query's generation with the scheduler."""
+        return self._get_scheduler().submit(
+            prepared['question'],
+            prepared['context'],
+            prepared['citations'],
+            priority=priority,
+            deadline=self._generation_deadline(timeout_s, budget),
+            stream=stream,
+            max_tokens=prepared['max_tokens']
         )
+    
+    @staticmethod
+    def _fall_back_on_deadline(prepared: Dict, budget: Optional[QueryBudget], error: DeadlineExceededError) -> None:
+        """Switch a query whose generation missed the query deadline to an extractive answer."""
+        if budget is None:
+            # Only timeout_s was set, and it is the caller's to handle
+            raise error
+        budget.degrade('extractive_fallback', "(deadline passed waiting for the LLM)")
+        prepared['use_demo'] = True
+    
+    def _complete_early(self, prepared: Dict, start: float, budget: Optional[QueryBudget]) -> Dict:
+        """Finish a query answered without generation (cache hit or nothing retrieved)."""
+        self._report_budget(prepared['response'], budget)
+        return self._record_usage(prepared['response'], start, answer_source=prepared['answer_source'])
+    
+    def _complete_generated(
+        self,
+        prepared: Dict,
+        response: Dict,
+        start: float,
+        submitted: float,
+        ticket: GenerationTicket,
+        budget: Optional[QueryBudget]
+    ) -> Dict:
+        """Finish a query answered by the scheduler, timing the queue wait and first token."""
+        response = self._finish_query(prepared, response)
+        queue_ms = (ticket.started_at - ticket.submitted_at) * 1000
+        ttft_ms = None
+        if 'streaming' in response:
+            ttft_ms = (submitted - start) * 1000 + queue_ms + response['streaming']['first_token_ms']
+        return self._record_usage(self._report_budget(response, budget), start, ttft_ms=ttft_ms, queue_ms=queue_ms)
+    
+    def _complete_extractive(self, prepared: Dict, start: float, budget: Optional[QueryBudget]) -> Dict:
+        """Answer a prepared query extractively (demo mode) and finish it."""
+        response = self._get_generator().generate(
+            question=prepared['question'],
+            context=prepared['context'],
+            citations=prepared['citations'],
+            use_demo_mode=True
+        )
+        return self._record_usage(self._report_budget(self._finish_query(prepared, response), budget), start)
+    
+    @staticmethod
+    def _generation_deadline(timeout_s: Optional[float], budget: Optional[QueryBudget]) -> Optional[float]:
+        """The earlier of the timeout and the query deadline, as a `time.monotonic()` time."""
+        deadlines = []
+        if timeout_s is not None:
+            deadlines.append(time.monotonic() + timeout_s)
+        if budget is not None:
+            deadlines.append(budget.deadline)
+        return min(deadlines) if deadlines else None
+    
+    def _ticket_events(self, ticket: GenerationTicket, prepared: Dict, budget: Optional[QueryBudget]) -> Iterator[Dict]:
+        """A streaming ticket's events, or an extractive answer's if the deadline passes before the first token."""
+        started = False
+        try:
+            for event in ticket.events():
+                started = True
+                yield event
+        except DeadlineExceededError as e:
+            if started:
+                raise
+            self._fall_back_on_deadline(prepared, budget, e)
+            yield from self._get_generator().generate_streaming(
+                question=prepared['question'],
+                context=prepared['context'],
+                citations=prepared['citations'],
+                use_demo_mode=True
+            )
+    
+    def query_stream(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        compress: Optional[bool] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout_s: Optional[float] = None,
+        deadline_ms: Optional[float] = None
+    ) -> Iterator[Dict]:
+        """
+        Query the RAG system, streaming the answer as it is generated.
         
-        return response
-
+        Args:
+            question: User question
+            k: Optional number of documents to retrieve
+            filters: Optional metadata filters ('source', 'page_range', 'chunk_index')
+            compress: Override context compression for this query
+            priority: Generation queue priority
+            timeout_s: Optional seconds within which the answer must finish
+            deadline_ms: Optional milliseconds within which the answer is due
+                (see `query`)
+            
+        Yields:
+            A {'type': 'retrieval', 'citations': ...} event once the context is
+            ready, {'type': 'token', 'text': ...} events as the answer is
+            generated, and a final {'type': 'done', 'response': ...} event with
+            the response `query` would return plus 'streaming' timings
+            (time to first token, tokens per second). Closing the iterator
+            early cancels the generation request.
+        """
+        start = time.perf_counter()
+        budget = QueryBudget(deadline_ms, self.stage_budget_shares) if deadline_ms is not None else None
+        prepared = self._prepare_query(question, k, filters, compress, budget)
+        retrieval_ms = (time.perf_counter() - start) * 1000
+        
+        if prepared['response'] is not None:
+            response = self._report_budget(prepared['response'], budget)
+            yield {'type': 'retrieval', 'citations': response['citations'], 'retrieval_ms': retrieval_ms}
+            yield {'type': 'token', 'text': response['answer']}
+            response['streaming'] = {'retrieval_ms': retrieval_ms, 'ttft_ms': retrieval_ms}
+            self._record_usage(response, start, answer_source=prepared['answer_source'], ttft_ms=retrieval_ms)
+            yield {'type': 'done', 'response': response}
+            return
+        
+        yield {'type': 'retrieval', 'citations': prepared['citations'], 'retrieval_ms': retrieval_ms}
+        
+        if prepared['use_demo']:
+            ticket = None
+            events = self._get_generator().generate_streaming(
+                question=question,
+                context=prepared['context'],
+                citations=prepared['citations'],
+                use_demo_mode=True
+            )
+        else:
+            ticket = self._submit_generation(prepared, priority, timeout_s, budget, stream=True)
+            events = self._ticket_events(ticket, prepared, budget)
+        
+        try:
+            for event in events:
+                if event['type'] != 'done':
+                    yield event
+                    continue
+                
+                response = self._report_budget(self._finish_query(prepared, event['response']), budget)
+                queue_ms = (ticket.started_at - ticket.submitted_at) * 1000 if ticket is not None and ticket.started_at else 0.0
+                stats = response['streaming']
+                stats['retrieval_ms'] = retrieval_ms
+                stats['ttft_ms'] = retrieval_ms + queue_ms + stats['first_token_ms']
+                self._record_usage(response, start, ttft_ms=stats['ttft_ms'], queue_ms=queue_ms)
+                logger.info(
+                    f"Streamed {stats['completion_tokens']} tokens: TTFT {stats['ttft_ms']:.0f} ms, "
+                    f"{stats['tokens_per_second']:.1f} tokens/s"
+                )
+                yield {'type': 'done', 'response': response}
+        finally:
+            # The consumer went away (e.g. the user navigated off the page)
+            if ticket is not None and not ticket.done():
+                ticket.cancel()
+    
+    def query_batch(
+        self,
+        questions: List[str],
+        k: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        compress: Optional[bool] = None,
+        priority: int = PRIORITY_BATCH,
+        max_in_flight: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Answer many questions, sharing embedding, search and the model check.
+        
+        Identical questions are answered once. Questions not answered from a
+        cache are embedded in one batch and searched with one FAISS call.
+        Generation goes through the scheduler with at most `max_in_flight`
+        requests submitted at a time, leaving queue room for interactive
+        queries.
+        
+        Args:
+            questions: User questions
+            k: Optional number of documents to retrieve per question
+            filters: Optional metadata filters applied to every question
+            compress: Override context compression for these questions
+            priority: Generation queue priority
+            max_in_flight: Maximum generation requests submitted at once
+                (default two per model instance)
+            
+        Returns:
+            One entry per question, in order: the response `query` would
+            return, or {'question': ..., 'error': ...} if that question failed
+        """
+        start = time.perf_counter()
+        max_in_flight = max_in_flight or 2 * self.llm_workers
+        model_exists = Path(self._model_path).exists()
+        results: Dict[str, Dict] = {}
+        
+        states: Dict[str, Dict] = {}
+        for question in dict.fromkeys(questions):
+            try:
+                state = self._begin_query(question, k, filters, compress, model_exists)
+                if state['response'] is not None:
+                    results[question] = self._complete_early(state, start, None)
+                else:
+                    states[question] = state
+            except Exception as e:
+                results[question] = self._batch_error(question, e)
+        
+        prepared_batch = self._retrieve_batch(states, start, results)
+        self._generate_batch(prepared_batch, start, priority, max_in_flight, results)
+        
+        responses = []
+        seen = set()
+        for question in questions:
+            # Repeats of a question get their own copy of its response
+            responses.append(dict(results[question]) if question in seen else results[question])
+            seen.add(question)
+        return responses
+    
+    def _retrieve_batch(self, states: Dict[str, Dict], start: float, results: Dict[str, Dict]) -> List[Dict]:
+        """Embed and search for the questions of a batch at once, packing each one's context."""
+        if not states:
+            return []
+        questions = list(states)
+        try:
+            stage_start = time.perf_counter()
+            embeddings = dict(zip(questions, self.embedder.embed_queries(questions)))
+            self.stage_latency.observe('embed_ms', (time.perf_counter() - stage_start) * 1000 / len(questions))
+        except Exception as e:
+            results.update((question, self._batch_error(question, e)) for question in questions)
+            return []
+        
+        to_search = []
+        for question in questions:
+            cached = self._lookup_semantic_cache(states[question], embeddings[question])
+            if cached is not None:
+                results[question] = self._complete_early(cached, start, None)
+            else:
+                to_search.append(question)
+        if not to_search:
+            return []
+        
+        first = states[to_search[0]]
+        try:
+            documents = self.retriever.retrieve_batch(
+                to_search,
+                k=first['k'],
+                filters=first['filters'],
+                query_embeddings=[embeddings[question] for question in to_search]
+            )
+        except Exception as e:
+            results.update((question, self._batch_error(question, e)) for question in to_search)
+            return []
+        
+        prepared_batch = []
+        for question, question_documents in zip(to_search, documents):
+            try:
+                prepared = self._pack_documents(states[question], embeddings[question], question_documents, None)
+                if prepared['response'] is not None:
+                    results[question] = self._complete_early(prepared, start, None)
+                else:
+                    prepared_batch.append(prepared)
+            except Exception as e:
+                results[question] = self._batch_error(question, e)
+        return prepared_batch
+    
+    def _generate_batch(
+        self,
+        prepared_batch: List[Dict],
+        start: float,
+        priority: int,
+        max_in_flight: int,
+        results: Dict[str, Dict]
+    ) -> None:
+        """Generate the answers of a batch, keeping at most max_in_flight requests in the scheduler."""
+        in_flight: Dict[GenerationTicket, Tuple[Dict, float]] = {}
+        
+        def settle(ticket: GenerationTicket) -> None:
+            prepared, submitted = in_flight.pop(ticket)
+            try:
+                results[prepared['question']] = self._complete_generated(
+                    prepared, ticket.result(), start, submitted, ticket, None
+                )
+            except Exception as e:
+                results[prepared['question']] = self._batch_error(prepared['question'], e)
+        
+        for prepared in prepared_batch:
+            if prepared['use_demo']:
+                try:
+                    results[prepared['question']] = self._complete_extractive(prepared, start, None)
+                except Exception as e:
+                    results[prepared['question']] = self._batch_error(prepared['question'], e)
+                continue
+            
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for ticket in done:
+                    settle(ticket)
+            try:
+                ticket = self._submit_generation(prepared, priority, None, None)
+                in_flight[ticket] = (prepared, time.perf_counter())
+            except Exception as e:
+                results[prepared['question']] = self._batch_error(prepared['question'], e)
+        
+        for ticket in list(in_flight):
+            settle(ticket)
+    
+    @staticmethod
+    def _batch_error(question: str, error: Exception) -> Dict:
+        """Result entry for a batch question that failed."""
+        logger.error(f"Batch question failed: {question[:50]}...: {error}")
+        return {'question': question, 'error': f"{type(error).__name__}: {error}"}
@@ -1,6 +1,19 @@
 """Retrieval module for semantic search."""
 
-from .retriever import Retriever
+from .retriever import Retriever, reciprocal_rank_fusion
+from .reranker import CrossEncoderReranker
+from .mmr import maximal_marginal_relevance
+from .context_packer import ContextPacker
+from .compressor import ContextCompressor
+from .neighbor_expansion import expand_with_neighbors
 
-__all__ = ["Retriever"]
+__all__ = [
+    "Retriever",
+    "reciprocal_rank_fusion",
+    "CrossEncoderReranker",
+    "maximal_marginal_relevance",
+    "ContextPacker",
+    "ContextCompressor",
+    "expand_with_neighbors",
+]
 
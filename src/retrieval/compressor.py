@@ -0,0 +1,120 @@
+"""Extractive compression of retrieved chunks to their most relevant sentences."""
+
+import logging
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from langchain.schema import Document
+
+from .context_packer import _SENTENCE_BOUNDARY
+
+logger = logging.getLogger(__name__)
+
+
+class ContextCompressor:
+    """Keeps the sentences of retrieved chunks that are most similar to the question."""
+
+    def __init__(
+        self,
+        embed_texts: Callable[[List[str]], List[List[float]]],
+        compression_ratio: float = 0.5,
+        min_sentences_per_chunk: int = 1
+    ):
+        """
+        Initialize the context compressor.
+
+        Args:
+            embed_texts: Batch embedding function, e.g. the embedder's
+                `embed_documents`; must match the question embedding model
+            compression_ratio: Fraction of context characters to keep (0, 1]
+            min_sentences_per_chunk: Best sentences always kept per chunk, so
+                every retrieved chunk stays citable
+        """
+        if not 0.0 < compression_ratio <= 1.0:
+            raise ValueError(f"compression_ratio must be in (0, 1], got {compression_ratio}")
+        self.embed_texts = embed_texts
+        self.compression_ratio = compression_ratio
+        self.min_sentences_per_chunk = min_sentences_per_chunk
+
+    def compress(
+        self,
+        question_vector: List[float],
+        documents: List[Document]
+    ) -> Tuple[List[Document], Dict[str, float]]:
+        """
+        Compress documents to their most question-relevant sentences.
+
+        All sentences are embedded in one batch and scored by cosine
+        similarity to the question. Kept sentences stay in their original
+        order and chunk, so citation headers and metadata are unchanged.
+
+        Args:
+            question_vector: Embedding of the question
+            documents: Retrieved documents, best first
+
+        Returns:
+            Tuple of (compressed documents, compression report)
+        """
+        sentences: List[str] = []
+        owners: List[int] = []
+        for doc_idx, doc in enumerate(documents):
+            for sentence in _SENTENCE_BOUNDARY.split(doc.page_content.strip()):
+                if sentence:
+                    sentences.append(sentence)
+                    owners.append(doc_idx)
+
+        chars_before = sum(len(doc.page_content) for doc in documents)
+        if not sentences or self.compression_ratio >= 1.0:
+            return documents, self._report(chars_before, chars_before, len(sentences), len(sentences))
+
+        vectors = np.asarray(self.embed_texts(sentences), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(question_vector, dtype=np.float32)
+        scores = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        owners_array = np.asarray(owners)
+        # Each kept sentence costs its length plus the joining space
+        lengths = np.fromiter((len(s) + 1 for s in sentences), dtype=np.int64, count=len(sentences))
+        keep = np.zeros(len(sentences), dtype=bool)
+
+        # Best sentences of every chunk first, then the globally best until the budget
+        for doc_idx in range(len(documents)):
+            positions = np.flatnonzero(owners_array == doc_idx)
+            best = positions[np.argsort(-scores[positions])[:self.min_sentences_per_chunk]]
+            keep[best] = True
+
+        char_budget = self.compression_ratio * chars_before
+        kept_chars = int(lengths[keep].sum())
+        for position in np.argsort(-scores):
+            if not keep[position] and kept_chars + lengths[position] <= char_budget:
+                keep[position] = True
+                kept_chars += int(lengths[position])
+
+        compressed = []
+        for doc_idx, doc in enumerate(documents):
+            kept = [sentences[p] for p in np.flatnonzero(keep & (owners_array == doc_idx))]
+            if not kept:
+                continue
+            text = " ".join(kept)
+            if text == doc.page_content:
+                compressed.append(doc)
+            else:
+                compressed.append(Document(page_content=text, metadata={**doc.metadata, 'compressed': True}))
+
+        chars_after = sum(len(doc.page_content) for doc in compressed)
+        report = self._report(chars_before, chars_after, len(sentences), int(keep.sum()))
+        logger.info(
+            f"Compressed context to {report['sentences_kept']}/{report['sentences_total']} sentences "
+            f"({report['kept_ratio']:.0%} of characters)"
+        )
+        return compressed, report
+
+    @staticmethod
+    def _report(chars_before: int, chars_after: int, sentences_total: int, sentences_kept: int) -> Dict[str, float]:
+        """Summary of how much context was kept."""
+        return {
+            'chars_before': chars_before,
+            'chars_after': chars_after,
+            'kept_ratio': chars_after / chars_before if chars_before else 1.0,
+            'sentences_total': sentences_total,
+            'sentences_kept': sentences_kept
+        }
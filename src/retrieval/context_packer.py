@@ -0,0 +1,116 @@
+"""Token-budget-aware packing of retrieved chunks into prompt context."""
+
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+def format_citation_header(idx: int, doc: Document) -> str:
+    """Citation header placed above each chunk in the context."""
+    source = doc.metadata.get('source', 'Unknown')
+    page = doc.metadata.get('page_number', 'N/A')
+    chunk_idx = doc.metadata.get('chunk_index', 'N/A')
+
+    citation = f"[{idx}] Source: {source}, Page: {page}"
+    if chunk_idx != 'N/A':
+        citation += f", Chunk: {chunk_idx}"
+    return citation
+
+
+class ContextPacker:
+    """Fits the highest-ranked chunks, whole or trimmed to sentences, into a token budget."""
+
+    def __init__(self, count_tokens: Callable[[str], int], min_chunk_tokens: int = 32):
+        """
+        Initialize the context packer.
+
+        Args:
+            count_tokens: Function returning the token count of a string,
+                ideally the LLM's own tokenizer
+            min_chunk_tokens: Smallest trimmed chunk worth including
+        """
+        self.count_tokens = count_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def _trim_to_budget(self, header: str, text: str, budget: int) -> Optional[str]:
+        """Longest leading run of sentences whose section fits the budget."""
+        kept = []
+        for sentence in _SENTENCE_BOUNDARY.split(text):
+            candidate = " ".join(kept + [sentence])
+            if self.count_tokens(f"{header}\n{candidate}") > budget:
+                break
+            kept.append(sentence)
+
+        if not kept:
+            return None
+        trimmed = " ".join(kept)
+        if self.count_tokens(trimmed) < self.min_chunk_tokens:
+            return None
+        return trimmed
+
+    def pack(
+        self,
+        documents: List[Document],
+        token_budget: int
+    ) -> Tuple[str, List[Document], Dict[str, int]]:
+        """
+        Pack documents, in ranked order, into a context string.
+
+        Chunks that do not fit whole are trimmed to their leading sentences;
+        chunks that cannot fit at all are dropped. Citation numbers follow
+        the included chunks.
+
+        Args:
+            documents: Retrieved documents, best first
+            token_budget: Maximum tokens for the whole context string
+
+        Returns:
+            Tuple of (context string, included documents, packing report)
+        """
+        separator_tokens = self.count_tokens(CONTEXT_SEPARATOR)
+        sections: List[str] = []
+        included: List[Document] = []
+        used_tokens = 0
+        trimmed_count = 0
+
+        for doc in documents:
+            header = format_citation_header(len(included) + 1, doc)
+            remaining = token_budget - used_tokens - (separator_tokens if sections else 0)
+            if remaining <= 0:
+                break
+
+            section = f"{header}\n{doc.page_content}"
+            section_tokens = self.count_tokens(section)
+            if section_tokens > remaining:
+                trimmed = self._trim_to_budget(header, doc.page_content, remaining)
+                if trimmed is None:
+                    continue
+                doc = Document(page_content=trimmed, metadata={**doc.metadata, 'trimmed': True})
+                section = f"{header}\n{trimmed}"
+                section_tokens = self.count_tokens(section)
+                trimmed_count += 1
+
+            used_tokens += section_tokens + (separator_tokens if sections else 0)
+            sections.append(section)
+            included.append(doc)
+
+        report = {
+            'context_tokens': used_tokens,
+            'token_budget': token_budget,
+            'chunks_included': len(included),
+            'chunks_trimmed': trimmed_count,
+            'chunks_dropped': len(documents) - len(included)
+        }
+        if report['chunks_dropped'] or trimmed_count:
+            logger.info(
+                f"Packed {len(included)}/{len(documents)} chunks into {used_tokens}/{token_budget} tokens "
+                f"({trimmed_count} trimmed)"
+            )
+        return CONTEXT_SEPARATOR.join(sections), included, report
@@ -0,0 +1,180 @@
+"""Metadata filters resolved to FAISS ID selectors."""
+
+import logging
+from typing import Dict, List, Tuple
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEYS = ("source", "page_range", "chunk_index")
+
+
+class ChunkMetadataIndex:
+    """
+    Columnar view of chunk metadata indexed by FAISS position.
+
+    Chunks from one PDF are ingested together, so each source usually maps
+    to a single contiguous ID range; other fields are matched with NumPy.
+    """
+
+    def __init__(
+        self,
+        source_names: List[str],
+        source_codes: np.ndarray,
+        page_numbers: np.ndarray,
+        chunk_indices: np.ndarray
+    ):
+        """
+        Initialize the metadata index.
+
+        Args:
+            source_names: Distinct source names; position is the source code
+            source_codes: Source code of each chunk
+            page_numbers: Page number of each chunk (-1 if unknown)
+            chunk_indices: Chunk index within its page (-1 if unknown)
+        """
+        self.source_names = source_names
+        self.source_codes = source_codes
+        self.page_numbers = page_numbers
+        self.chunk_indices = chunk_indices
+        self.num_chunks = len(source_codes)
+
+        # Contiguous [start, end) runs of each source code
+        self.source_ranges: Dict[str, List[Tuple[int, int]]] = {}
+        if self.num_chunks:
+            boundaries = np.flatnonzero(np.diff(source_codes)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [self.num_chunks]))
+            for start, end in zip(starts, ends):
+                name = source_names[source_codes[start]]
+                self.source_ranges.setdefault(name, []).append((int(start), int(end)))
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: FAISS) -> "ChunkMetadataIndex":
+        """
+        Build the metadata index from a vectorstore's docstore.
+
+        Args:
+            vectorstore: FAISS vectorstore instance
+
+        Returns:
+            ChunkMetadataIndex instance
+        """
+        num_chunks = len(vectorstore.index_to_docstore_id)
+        source_lookup: Dict[str, int] = {}
+        source_codes = np.empty(num_chunks, dtype=np.int32)
+        page_numbers = np.full(num_chunks, -1, dtype=np.int32)
+        chunk_indices = np.full(num_chunks, -1, dtype=np.int32)
+
+        for position in range(num_chunks):
+            metadata = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]).metadata
+            source = str(metadata.get('source', 'Unknown'))
+            source_codes[position] = source_lookup.setdefault(source, len(source_lookup))
+            if isinstance(metadata.get('page_number'), int):
+                page_numbers[position] = metadata['page_number']
+            if isinstance(metadata.get('chunk_index'), int):
+                chunk_indices[position] = metadata['chunk_index']
+
+        logger.info(f"Built metadata index for {num_chunks} chunks from {len(source_lookup)} sources")
+        return cls(list(source_lookup), source_codes, page_numbers, chunk_indices)
+
+    def resolve(self, filters: Dict) -> np.ndarray:
+        """
+        Resolve filters to a boolean mask over FAISS positions.
+
+        Args:
+            filters: Dictionary with any of 'source' (name or list of names),
+                'page_range' (inclusive (first, last) tuple) and
+                'chunk_index' (int or list of ints)
+
+        Returns:
+            Boolean array, True for chunks that match every filter
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {sorted(unknown)}. Expected any of {FILTER_KEYS}")
+
+        mask = np.ones(self.num_chunks, dtype=bool)
+
+        source = filters.get('source')
+        if source is not None:
+            sources = [source] if isinstance(source, str) else source
+            source_mask = np.zeros(self.num_chunks, dtype=bool)
+            for name in sources:
+                for start, end in self.source_ranges.get(name, []):
+                    source_mask[start:end] = True
+            mask &= source_mask
+
+        page_range = filters.get('page_range')
+        if page_range is not None:
+            first_page, last_page = page_range
+            mask &= (self.page_numbers >= first_page) & (self.page_numbers <= last_page)
+
+        chunk_index = filters.get('chunk_index')
+        if chunk_index is not None:
+            wanted = [chunk_index] if isinstance(chunk_index, int) else list(chunk_index)
+            mask &= np.isin(self.chunk_indices, wanted)
+
+        return mask
+
+    def neighbors(self, position: int, window: int) -> np.ndarray:
+        """
+        Positions of the chunks around a chunk on the same source page.
+
+        The chunker emits a page's chunks consecutively and they are indexed
+        in order, so neighbours are found within `window` positions.
+
+        Args:
+            position: FAISS position of the chunk
+            window: Number of chunks to include on each side
+
+        Returns:
+            Positions ordered by chunk index, including `position` itself
+        """
+        chunk_index = self.chunk_indices[position]
+        if window <= 0 or chunk_index < 0:
+            return np.array([position])
+
+        start = max(0, position - window)
+        end = min(self.num_chunks, position + window + 1)
+        nearby = np.arange(start, end)
+        same_page = (
+            (self.source_codes[start:end] == self.source_codes[position])
+            & (self.page_numbers[start:end] == self.page_numbers[position])
+            & (np.abs(self.chunk_indices[start:end] - chunk_index) <= window)
+        )
+        nearby = nearby[same_page]
+        return nearby[np.argsort(self.chunk_indices[nearby], kind="stable")]
+
+
+class IDFilter:
+    """FAISS search parameters restricting search to a set of chunk IDs."""
+
+    def __init__(self, mask: np.ndarray):
+        """
+        Initialize the filter from a boolean mask over FAISS positions.
+
+        Args:
+            mask: Boolean array, True for searchable chunks
+        """
+        self.mask = mask
+        self.ids = np.flatnonzero(mask)
+
+        if self.ids.size and self.ids[-1] - self.ids[0] + 1 == self.ids.size:
+            # One contiguous run (e.g. a single source): range check, no bitmap
+            self.selector = faiss.IDSelectorRange(int(self.ids[0]), int(self.ids[-1]) + 1)
+        else:
+            # The bitmap must outlive the selector, which only holds a pointer
+            self._bitmap = np.packbits(mask, bitorder='little')
+            self.selector = faiss.IDSelectorBitmap(len(self._bitmap), faiss.swig_ptr(self._bitmap))
+        self.params = faiss.SearchParameters(sel=self.selector)
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether no chunk passes the filter."""
+        return self.ids.size == 0
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
@@ -0,0 +1,61 @@
+"""Vectorized maximal-marginal-relevance selection."""
+
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    group_caps: Optional[Sequence[Tuple[np.ndarray, int]]] = None
+) -> List[int]:
+    """
+    Select diverse candidates with maximal marginal relevance.
+
+    Each of the k selection steps is a handful of vector operations over all
+    candidates; only the similarity rows of selected candidates are computed.
+
+    Args:
+        query_vector: Query embedding, shape (dim,)
+        candidate_vectors: Candidate embeddings, shape (n, dim)
+        k: Number of candidates to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+        group_caps: Optional (group codes, cap) pairs; at most `cap` selected
+            candidates may share a group code (e.g. per source, per page)
+
+    Returns:
+        Indices into `candidate_vectors` in selection order
+    """
+    num_candidates = len(candidate_vectors)
+    if num_candidates == 0 or k <= 0:
+        return []
+
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    redundancy = np.zeros(num_candidates, dtype=np.float32)
+    available = np.ones(num_candidates, dtype=bool)
+    group_counts = [np.zeros(int(codes.max()) + 1, dtype=np.int64) for codes, _ in group_caps or []]
+
+    selected = []
+    for _ in range(min(k, num_candidates)):
+        scores = np.where(available, lambda_mult * relevance - (1.0 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            break
+
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, candidates @ candidates[best], out=redundancy)
+
+        for (codes, cap), counts in zip(group_caps or [], group_counts):
+            counts[codes[best]] += 1
+            if counts[codes[best]] >= cap:
+                available &= codes != codes[best]
+
+    return selected
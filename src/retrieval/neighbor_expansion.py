@@ -0,0 +1,91 @@
+"""Small-to-big expansion of retrieved chunks with their neighbours."""
+
+from typing import Callable, Dict, List, Tuple
+from langchain.schema import Document
+
+from .metadata_filter import ChunkMetadataIndex
+
+
+def merge_chunk_texts(texts: List[str], max_overlap: int = 1000, min_overlap: int = 10) -> str:
+    """
+    Join consecutive chunks of one page, removing their shared overlap.
+
+    Args:
+        texts: Chunk texts in chunk-index order
+        max_overlap: Longest overlap to look for, in characters
+        min_overlap: Shortest suffix/prefix match treated as overlap rather
+            than coincidence
+
+    Returns:
+        Merged text
+    """
+    if not texts:
+        return ""
+
+    merged = texts[0]
+    for text in texts[1:]:
+        overlap = 0
+        for length in range(min(max_overlap, len(merged), len(text)), min_overlap - 1, -1):
+            if merged.endswith(text[:length]):
+                overlap = length
+                break
+        if overlap:
+            merged += text[overlap:]
+        else:
+            merged += " " + text
+    return merged
+
+
+def expand_with_neighbors(
+    results: List[Tuple[int, float]],
+    metadata_index: ChunkMetadataIndex,
+    get_document: Callable[[int], Document],
+    window: int,
+    max_overlap: int = 1000
+) -> List[Tuple[Document, float]]:
+    """
+    Replace each hit by the span of neighbouring chunks on its page.
+
+    Neighbours are fetched from the docstore by ID at query time, so no
+    larger copy of the corpus is stored. Hits whose spans overlap or touch
+    are merged into the span of the best-ranked one.
+
+    Args:
+        results: Ranked (chunk ID, score) tuples
+        metadata_index: Chunk metadata used to find neighbours
+        get_document: Docstore lookup by chunk ID
+        window: Neighbouring chunks to add on each side of a hit
+        max_overlap: Longest chunk overlap to remove when merging
+
+    Returns:
+        Ranked (Document, score) tuples, one per merged span
+    """
+    # Each span: [page key, set of chunk IDs, score, hit chunk ID]
+    spans: List[list] = []
+    for chunk_id, score in results:
+        positions = set(int(p) for p in metadata_index.neighbors(chunk_id, window))
+        page_key = (metadata_index.source_codes[chunk_id], metadata_index.page_numbers[chunk_id])
+
+        for span in spans:
+            touching = any(p - 1 in span[1] or p in span[1] or p + 1 in span[1] for p in positions)
+            if span[0] == page_key and touching:
+                span[1] |= positions
+                break
+        else:
+            spans.append([page_key, positions, score, chunk_id])
+
+    expanded = []
+    for _, positions, score, hit_id in spans:
+        ordered = sorted(positions, key=lambda p: (metadata_index.chunk_indices[p], p))
+        hit = get_document(hit_id)
+        if len(ordered) == 1:
+            expanded.append((hit, score))
+            continue
+
+        text = merge_chunk_texts([get_document(p).page_content for p in ordered], max_overlap)
+        metadata: Dict = {
+            **hit.metadata,
+            'chunk_span': (int(metadata_index.chunk_indices[ordered[0]]), int(metadata_index.chunk_indices[ordered[-1]]))
+        }
+        expanded.append((Document(page_content=text, metadata=metadata), score))
+    return expanded
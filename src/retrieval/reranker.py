@@ -0,0 +1,163 @@
+"""Cross-encoder reranking of retrieved chunks."""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Try to import CrossEncoder, handle gracefully if not available
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError as e:
+    CROSS_ENCODER_AVAILABLE = False
+    logger.warning(f"sentence-transformers not available: {e}. Reranking will not work.")
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a local cross-encoder and keeps the best."""
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        device: str = "cpu",
+        batch_size: int = 32,
+        cache_size: int = 4096,
+        latency_budget_ms: Optional[float] = None,
+        min_score: Optional[float] = None
+    ):
+        """
+        Initialize the reranker.
+
+        Args:
+            model_name: HuggingFace cross-encoder model name
+            device: Device to run the model on
+            batch_size: Pairs scored per forward pass
+            cache_size: Maximum number of cached (query, chunk) scores
+            latency_budget_ms: Optional scoring budget; limits how many uncached
+                candidates are scored based on the measured per-pair cost
+            min_score: Optional score below which chunks are dropped, so fewer
+                than k chunks may be returned
+        """
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.latency_budget_ms = latency_budget_ms
+        self.min_score = min_score
+        self.model = None
+        self._cache: "OrderedDict[Tuple[Optional[str], str, int], float]" = OrderedDict()
+        self._ms_per_pair: Optional[float] = None
+        # Pipelines of several collections and sessions rerank concurrently
+        self._lock = threading.Lock()
+
+    def _load_model(self):
+        """Lazily load the cross-encoder when first needed."""
+        if self.model is not None:
+            return
+
+        if not CROSS_ENCODER_AVAILABLE:
+            raise ImportError("sentence-transformers is not installed. Please install it: pip install sentence-transformers")
+
+        logger.info(f"Loading cross-encoder: {self.model_name}")
+        self.model = CrossEncoder(self.model_name, device=self.device)
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Score pairs in batches with the cross-encoder."""
+        self._load_model()
+        return np.asarray(
+            self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False),
+            dtype=np.float32
+        )
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        """Stable hash of a normalized query for the score cache."""
+        return hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+
+    def clear_cache(self) -> None:
+        """Drop cached scores (chunk IDs change when the index is rebuilt)."""
+        with self._lock:
+            self._cache.clear()
+
+    def estimate_ms(self, num_pairs: int) -> Optional[float]:
+        """Expected milliseconds to score `num_pairs` uncached pairs (None before the first batch)."""
+        if self._ms_per_pair is None:
+            return None
+        return self._ms_per_pair * num_pairs
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Tuple[int, str]],
+        k: int,
+        budget_ms: Optional[float] = None,
+        scope: Optional[str] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Rerank first-stage candidates.
+
+        Candidates that could not be scored within the latency budget keep
+        their first-stage order after all scored candidates, with a score of
+        -inf (they are dropped when `min_score` is set).
+
+        Args:
+            query: Search query
+            candidates: (chunk ID, chunk text) tuples in first-stage order
+            k: Number of results to keep
+            budget_ms: Optional scoring budget for this call, overriding
+                latency_budget_ms
+            scope: Optional ID of the index the chunk IDs belong to, keeping
+                apart the cached scores of indexes sharing this reranker
+
+        Returns:
+            List of (chunk ID, cross-encoder score) tuples, best first
+        """
+        query_key = self._query_key(query)
+        scores: Dict[int, float] = {}
+        uncached = []
+
+        with self._lock:
+            for chunk_id, text in candidates:
+                cache_key = (scope, query_key, chunk_id)
+                if cache_key in self._cache:
+                    self._cache.move_to_end(cache_key)
+                    scores[chunk_id] = self._cache[cache_key]
+                else:
+                    uncached.append((chunk_id, text))
+            ms_per_pair = self._ms_per_pair
+
+        budget_ms = budget_ms if budget_ms is not None else self.latency_budget_ms
+        if budget_ms is not None and ms_per_pair:
+            max_pairs = max(k - len(scores), int(budget_ms / ms_per_pair))
+            if len(uncached) > max_pairs:
+                logger.info(f"Rerank budget allows {max_pairs} of {len(uncached)} uncached pairs")
+                uncached = uncached[:max_pairs]
+
+        if uncached:
+            start = time.perf_counter()
+            batch_scores = self._predict([(query, text) for _, text in uncached])
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            ms_per_pair = elapsed_ms / len(uncached)
+            with self._lock:
+                # Exponential moving average of per-pair cost drives the budget
+                self._ms_per_pair = ms_per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * ms_per_pair
+                for (chunk_id, _), score in zip(uncached, batch_scores):
+                    scores[chunk_id] = float(score)
+                    self._cache[(scope, query_key, chunk_id)] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if self.min_score is not None:
+            ranked = [(chunk_id, score) for chunk_id, score in ranked if score >= self.min_score]
+        else:
+            ranked.extend((chunk_id, float("-inf")) for chunk_id, _ in candidates if chunk_id not in scores)
+
+        return ranked[:k]
@@ -1,36 +1,166 @@
 """Semantic search retrieval with top-k results."""
 
 import logging
-from typing import List, Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
 
+from ..embeddings.bm25_index import BM25Index
+from ..embeddings.centroid_index import DocumentCentroidIndex
+from .reranker import CrossEncoderReranker
+from .mmr import maximal_marginal_relevance
+from .metadata_filter import ChunkMetadataIndex, IDFilter
+from .context_packer import ContextPacker, CONTEXT_SEPARATOR, format_citation_header
+from .neighbor_expansion import expand_with_neighbors
+
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ("dense", "hybrid")
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Tuple[int, float]]],
+    k: int,
+    rrf_k: int = 60
+) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked result lists with reciprocal-rank fusion.
+    
+    Args:
+        result_lists: Ranked lists of (chunk ID, score) tuples
+        k: Number of fused results to return
+        rrf_k: RRF damping constant
+        
+    Returns:
+        List of (chunk ID, fused score) tuples, best first
+    """
+    fused: Dict[int, float] = {}
+    for results in result_lists:
+        for rank, (chunk_id, _) in enumerate(results, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) when no tokenizer is available."""
+    return max(1, len(text) // 4)
+
+
+def _group_codes(keys: List) -> np.ndarray:
+    """Map hashable keys to dense integer codes."""
+    codes: Dict = {}
+    return np.array([codes.setdefault(key, len(codes)) for key in keys], dtype=np.int64)
+
 
 class Retriever:
     """Retrieves relevant documents using semantic search."""
     
-    def __init__(self, vectorstore: FAISS, k: int = 5, score_threshold: Optional[float] = None):
+    def __init__(
+        self,
+        vectorstore: FAISS,
+        k: int = 5,
+        score_threshold: Optional[float] = None,
+        keyword_index: Optional[BM25Index] = None,
+        search_mode: str = "dense",
+        fetch_k: int = 20,
+        rrf_k: int = 60,
+        reranker: Optional[CrossEncoderReranker] = None,
+        rerank_fetch_k: int = 20,
+        rerank_scope: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_fetch_k: int = 20,
+        max_per_source: Optional[int] = None,
+        max_per_page: Optional[int] = None,
+        expand_window: int = 0,
+        centroid_index: Optional[DocumentCentroidIndex] = None,
+        coarse_top_d: Optional[int] = None
+    ):
         """
         Initialize the retriever.
         
         Args:
             vectorstore: FAISS vectorstore instance
             k: Number of top documents to retrieve
-            score_threshold: Optional minimum similarity score threshold
+            score_threshold: Optional minimum cosine similarity; enables range
+                search returning every chunk above it (capped at k)
+            keyword_index: Optional BM25 index aligned with the FAISS positions
+            search_mode: "dense" (FAISS only) or "hybrid" (FAISS + BM25 with RRF)
+            fetch_k: Candidates fetched from each search before fusion
+            rrf_k: Reciprocal-rank fusion damping constant
+            reranker: Optional cross-encoder applied to the first-stage results
+            rerank_fetch_k: Candidates fetched for the reranker to choose from
+            rerank_scope: Optional ID of this index, under which a shared
+                reranker caches its scores
+            mmr_lambda: Optional MMR relevance/diversity trade-off; enables MMR selection
+            mmr_fetch_k: Candidates fetched for MMR to choose from
+            max_per_source: Optional cap on MMR-selected chunks per source
+            max_per_page: Optional cap on MMR-selected chunks per source page
+            expand_window: Neighbouring chunks of the same page added on each
+                side of a hit (small-to-big retrieval); 0 disables expansion
+            centroid_index: Optional per-document centroid index aligned with
+                the FAISS positions
+            coarse_top_d: Optional number of documents selected from the
+                centroid index before the chunk search; enables coarse-to-fine search
         """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {search_mode}. Expected one of {SEARCH_MODES}")
+        
         self.vectorstore = vectorstore
         self.k = k
         self.score_threshold = score_threshold
+        self.keyword_index = keyword_index
+        self.search_mode = search_mode
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.rerank_fetch_k = rerank_fetch_k
+        self.rerank_scope = rerank_scope
+        self.mmr_lambda = mmr_lambda
+        self.mmr_fetch_k = mmr_fetch_k
+        self.max_per_source = max_per_source
+        self.max_per_page = max_per_page
+        self.expand_window = expand_window
+        self.centroid_index = centroid_index
+        self.coarse_top_d = coarse_top_d
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._metadata_index: Optional[ChunkMetadataIndex] = None
     
-    def retrieve(self, query: str, k: Optional[int] = None) -> List[Document]:
+    def retrieve(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        search_mode: Optional[str] = None,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        filters: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
+        expand: Optional[bool] = None,
+        coarse: Optional[bool] = None,
+        rerank_budget_ms: Optional[float] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Document]:
         """
         Retrieve top-k relevant documents for a query.
         
         Args:
             query: Search query
             k: Optional override for number of results
+            search_mode: Optional override for the search mode
+            rerank: Optional override for cross-encoder reranking
+            diversify: Optional override for MMR diversity selection
+            filters: Optional metadata filters ('source', 'page_range',
+                'chunk_index') applied inside the search
+            query_embedding: Optional precomputed embedding of the query
+            expand: Optional override for neighbour-chunk expansion
+            coarse: Optional override for coarse-to-fine (document, then
+                chunk) search; skipped when filters are given
+            rerank_budget_ms: Optional reranking budget for this query
+            timings: Optional dictionary receiving 'search_ms' and, when
+                reranking ran, 'rerank_ms'
             
         Returns:
             List of relevant Document objects
@@ -40,13 +170,11 @@ class Retriever:
         logger.info(f"Retrieving top-{k} documents for query: {query[:50]}...")
         
         try:
-            # Use similarity_search_with_score to get scores
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            
-            # Filter by threshold if specified
-            if self.score_threshold is not None:
-                results = [(doc, score) for doc, score in results if score >= self.score_threshold]
-            
+            results = self.retrieve_with_scores(
+                query, k=k, search_mode=search_mode, rerank=rerank, diversify=diversify,
+                filters=filters, query_embedding=query_embedding, expand=expand,
+                coarse=coarse, rerank_budget_ms=rerank_budget_ms, timings=timings
+            )
             documents = [doc for doc, score in results]
             logger.info(f"Retrieved {len(documents)} documents")
             
@@ -56,54 +184,405 @@ class Retriever:
             logger.error(f"Error retrieving documents: {e}")
             raise
     
-    def retrieve_with_scores(self, query: str, k: Optional[int] = None) -> List[tuple]:
+    def retrieve_with_scores(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        search_mode: Optional[str] = None,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        filters: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
+        expand: Optional[bool] = None,
+        coarse: Optional[bool] = None,
+        rerank_budget_ms: Optional[float] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[tuple]:
         """
         Retrieve documents with similarity scores.
         
+        Dense scores are raw FAISS scores, or cosine similarities when a
+        score threshold is set; hybrid scores are RRF scores and reranked
+        scores are cross-encoder scores (higher is better). With expansion,
+        hits on touching spans are merged, so fewer than k may be returned.
+        
         Args:
             query: Search query
             k: Optional override for number of results
+            search_mode: Optional override for the search mode
+            rerank: Optional override for cross-encoder reranking
+            diversify: Optional override for MMR diversity selection
+            filters: Optional metadata filters ('source', 'page_range',
+                'chunk_index') applied inside the search
+            query_embedding: Optional precomputed embedding of the query
+            expand: Optional override for neighbour-chunk expansion
+            coarse: Optional override for coarse-to-fine (document, then
+                chunk) search; skipped when filters are given
+            rerank_budget_ms: Optional reranking budget for this query
+            timings: Optional dictionary receiving 'search_ms' and, when
+                reranking ran, 'rerank_ms'
             
         Returns:
             List of (Document, score) tuples
         """
-        k = k if k is not None else self.k
+        k, search_mode, rerank, diversify, expand, coarse, fetch_k = self._resolve_options(
+            k, search_mode, rerank, diversify, expand, coarse
+        )
         
         try:
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
+            search_start = time.perf_counter()
+            id_filter = IDFilter(self.metadata_index.resolve(filters)) if filters else None
+            if id_filter is not None and id_filter.is_empty:
+                logger.info(f"No chunks match filters: {filters}")
+                return []
             
-            if self.score_threshold is not None:
-                results = [(doc, score) for doc, score in results if score >= self.score_threshold]
+            if query_embedding is not None:
+                query_vector = np.array([query_embedding], dtype=np.float32)
+            else:
+                query_vector = self._embed_query(query)
             
-            return results
+            # Filters already scope the search, so the document stage only runs without them
+            if coarse and id_filter is None:
+                id_filter = self._coarse_filter(query_vector)
+            if search_mode == "hybrid":
+                results = self._hybrid_search(query, query_vector, fetch_k, id_filter)
+            else:
+                results = self._dense_search(query_vector, fetch_k, id_filter)
+            
+            return self._refine(
+                query, query_vector, results, k, diversify, rerank, expand,
+                rerank_budget_ms=rerank_budget_ms, timings=timings, search_start=search_start
+            )
         except Exception as e:
             logger.error(f"Error retrieving documents with scores: {e}")
             raise
     
-    def format_context(self, documents: List[Document]) -> str:
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        k: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        query_embeddings: Optional[List[List[float]]] = None
+    ) -> List[List[Document]]:
+        """
+        Retrieve documents for many queries, searching FAISS once for all of them.
+        
+        Unfiltered dense search runs as a single matrix search; BM25 fusion,
+        MMR, reranking and expansion then run per query as in `retrieve`.
+        Filtered, coarse-to-fine and score-threshold searches are scoped per
+        query, so they run one query at a time.
+        
+        Args:
+            queries: Search queries
+            k: Optional override for number of results
+            filters: Optional metadata filters applied to every query
+            query_embeddings: Optional precomputed embeddings, one per query
+            
+        Returns:
+            One list of relevant Document objects per query, in order
+        """
+        if not queries:
+            return []
+        if query_embeddings is None:
+            query_embeddings = self.vectorstore.embeddings.embed_documents(list(queries))
+        
+        k, search_mode, rerank, diversify, expand, coarse, fetch_k = self._resolve_options(k, None, None, None, None, None)
+        if filters or coarse or self.score_threshold is not None:
+            return [
+                self.retrieve(query, k=k, filters=filters, query_embedding=embedding)
+                for query, embedding in zip(queries, query_embeddings)
+            ]
+        
+        query_vectors = np.asarray(query_embeddings, dtype=np.float32)
+        dense_k = max(self.fetch_k, fetch_k) if search_mode == "hybrid" else fetch_k
+        scores, chunk_ids = self.vectorstore.index.search(query_vectors, dense_k)
+        
+        batch = []
+        for row, query in enumerate(queries):
+            results = [
+                (int(chunk_id), float(score))
+                for chunk_id, score in zip(chunk_ids[row], scores[row])
+                if chunk_id != -1
+            ]
+            if search_mode == "hybrid":
+                results = reciprocal_rank_fusion(
+                    [results, self.keyword_index.search(query, dense_k, None)],
+                    k=fetch_k,
+                    rrf_k=self.rrf_k
+                )
+            refined = self._refine(query, query_vectors[row:row + 1], results, k, diversify, rerank, expand)
+            batch.append([doc for doc, _ in refined])
+        logger.info(f"Retrieved documents for {len(queries)} queries in one batch")
+        return batch
+    
+    def _resolve_options(
+        self,
+        k: Optional[int],
+        search_mode: Optional[str],
+        rerank: Optional[bool],
+        diversify: Optional[bool],
+        expand: Optional[bool],
+        coarse: Optional[bool]
+    ) -> Tuple[int, str, bool, bool, bool, bool, int]:
+        """Apply the retriever's defaults to per-query overrides; also returns the first-stage fetch size."""
+        k = k if k is not None else self.k
+        search_mode = self._resolve_search_mode(search_mode)
+        rerank = self.reranker is not None if rerank is None else rerank
+        if rerank and self.reranker is None:
+            logger.warning("Reranking requested but no reranker is configured")
+            rerank = False
+        diversify = self.mmr_lambda is not None if diversify is None else diversify
+        expand = self.expand_window > 0 if expand is None else expand
+        coarse = self.coarse_top_d is not None if coarse is None else coarse
+        if coarse and (self.centroid_index is None or self.coarse_top_d is None):
+            logger.warning("Coarse-to-fine search requested but no centroid index or coarse_top_d is configured")
+            coarse = False
+        
+        fetch_k = k
+        if rerank:
+            fetch_k = max(fetch_k, self.rerank_fetch_k)
+        if diversify:
+            fetch_k = max(fetch_k, self.mmr_fetch_k)
+        return k, search_mode, rerank, diversify, expand, coarse, fetch_k
+    
+    def _refine(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        results: List[Tuple[int, float]],
+        k: int,
+        diversify: bool,
+        rerank: bool,
+        expand: bool,
+        rerank_budget_ms: Optional[float] = None,
+        timings: Optional[Dict[str, float]] = None,
+        search_start: Optional[float] = None
+    ) -> List[tuple]:
+        """Rerank, diversify and expand first-stage results into (Document, score) tuples."""
+        if timings is not None:
+            timings['search_ms'] = (time.perf_counter() - search_start) * 1000
+        
+        # Rerank every fetched candidate so the cross-encoder can promote any of them;
+        # MMR then picks k diverse chunks among the best reranked ones
+        if rerank:
+            rerank_start = time.perf_counter()
+            results = self.reranker.rerank(
+                query,
+                [(chunk_id, self.get_document(chunk_id).page_content) for chunk_id, _ in results],
+                k=max(k, self.mmr_fetch_k) if diversify else k,
+                budget_ms=rerank_budget_ms,
+                scope=self.rerank_scope
+            )
+            if timings is not None:
+                timings['rerank_ms'] = (time.perf_counter() - rerank_start) * 1000
+        
+        if diversify:
+            mmr_start = time.perf_counter()
+            results = self._diversify(query_vector, results, k)
+            if timings is not None:
+                timings['search_ms'] += (time.perf_counter() - mmr_start) * 1000
+        
+        if expand and self.expand_window > 0:
+            return expand_with_neighbors(results, self.metadata_index, self.get_document, self.expand_window)
+        return [(self.get_document(chunk_id), score) for chunk_id, score in results]
+    
+    def get_document(self, chunk_id: int) -> Document:
+        """
+        Look up a chunk by its position in the FAISS index.
+        
+        Args:
+            chunk_id: FAISS position of the chunk
+            
+        Returns:
+            Document stored for that position
+        """
+        docstore_id = self.vectorstore.index_to_docstore_id[chunk_id]
+        return self.vectorstore.docstore.search(docstore_id)
+    
+    @property
+    def metadata_index(self) -> ChunkMetadataIndex:
+        """Columnar chunk metadata, built on first use."""
+        if self._metadata_index is None:
+            self._metadata_index = ChunkMetadataIndex.from_vectorstore(self.vectorstore)
+        return self._metadata_index
+    
+    def list_sources(self) -> List[str]:
+        """Names of all indexed sources, usable as a 'source' filter."""
+        return list(self.metadata_index.source_names)
+    
+    def _resolve_search_mode(self, search_mode: Optional[str]) -> str:
+        """Validate a search mode, falling back to dense without a BM25 index."""
+        search_mode = search_mode or self.search_mode
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {search_mode}. Expected one of {SEARCH_MODES}")
+        if search_mode == "hybrid" and self.keyword_index is None:
+            logger.warning("Hybrid search requested but no BM25 index is loaded; using dense search")
+            return "dense"
+        return search_mode
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a query as a (1, dim) float32 matrix for FAISS."""
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        return np.array([embedding], dtype=np.float32)
+    
+    def _coarse_filter(self, query_vector: np.ndarray) -> IDFilter:
+        """Restrict search to the chunks of the documents nearest to the query."""
+        documents = self.centroid_index.search(query_vector, self.coarse_top_d)
+        mask = self.centroid_index.chunk_mask(
+            [code for code, _ in documents],
+            num_chunks=len(self.vectorstore.index_to_docstore_id)
+        )
+        return IDFilter(mask)
+    
+    def _dense_search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        id_filter: Optional[IDFilter] = None
+    ) -> List[Tuple[int, float]]:
+        """Run FAISS search, returning (chunk ID, score) tuples."""
+        params = id_filter.params if id_filter is not None else None
+        if self.score_threshold is not None:
+            return self._range_search(query_vector, k, params)
+        
+        scores, chunk_ids = self.vectorstore.index.search(query_vector, k, params=params)
+        return [
+            (int(chunk_id), float(score))
+            for chunk_id, score in zip(chunk_ids[0], scores[0])
+            if chunk_id != -1
+        ]
+    
+    def _range_search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        params: Optional[faiss.SearchParameters] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return up to k chunks whose cosine similarity is at least the threshold.
+        
+        Embeddings are L2-normalized, so for an L2 index the squared distance
+        is 2 - 2 * cosine and the threshold maps to a radius of 2 - 2 * threshold.
+        For an inner-product index the threshold is the radius itself.
+        """
+        index = self.vectorstore.index
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            # Range search keeps similarities strictly above the radius
+            radius = np.nextafter(np.float32(self.score_threshold), np.float32(-np.inf))
+        elif index.metric_type == faiss.METRIC_L2:
+            # Range search keeps distances strictly below the radius
+            radius = np.nextafter(np.float32(2.0 - 2.0 * self.score_threshold), np.float32(np.inf))
+        else:
+            raise ValueError(f"Threshold retrieval does not support FAISS metric type {index.metric_type}")
+        
+        _, scores, chunk_ids = index.range_search(query_vector, float(radius), params=params)
+        similarities = 1.0 - scores / 2.0 if index.metric_type == faiss.METRIC_L2 else scores
+        
+        top = np.argsort(-similarities, kind="stable")[:k]
+        return [(int(chunk_ids[idx]), float(similarities[idx])) for idx in top]
+    
+    def _hybrid_search(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        k: int,
+        id_filter: Optional[IDFilter] = None
+    ) -> List[Tuple[int, float]]:
+        """Run BM25 and dense search concurrently and fuse them with RRF."""
+        fetch_k = max(self.fetch_k, k)
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bm25-search")
+        allowed = id_filter.mask if id_filter is not None else None
+        keyword_future = self._executor.submit(self.keyword_index.search, query, fetch_k, allowed)
+        dense_results = self._dense_search(query_vector, fetch_k, id_filter)
+        
+        return reciprocal_rank_fusion(
+            [dense_results, keyword_future.result()],
+            k=k,
+            rrf_k=self.rrf_k
+        )
+    
+    def _diversify(
+        self,
+        query_vector: np.ndarray,
+        results: List[Tuple[int, float]],
+        k: int
+    ) -> List[Tuple[int, float]]:
+        """Select k diverse results with MMR over vectors reconstructed from the index."""
+        if not results:
+            return results
+        
+        chunk_ids = np.array([chunk_id for chunk_id, _ in results], dtype=np.int64)
+        vectors = self.vectorstore.index.reconstruct_batch(chunk_ids)
+        
+        group_caps = []
+        if self.max_per_source is not None or self.max_per_page is not None:
+            metadata = [self.get_document(int(chunk_id)).metadata for chunk_id in chunk_ids]
+            if self.max_per_source is not None:
+                sources = [meta.get('source') for meta in metadata]
+                group_caps.append((_group_codes(sources), self.max_per_source))
+            if self.max_per_page is not None:
+                pages = [(meta.get('source'), meta.get('page_number')) for meta in metadata]
+                group_caps.append((_group_codes(pages), self.max_per_page))
+        
+        selected = maximal_marginal_relevance(
+            query_vector[0],
+            vectors,
+            k=k,
+            lambda_mult=self.mmr_lambda if self.mmr_lambda is not None else 0.5,
+            group_caps=group_caps
+        )
+        return [results[idx] for idx in selected]
+    
+    def format_context(
+        self,
+        documents: List[Document],
+        token_budget: Optional[int] = None,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ) -> str:
         """
         Format retrieved documents into context string with citations.
         
         Args:
             documents: List of retrieved Document objects
+            token_budget: Optional maximum context tokens; see `pack_context`
+            count_tokens: Token counting function used with `token_budget`
             
         Returns:
             Formatted context string with citations
         """
+        if token_budget is not None:
+            context, _, _ = self.pack_context(documents, token_budget, count_tokens)
+            return context
+        
         context_parts = []
         
         for idx, doc in enumerate(documents, start=1):
-            source = doc.metadata.get('source', 'Unknown')
-            page = doc.metadata.get('page_number', 'N/A')
-            chunk_idx = doc.metadata.get('chunk_index', 'N/A')
-            
-            citation = f"[{idx}] Source: {source}, Page: {page}"
-            if chunk_idx != 'N/A':
-                citation += f", Chunk: {chunk_idx}"
-            
-            context_parts.append(f"{citation}\n{doc.page_content}")
+            context_parts.append(f"{format_citation_header(idx, doc)}\n{doc.page_content}")
+        
+        return CONTEXT_SEPARATOR.join(context_parts)
+    
+    def pack_context(
+        self,
+        documents: List[Document],
+        token_budget: int,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ) -> Tuple[str, List[Document], Dict[str, int]]:
+        """
+        Fit the highest-ranked documents into a prompt token budget.
         
-        return "\n\n---\n\n".join(context_parts)
+        Args:
+            documents: Retrieved documents, best first
+            token_budget: Maximum tokens for the context string
+            count_tokens: Token counting function (defaults to ~4 chars/token)
+            
+        Returns:
+            Tuple of (context string, included documents, packing report);
+            build citations from the included documents so numbers match
+        """
+        packer = ContextPacker(count_tokens or estimate_tokens)
+        return packer.pack(documents, token_budget)
     
     def get_citations(self, documents: List[Document]) -> List[Dict[str, any]]:
         """
@@ -118,13 +597,17 @@ class Retriever:
         citations = []
         
         for idx, doc in enumerate(documents, start=1):
-            citations.append({
+            citation = {
                 'index': idx,
                 'source': doc.metadata.get('source', 'Unknown'),
                 'page_number': doc.metadata.get('page_number', 'N/A'),
                 'chunk_index': doc.metadata.get('chunk_index', 'N/A'),
                 'text_preview': doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-            })
+            }
+            # Set on documents merged from several collections
+            if 'collection' in doc.metadata:
+                citation['collection'] = doc.metadata['collection']
+            citations.append(citation)
         
         return citations
 
@@ -0,0 +1,6 @@
+"""HTTP query service and its client."""
+
+from .server import RAGServer, RAGRequestHandler, serve
+from .client import RAGServiceClient, ServiceError
+
+__all__ = ["RAGServer", "RAGRequestHandler", "serve", "RAGServiceClient", "ServiceError"]
@@ -0,0 +1,164 @@
+"""Client of the HTTP query service, offering the query methods of RAGPipeline."""
+
+import http.client
+import json
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceError(RuntimeError):
+    """An error response from the query service."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class RAGServiceClient:
+    """
+    Queries a running RAG service over persistent HTTP/1.1 connections.
+
+    Each thread keeps its own connection, reopened once if the server
+    closed it while idle. Methods mirror those of RAGPipeline, so callers
+    such as the UI can use either.
+    """
+
+    def __init__(self, base_url: str, timeout_s: float = 300.0):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Service URL, e.g. "http://127.0.0.1:8000"
+            timeout_s: Socket timeout per request
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"Expected an http:// service URL, got {base_url!r}")
+        self.base_url = base_url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        """This thread's connection to the service."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or fresh:
+            if connection is not None:
+                connection.close()
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_s)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> http.client.HTTPResponse:
+        """Send a request, retrying once on a connection the server had closed."""
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection(fresh=attempt > 0)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                break
+            except (http.client.RemoteDisconnected, http.client.ImproperConnectionState, ConnectionResetError, BrokenPipeError):
+                if attempt > 0:
+                    raise
+                logger.debug(f"Connection to {self.base_url} was closed; reconnecting")
+        if response.status != 200:
+            detail = response.read().decode("utf-8", errors="replace")
+            try:
+                detail = json.loads(detail).get('error', detail)
+            except ValueError:
+                pass
+            raise ServiceError(response.status, detail)
+        return response
+
+    def _call(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        """A request whose response is one JSON object."""
+        return json.loads(self._request(method, path, payload).read())
+
+    def health(self) -> Dict:
+        """Service process, index and LLM state."""
+        return self._call("GET", "/health")
+
+    def list_sources(self) -> List[str]:
+        """Source documents in the service's index."""
+        return self._call("GET", "/sources")['sources']
+
+    def get_llm_readiness(self) -> Dict[str, any]:
+        """LLM load state of the worker that answered."""
+        return self.health()['llm']
+
+    def get_generation_metrics(self) -> Dict[str, float]:
+        """Generation queue metrics of the worker that answered."""
+        return self.health()['generation']
+
+    def query(self, question: str, **options) -> Dict:
+        """
+        Answer a question (see RAGPipeline.query).
+
+        Args:
+            question: User question
+            **options: Optional k, filters, compress, timeout_s, deadline_ms
+
+        Returns:
+            The pipeline response
+        """
+        return self._call("POST", "/query", {'question': question, **options})
+
+    def query_stream(self, question: str, **options) -> Iterator[Dict]:
+        """
+        Answer a question as a stream of events (see RAGPipeline.query_stream).
+
+        Args:
+            question: User question
+            **options: Optional k, filters, compress, deadline_ms
+
+        Yields:
+            The pipeline's retrieval, token and done events
+        """
+        response = self._request("POST", "/query", {'question': question, 'stream': True, **options})
+        for line in response:
+            event = json.loads(line)
+            if event['type'] == 'error':
+                raise ServiceError(500, event['error'])
+            yield event
+
+    def query_batch(self, questions: List[str], **options) -> List[Dict]:
+        """
+        Answer many questions in one request (see RAGPipeline.query_batch).
+
+        Args:
+            questions: User questions
+            **options: Optional k, filters, compress, max_in_flight
+
+        Returns:
+            Responses in question order; failed items carry an 'error'
+        """
+        options.pop('priority', None)  # Batches always run at batch priority
+        return self._call("POST", "/query_batch", {'questions': questions, **options})['responses']
+
+    def retrieve(self, question: str, k: Optional[int] = None, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Retrieve chunks without generating an answer.
+
+        Returns:
+            Dictionaries with 'page_content', 'metadata' and 'score'
+        """
+        payload = {'question': question}
+        if k is not None:
+            payload['k'] = k
+        if filters:
+            payload['filters'] = filters
+        return self._call("POST", "/retrieve", payload)['documents']
+
+    def close(self) -> None:
+        """Close this thread's connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,296 @@
+"""HTTP query service over a RAGPipeline, optionally pre-forked into worker processes."""
+
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ..generation import QueueFullError, DeadlineExceededError, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from ..rag_pipeline import RAGPipeline
+
+logger = logging.getLogger(__name__)
+
+# Request fields passed through to the pipeline, per endpoint
+QUERY_FIELDS = ("question", "k", "filters", "compress", "timeout_s", "deadline_ms")
+BATCH_FIELDS = ("questions", "k", "filters", "compress", "max_in_flight")
+RETRIEVE_FIELDS = ("question", "k", "filters")
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RequestError(ValueError):
+    """A malformed request, answered with an HTTP error status."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints over the server's pipeline.
+
+    Speaks HTTP/1.1, so clients keep one connection open across requests.
+    A query with "stream": true is answered as newline-delimited JSON
+    events (those of `RAGPipeline.query_stream`) in a chunked response.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "RAGService/1.0"
+
+    def do_GET(self) -> None:
+        """GET /health and /sources."""
+        routes = {'/health': self._health, '/sources': self._sources}
+        self._dispatch(routes, read_body=False)
+
+    def do_POST(self) -> None:
+        """POST /query, /query_batch and /retrieve."""
+        routes = {'/query': self._query, '/query_batch': self._query_batch, '/retrieve': self._retrieve}
+        self._dispatch(routes, read_body=True)
+
+    def _dispatch(self, routes: Dict[str, Callable], read_body: bool) -> None:
+        """Run a route and send its result, mapping failures to status codes."""
+        try:
+            route = routes.get(self.path.split("?", 1)[0])
+            if route is None:
+                raise RequestError(f"No such endpoint: {self.command} {self.path}", status=404)
+            body = self._read_json() if read_body else {}
+            result = route(body)
+            if isinstance(result, Iterator):
+                self._send_stream(result)
+            else:
+                self._send_json(200, result)
+        except RequestError as e:
+            self._send_error(e.status, str(e))
+        except ValueError as e:
+            self._send_error(400, str(e))
+        except QueueFullError as e:
+            self._send_error(503, str(e))
+        except DeadlineExceededError as e:
+            self._send_error(504, str(e))
+        except Exception as e:
+            logger.exception(f"Error serving {self.command} {self.path}")
+            self._send_error(500, f"{type(e).__name__}: {e}")
+
+    def _read_json(self) -> Dict:
+        """The request body as a JSON object."""
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_BYTES:
+            raise RequestError(f"Request body exceeds {MAX_BODY_BYTES} bytes", status=413)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise RequestError(f"Invalid JSON body: {e}")
+        if not isinstance(body, dict):
+            raise RequestError("Request body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _arguments(body: Dict, fields: tuple, required: str) -> Dict:
+        """Pipeline keyword arguments from a request body, rejecting unknown fields."""
+        unknown = set(body) - set(fields) - {'stream'}
+        if unknown:
+            raise RequestError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if required not in body:
+            raise RequestError(f"Missing required field: {required}")
+        return {name: body[name] for name in fields if name in body}
+
+    def _health(self, body: Dict) -> Dict:
+        """Process, index and LLM state."""
+        pipeline: RAGPipeline = self.server.pipeline
+        return {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'index_version': pipeline.indexer.index_version,
+            'index_mmap': pipeline.indexer.memory_mapped,
+            'llm': pipeline.get_llm_readiness(),
+            'generation': pipeline.get_generation_metrics()
+        }
+
+    def _sources(self, body: Dict) -> Dict:
+        """Source documents in the index."""
+        return {'sources': self.server.pipeline.list_sources()}
+
+    def _query(self, body: Dict):
+        """One question, answered whole or as a stream of events."""
+        arguments = self._arguments(body, QUERY_FIELDS, required='question')
+        if body.get('stream'):
+            arguments.pop('timeout_s', None)
+            return self.server.pipeline.query_stream(**arguments)
+        return self.server.pipeline.query(priority=PRIORITY_INTERACTIVE, **arguments)
+
+    def _query_batch(self, body: Dict) -> Dict:
+        """Many questions at batch priority; failed items carry an 'error'."""
+        arguments = self._arguments(body, BATCH_FIELDS, required='questions')
+        if not isinstance(arguments['questions'], list):
+            raise RequestError("'questions' must be a list")
+        return {'responses': self.server.pipeline.query_batch(priority=PRIORITY_BATCH, **arguments)}
+
+    def _retrieve(self, body: Dict) -> Dict:
+        """Retrieved chunks and their scores, without generation."""
+        arguments = self._arguments(body, RETRIEVE_FIELDS, required='question')
+        pipeline: RAGPipeline = self.server.pipeline
+        if pipeline.retriever is None:
+            raise ValueError("No index loaded. Load or ingest documents first.")
+        results = pipeline.retriever.retrieve_with_scores(
+            arguments['question'], k=arguments.get('k'), filters=arguments.get('filters')
+        )
+        return {
+            'documents': [
+                {'page_content': doc.page_content, 'metadata': doc.metadata, 'score': float(score)}
+                for doc, score in results
+            ]
+        }
+
+    def _send_json(self, status: int, payload: Dict, close: bool = False) -> None:
+        """Send a JSON response, keeping the connection open unless asked to close it."""
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str) -> None:
+        """Send an error response."""
+        # An unread request body would be parsed as the next request
+        self._send_json(status, {'error': message}, close=self.command == "POST" and status in (404, 413))
+
+    def _send_stream(self, events: Iterator[Dict]) -> None:
+        """Send events as newline-delimited JSON, one chunk per event."""
+        try:
+            # Pull the first event before committing to a 200, so retrieval errors get a status
+            first = next(events, None)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    if first is not None:
+                        self._write_chunk(first)
+                    for event in events:
+                        self._write_chunk(event)
+                except OSError:
+                    raise
+                except Exception as e:
+                    logger.exception("Error streaming response")
+                    self._write_chunk({'type': 'error', 'error': f"{type(e).__name__}: {e}"})
+                self.wfile.write(b"0\r\n\r\n")
+            except OSError as e:
+                # The client went away mid-stream; there is no one left to answer
+                logger.info(f"Stream to {self.address_string()} ended early: {e}")
+                self.close_connection = True
+        finally:
+            events.close()
+
+    def _write_chunk(self, event: Dict) -> None:
+        """Write one event as an HTTP chunk."""
+        data = json.dumps(event, default=str).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format: str, *args) -> None:
+        """Send access logs to the module logger instead of stderr."""
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class RAGServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the pipeline its handlers query."""
+
+    daemon_threads = True
+    # Many keep-alive clients may connect at once
+    request_queue_size = 128
+
+    def __init__(self, address: tuple, pipeline: Optional[RAGPipeline] = None):
+        """
+        Bind the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free port
+            pipeline: Pipeline with its index loaded; worker processes set
+                their own before serving
+        """
+        super().__init__(address, RAGRequestHandler)
+        self.pipeline = pipeline
+
+
+def _serve_worker(server: RAGServer, pipeline_factory: Callable[[], RAGPipeline]) -> None:
+    """Worker process body: build a pipeline and serve on the inherited socket."""
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    server.pipeline = pipeline_factory()
+    logger.info(f"Worker {os.getpid()} serving")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pipeline.shutdown()
+
+
+def serve(
+    pipeline_factory: Callable[[], RAGPipeline],
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: int = 1
+) -> None:
+    """
+    Serve the pipeline over HTTP until interrupted.
+
+    With several workers, the listening socket is opened once and the
+    process forks that many workers accepting on it. Each builds its own
+    pipeline; with `mmap_index=True` their FAISS vectors are one shared
+    read-only mapping of the index file. Platforms without fork serve
+    from a single process.
+
+    Args:
+        pipeline_factory: Builds a pipeline and loads its index; called
+            once per worker process
+        host: Interface to listen on
+        port: Port to listen on
+        workers: Worker processes
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    server = RAGServer((host, port))
+    logger.info(f"RAG service listening on http://{host}:{server.server_address[1]} with {workers} worker(s)")
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        if workers > 1:
+            logger.warning("fork is not available on this platform; serving from one process")
+        server.pipeline = pipeline_factory()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            server.pipeline.shutdown()
+        return
+
+    # Fork before any pipeline exists, so no threads or models are copied
+    context = multiprocessing.get_context("fork")
+    processes: List[multiprocessing.Process] = [
+        context.Process(target=_serve_worker, args=(server, pipeline_factory), name=f"rag-service-{idx}", daemon=True)
+        for idx in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=10)
+        server.server_close()
@@ -0,0 +1,77 @@
+"""Tests for caching module."""
+
+import time
+from src.caching import SemanticCache, ResponseCache
+
+
+def test_semantic_cache_hit_and_threshold():
+    """Test near-duplicate questions hit the cache and distant ones miss."""
+    cache = SemanticCache(similarity_threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], k=5, index_version="v1", response={'answer': "A", 'question': "q1"})
+
+    hit = cache.lookup([0.99, 0.05, 0.0], k=5, index_version="v1")
+    assert hit['answer'] == "A"
+    assert hit['cache']['type'] == 'semantic'
+
+    assert cache.lookup([0.0, 1.0, 0.0], k=5, index_version="v1") is None
+    assert cache.lookup([1.0, 0.0, 0.0], k=3, index_version="v1") is None
+
+
+def test_semantic_cache_matches_generator():
+    """Test a response is only served for the generator that produced it."""
+    cache = SemanticCache()
+    cache.store([1.0, 0.0], k=5, index_version="v1", response={'answer': "A", 'question': "q"}, generator="demo")
+    assert cache.lookup([1.0, 0.0], k=5, index_version="v1", generator="llama-3") is None
+    assert cache.lookup([1.0, 0.0], k=5, index_version="v1", generator="demo")['answer'] == "A"
+
+
+def test_semantic_cache_invalidates_on_index_change():
+    """Test entries are dropped when the index version changes."""
+    cache = SemanticCache()
+    cache.store([1.0, 0.0], k=5, index_version="v1", response={'answer': "A", 'question': "q"})
+    assert cache.lookup([1.0, 0.0], k=5, index_version="v2") is None
+    assert len(cache) == 0
+
+
+def test_semantic_cache_evicts_least_recently_used():
+    """Test the cache stays bounded and evicts the oldest unused entry."""
+    cache = SemanticCache(max_entries=2)
+    cache.store([1.0, 0.0, 0.0], k=5, index_version="v1", response={'answer': "A", 'question': "a"})
+    cache.store([0.0, 1.0, 0.0], k=5, index_version="v1", response={'answer': "B", 'question': "b"})
+    assert cache.lookup([1.0, 0.0, 0.0], k=5, index_version="v1") is not None
+    cache.store([0.0, 0.0, 1.0], k=5, index_version="v1", response={'answer': "C", 'question': "c"})
+
+    assert len(cache) == 2
+    assert cache.lookup([0.0, 1.0, 0.0], k=5, index_version="v1") is None
+    assert cache.lookup([1.0, 0.0, 0.0], k=5, index_version="v1")['answer'] == "A"
+
+
+def test_response_cache_persists_across_instances(tmp_path):
+    """Test exact-match responses survive a restart and keys normalize questions."""
+    db_path = tmp_path / "cache.sqlite"
+    key = ResponseCache.make_key("What is Diabetes?", 5, index_version="v1")
+    assert key == ResponseCache.make_key("  what is   diabetes", 5, index_version="v1")
+    assert key != ResponseCache.make_key("What is diabetes?", 5, index_version="v2")
+
+    ResponseCache(str(db_path)).put(key, {'answer': "A", 'citations': []})
+
+    restarted = ResponseCache(str(db_path))
+    cached = restarted.get(key)
+    assert cached['answer'] == "A"
+    assert cached['cache']['type'] == 'exact'
+
+
+def test_response_cache_ttl_and_lru(tmp_path):
+    """Test expired entries miss and the least recently used entry is evicted."""
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=0.0)
+    cache.put("a", {'answer': "A"})
+    time.sleep(0.01)
+    assert cache.get("a") is None
+
+    cache = ResponseCache(str(tmp_path / "lru.sqlite"), ttl_seconds=None, max_entries=2)
+    cache.put("a", {'answer': "A"})
+    cache.put("b", {'answer': "B"})
+    cache.get("a")
+    cache.put("c", {'answer': "C"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
@@ -0,0 +1,201 @@
+"""Tests for the collection manager."""
+
+import sys
+import threading
+
+import pytest
+from langchain.schema import Document
+
+import src.collection_manager as collection_manager
+import src.rag_pipeline as rag_pipeline
+from src.collection_manager import CollectionManager, IndexCache
+from src.rag_pipeline import RAGPipeline
+from tests.test_pipeline import FakeEmbedder
+from tests.test_retrieval import CountingReranker
+
+COLLECTIONS = {
+    'cardiology': [
+        "Hypertension is treated with ACE inhibitors such as lisinopril.",
+        "Statins lower LDL cholesterol and reduce cardiovascular risk."
+    ],
+    'endocrinology': [
+        "Metformin is the first-line medication for type 2 diabetes.",
+        "Insulin glargine is a long-acting basal insulin given once daily."
+    ],
+    'pediatrics': [
+        "Amoxicillin is the first-line treatment for acute otitis media in children."
+    ]
+}
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    """Manager over three small collections saved to disk, answering in demo mode."""
+    monkeypatch.setattr(rag_pipeline, "Embedder", FakeEmbedder)
+    monkeypatch.setattr(collection_manager, "Embedder", FakeEmbedder)
+    for name, texts in COLLECTIONS.items():
+        builder = RAGPipeline(
+            model_path=str(tmp_path / "missing.gguf"),
+            index_path=str(tmp_path / "collections" / name),
+            response_cache_path=None,
+            semantic_cache_threshold=None,
+            usage_log_path=None
+        )
+        builder.indexer.create_index([
+            Document(page_content=text, metadata={'source': f"{name}.pdf", 'page_number': idx + 1, 'chunk_index': 0})
+            for idx, text in enumerate(texts)
+        ])
+        builder.indexer.save_index()
+    index_bytes = sum(entry.stat().st_size for entry in (tmp_path / "collections" / "cardiology").iterdir())
+    manager = CollectionManager(
+        model_path=str(tmp_path / "missing.gguf"),
+        collections_dir=str(tmp_path / "collections"),
+        # Room for two loaded collections
+        memory_budget_mb=2.5 * index_bytes / (1024 * 1024),
+        usage_log_path=None,
+        response_cache_path=None,
+        semantic_cache_threshold=None
+    )
+    yield manager
+    manager.shutdown()
+
+
+def test_collections_share_components_and_evict_least_recently_used(manager):
+    """Test collections load lazily on the shared embedder and the idle LRU one is unloaded over budget."""
+    assert manager.list_collections() == ['cardiology', 'endocrinology', 'pediatrics']
+    assert manager.get_stats()['loaded'] == []
+
+    cardiology = manager.get('cardiology')
+    endocrinology = manager.get('endocrinology')
+    assert cardiology.embedder is endocrinology.embedder is manager.embedder
+    assert cardiology.generator is endocrinology.generator is manager.generator
+
+    manager.get('cardiology')
+    manager.get('pediatrics')
+    stats = manager.get_stats()
+    assert stats['loaded'] == ['cardiology', 'pediatrics']
+    assert stats['evictions'] == 1 and stats['memory_bytes'] <= stats['memory_budget_bytes']
+
+    with pytest.raises(ValueError):
+        manager.get('../cardiology')
+
+
+def test_query_targets_one_collection_or_fans_out(manager):
+    """Test a single-collection query matches its pipeline and a fan-out cites every collection searched."""
+    question = "What is the first-line treatment?"
+    single = manager.query(question, collections='endocrinology', k=2)
+    assert single['answer'] == manager.get('endocrinology').query(question, k=2)['answer']
+    assert {citation['source'] for citation in single['citations']} == {'endocrinology.pdf'}
+
+    fanned = manager.query(question, collections=['endocrinology', 'pediatrics'], k=3)
+    assert fanned['collections'] == ['endocrinology', 'pediatrics']
+    assert {citation['collection'] for citation in fanned['citations']} == {'endocrinology', 'pediatrics'}
+    assert fanned['usage']['answer_source'] == 'demo'
+
+
+def test_rebuilt_index_reloads_alone_for_every_model(manager, tmp_path):
+    """Test managers for two models share loaded indexes, and a rebuild reloads only the index."""
+    other = CollectionManager(
+        model_path=str(tmp_path / "other.gguf"),
+        collections_dir=str(tmp_path / "collections"),
+        embedder=manager.embedder,
+        index_cache=manager.index_cache,
+        usage_log_path=None,
+        response_cache_path=None,
+        semantic_cache_threshold=None
+    )
+    before = manager.get('pediatrics')
+    assert other.get('pediatrics').indexer is before.indexer
+    assert manager.index_cache.loads == 1
+
+    builder = RAGPipeline(
+        model_path=str(tmp_path / "missing.gguf"),
+        index_path=str(manager.collection_path('pediatrics')),
+        embedder=manager.embedder,
+        response_cache_path=None,
+        semantic_cache_threshold=None,
+        usage_log_path=None
+    )
+    builder.indexer.create_index([
+        Document(page_content="Cefdinir is an alternative for children allergic to penicillin.",
+                 metadata={'source': 'pediatrics-2.pdf', 'page_number': 1, 'chunk_index': 0})
+    ])
+    builder.indexer.save_index()
+
+    after = manager.get('pediatrics')
+    assert after.indexer is not before.indexer and manager.index_cache.loads == 2
+    assert after.embedder is before.embedder and after.generator is before.generator
+    assert other.get('pediatrics').indexer is after.indexer
+    assert after.list_sources() == ['pediatrics-2.pdf']
+    assert IndexCache.key(manager.collection_path('pediatrics')) in manager.index_cache.get_stats()['load_ms']
+    other.shutdown()
+
+
+def test_collections_share_one_reranker_with_separate_scores(monkeypatch, manager, tmp_path):
+    """Test every collection reranks with the manager's cross-encoder, caching scores per index."""
+    monkeypatch.setattr(collection_manager, "CrossEncoderReranker", CountingReranker)
+    reranking = CollectionManager(
+        model_path=str(tmp_path / "missing.gguf"),
+        collections_dir=str(tmp_path / "collections"),
+        embedder=manager.embedder,
+        index_cache=manager.index_cache,
+        usage_log_path=None,
+        response_cache_path=None,
+        semantic_cache_threshold=None,
+        rerank_model="cross-encoder/ms-marco-MiniLM-L-6-v2"
+    )
+    question = "What is the first-line treatment?"
+    cardiology = reranking.query(question, collections='cardiology', k=1)
+    endocrinology = reranking.query(question, collections='endocrinology', k=1)
+    assert reranking.get('cardiology').reranker is reranking.get('endocrinology').reranker is reranking.reranker
+    # Both indexes number their chunks from 0; neither reuses the other's scores
+    assert reranking.reranker.scored_pairs == 4
+    assert cardiology['citations'][0]['source'] == 'cardiology.pdf'
+    assert endocrinology['citations'][0]['source'] == 'endocrinology.pdf'
+    reranking.shutdown()
+
+
+def test_shared_reranker_cache_survives_concurrent_queries():
+    """Test collections reranking at once through one small cache neither fail nor overfill it."""
+    reranker = CountingReranker(cache_size=16)
+    candidates = [(chunk_id, "chunk " * (chunk_id + 1)) for chunk_id in range(6)]
+    errors = []
+
+    def rerank_often(scope):
+        try:
+            for round in range(1000):
+                ranked = reranker.rerank(f"question {round % 3}", candidates, k=2, scope=scope)
+                assert [chunk_id for chunk_id, _ in ranked] == [5, 4]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rerank_often, args=(f"index-{n}",)) for n in range(16)]
+    # Switch threads often, so they interleave inside the cache updates
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+    assert len(reranker._cache) <= reranker.cache_size
+
+
+def test_unloaded_pipeline_shuts_down_after_its_query(monkeypatch, manager):
+    """Test a pipeline whose index is unloaded mid-query is shut down only once the query ends."""
+    shut_down = []
+    monkeypatch.setattr(RAGPipeline, "shutdown", lambda pipeline: shut_down.append(pipeline))
+
+    with manager._checkout(['cardiology']) as pipelines:
+        manager.unload('cardiology')
+        assert shut_down == []
+        assert pipelines[0].query("How is hypertension treated?", k=1)['citations']
+    assert shut_down == pipelines
+
+    idle = manager.get('cardiology')
+    manager.unload('cardiology')
+    assert shut_down == pipelines + [idle]
+
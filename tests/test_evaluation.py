@@ -0,0 +1,34 @@
+"""Tests for evaluation metrics."""
+
+import pytest
+
+from src.evaluation import RAGEvaluator
+
+
+def test_compare_context_compression_reports_both_settings():
+    """Test the compression report scores each setting and the context kept."""
+    evaluator = RAGEvaluator()
+    full_context = "Metformin is the first-line medication for type 2 diabetes. Statins lower LDL cholesterol."
+    compressed_context = "Metformin is the first-line medication for type 2 diabetes."
+
+    report = evaluator.compare_context_compression(
+        full_answers=["Metformin is the first-line medication for type 2 diabetes."],
+        full_contexts=[full_context],
+        compressed_answers=["Statins lower LDL cholesterol."],
+        compressed_contexts=[compressed_context]
+    )
+    assert report['num_questions'] == 1
+    assert report['full_faithfulness'] == 1.0
+    assert report['compressed_faithfulness'] == 0.0
+    assert report['compressed_faithfulness_to_full_context'] == 1.0
+    assert report['faithfulness_delta'] == -1.0
+    assert report['mean_context_kept_ratio'] == pytest.approx(len(compressed_context) / len(full_context))
+
+
+def test_compare_context_compression_rejects_mismatched_lists():
+    """Test lists of different lengths, or no answers at all, are rejected."""
+    evaluator = RAGEvaluator()
+    with pytest.raises(ValueError, match="same length"):
+        evaluator.compare_context_compression(["a"], ["c"], ["a", "b"], ["c"])
+    with pytest.raises(ValueError, match="At least one"):
+        evaluator.compare_context_compression([], [], [], [])
@@ -0,0 +1,377 @@
+"""Tests for generation module."""
+
+import json
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+from src.generation import (
+    AnswerGenerator,
+    PrefixCache,
+    GenerationScheduler,
+    QueueFullError,
+    DeadlineExceededError,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BATCH,
+    LLMWorkerPool,
+    ExtractiveAnswerer,
+)
+from src.embeddings.bm25_index import BM25Index
+from src.evaluation.usage_log import UsageLog, UsageStats
+from src.query_budget import QueryBudget, StageLatencyModel
+
+
+class FakeStreamingLLM:
+    """Stands in for LlamaCpp, streaming one token per chunk."""
+
+    def __init__(self, tokens, fail_after=None):
+        self.tokens = tokens
+        self.fail_after = fail_after
+
+    def stream(self, prompt, max_tokens=None):
+        for idx, token in enumerate(self.tokens[:max_tokens]):
+            if idx == self.fail_after:
+                raise RuntimeError("decode failed")
+            yield token
+
+
+def test_generate_streaming_yields_tokens_then_response():
+    """Test streaming yields each token and finishes with timings."""
+    generator = AnswerGenerator(model_path="missing.gguf")
+    generator.llm = FakeStreamingLLM(["Metformin", " is", " first-line", " [1]."])
+    generator._initialized = True
+
+    events = list(generator.generate_streaming("What treats diabetes?", "[1] Source: a.pdf\nMetformin."))
+
+    assert [e['text'] for e in events if e['type'] == 'token'] == ["Metformin", " is", " first-line", " [1]."]
+    response = events[-1]['response']
+    assert events[-1]['type'] == 'done'
+    assert response['answer'] == "Metformin is first-line [1]."
+    assert response['model'] == 'Llama-3'
+    assert response['streaming']['completion_tokens'] == 4
+    assert response['streaming']['first_token_ms'] <= response['streaming']['generation_ms']
+
+
+def test_generate_streaming_falls_back_to_demo_and_flags_truncation():
+    """Test a stream failing before any token uses demo mode; a later failure is flagged."""
+    generator = AnswerGenerator(model_path="missing.gguf")
+    generator._initialized = True
+    context = "Metformin is the first-line medication for type 2 diabetes in adults."
+
+    generator.llm = FakeStreamingLLM(["Metformin"], fail_after=0)
+    generator.count_tokens = lambda text: len(text.split())
+    response = list(generator.generate_streaming("What is metformin?", context))[-1]['response']
+    assert response['model'] == 'Demo Mode (Context Extraction)'
+
+    generator.llm = FakeStreamingLLM(["Metformin", " is"], fail_after=1)
+    response = list(generator.generate_streaming("What is metformin?", context))[-1]['response']
+    assert response['answer'] == "Metformin"
+    assert 'stream_error' in response
+
+
+class FakeLlamaClient:
+    """Minimal llama_cpp.Llama stand-in tracking evaluated tokens."""
+
+    def __init__(self):
+        self.input_ids = []
+        self.evaluated = 0
+
+    @property
+    def n_tokens(self):
+        return len(self.input_ids)
+
+    def tokenize(self, text, add_bos=True):
+        return ([0] if add_bos else []) + [len(word) for word in text.decode("utf-8").split(" ")]
+
+    def reset(self):
+        self.input_ids = []
+
+    def eval(self, tokens):
+        self.evaluated += len(tokens)
+        self.input_ids = self.input_ids + list(tokens)
+
+    def save_state(self):
+        return list(self.input_ids)
+
+    def load_state(self, state):
+        self.input_ids = list(state)
+
+
+def test_prefix_cache_restores_state_and_persists(tmp_path):
+    """Test the prefix is evaluated once, restored after other prompts, and reloaded from disk."""
+    prefix = "You are a medical assistant. Answer only from context. Context: "
+    state_path = tmp_path / "prefix.state"
+    client = FakeLlamaClient()
+    cache = PrefixCache(client, prefix, state_path=str(state_path), cache_key="model-a")
+    cache.warm()
+    assert client.evaluated == len(cache.prefix_tokens)
+
+    cache.prefill_ms = 40.0
+    report = cache.restore()
+    assert report['restored'] is False and report['prefill_ms_saved'] == 0.0
+    client.reset()
+    client.eval([9, 9, 9])
+    report = cache.restore()
+    assert report['restored'] is True and report['prefill_ms_saved'] > 0.0
+    assert client.input_ids == cache.prefix_tokens
+
+    restarted = FakeLlamaClient()
+    PrefixCache(restarted, prefix, state_path=str(state_path), cache_key="model-a").warm()
+    assert restarted.evaluated == 0
+    assert restarted.input_ids == cache.prefix_tokens
+
+    other_model = FakeLlamaClient()
+    PrefixCache(other_model, prefix, state_path=str(state_path), cache_key="model-b").warm()
+    assert other_model.evaluated == len(cache.prefix_tokens)
+
+
+class BlockingGenerator:
+    """Records the order requests run in; the first one blocks until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.order = []
+
+    def generate(self, question, context, citations=None, use_demo_mode=False, max_tokens=None):
+        self.started.set()
+        if not self.order:
+            self.release.wait(5)
+        self.order.append(question)
+        return {'answer': question}
+
+    def generate_streaming(self, question, context, citations=None, use_demo_mode=False, max_tokens=None):
+        for token in ["a", "b", "c"]:
+            self.release.wait(5)
+            yield {'type': 'token', 'text': token}
+        yield {'type': 'done', 'response': {'answer': "abc"}}
+
+
+def test_scheduler_runs_by_priority_and_enforces_limits():
+    """Test interactive requests jump batch ones, and full queues, cancellation and deadlines."""
+    generator = BlockingGenerator()
+    scheduler = GenerationScheduler(generator, max_queue_size=3)
+
+    first = scheduler.submit("first", "ctx", priority=PRIORITY_BATCH)
+    assert generator.started.wait(5)
+    batch = scheduler.submit("batch", "ctx", priority=PRIORITY_BATCH)
+    cancelled = scheduler.submit("cancelled", "ctx")
+    expired = scheduler.submit("expired", "ctx", deadline=time.monotonic() - 1)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("rejected", "ctx")
+    assert cancelled.cancel()
+    interactive = scheduler.submit("interactive", "ctx", priority=PRIORITY_INTERACTIVE)
+    assert scheduler.get_metrics()['queue_depth'] == 3
+
+    generator.release.set()
+    assert batch.result(5) == {'answer': "batch"}
+    assert first.result(5) == {'answer': "first"}
+    assert interactive.result(5) == {'answer': "interactive"}
+    assert generator.order == ["first", "interactive", "batch"]
+    with pytest.raises(DeadlineExceededError):
+        expired.result(5)
+
+    metrics = scheduler.get_metrics()
+    assert metrics['completed'] == 3 and metrics['rejected'] == 1 and metrics['expired'] == 1
+    scheduler.shutdown()
+
+
+def test_scheduler_streams_and_cancels_running_stream():
+    """Test streamed events arrive through the ticket and cancel stops a running stream."""
+    generator = BlockingGenerator()
+    scheduler = GenerationScheduler(generator)
+
+    generator.release.set()
+    ticket = scheduler.submit("q", "ctx", stream=True)
+    events = list(ticket.events())
+    assert [e['text'] for e in events if e['type'] == 'token'] == ["a", "b", "c"]
+    assert ticket.result(5) == {'answer': "abc"}
+
+    generator.release.clear()
+    ticket = scheduler.submit("q", "ctx", stream=True)
+    time.sleep(0.05)
+    ticket.cancel()
+    generator.release.set()
+    with pytest.raises(CancelledError):
+        list(ticket.events())
+    scheduler.shutdown()
+
+
+def test_scheduler_concurrency_runs_requests_in_parallel():
+    """Test a scheduler with concurrency 2 runs two requests at the same time."""
+    barrier = threading.Barrier(2, timeout=5)
+
+    class ParallelGenerator:
+        def generate(self, question, context, citations=None, use_demo_mode=False, max_tokens=None):
+            barrier.wait()  # only passes if both requests run together
+            return {'answer': question}
+
+    scheduler = GenerationScheduler(ParallelGenerator(), concurrency=2)
+    tickets = [scheduler.submit(q, "ctx") for q in ("a", "b")]
+    assert [t.result(5)['answer'] for t in tickets] == ["a", "b"]
+    assert scheduler.get_metrics()['concurrency'] == 2
+    scheduler.shutdown()
+
+
+def test_worker_pool_balances_requests_across_processes():
+    """Test requests spread over worker processes and stream back (demo answers without a model)."""
+    pool = LLMWorkerPool({'model_path': "missing.gguf", 'n_threads': 1}, n_workers=2)
+    try:
+        assert pool.wait_ready(timeout=120) is False
+        context = "Metformin is the first-line medication for type 2 diabetes in adults."
+
+        requests = [pool.submit("What is metformin?", context) for _ in range(4)]
+        responses = [request.future.result(60) for request in requests]
+        assert all(r['model'] == 'Demo Mode (Context Extraction)' for r in responses)
+        assert sorted(r['worker'] for r in responses) == [0, 0, 1, 1]
+
+        events = list(pool.generate_streaming("What is metformin?", context))
+        assert events[0]['type'] == 'token' and events[-1]['type'] == 'done'
+        assert sum(pool.get_stats()['completed']) == 5
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_skips_a_dead_worker_at_dispatch():
+    """Test a worker that died is noticed when the next request is dispatched, not at the idle poll."""
+    pool = LLMWorkerPool({'model_path': "missing.gguf", 'n_threads': 1}, n_workers=2)
+    try:
+        pool.wait_ready(timeout=120)
+        # Let the worker's queue feeder release the results lock it sent "ready" under
+        time.sleep(1.0)
+        pool._processes[0].kill()
+        pool._processes[0].join(10)
+
+        requests = [pool.submit("What is metformin?", "Metformin treats diabetes.") for _ in range(2)]
+        assert [request.worker_id for request in requests] == [1, 1]
+        assert all(request.future.result(60)['worker'] == 1 for request in requests)
+        assert pool.get_stats()['alive'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_extractive_answerer_scores_whole_terms_and_cites_chunks():
+    """Test sentences are ranked by BM25 over whole tokens and tagged with their citation."""
+    context = (
+        "[1] Source: a.pdf, Page: 2\n"
+        "Insulin therapy is started in insulin-deficient patients. "
+        "Metformin is the first-line medication for type 2 diabetes."
+        "\n\n---\n\n"
+        "[2] Source: b.pdf, Page: 7\n"
+        "Metformin dosing starts at 500mg twice daily with meals."
+    )
+    answerer = ExtractiveAnswerer(max_sentences=2)
+
+    # "in" is a stopword, and would only have matched "insulin" as a substring anyway
+    answer = answerer.answer("What is metformin dosing in diabetes?", context)
+    assert answer.startswith("Metformin")
+    assert "[1]" in answer and "[2]" in answer
+    assert "Insulin" not in answer
+    assert answerer.answer("What about warfarin?", context) is None
+
+    # Corpus IDF makes the rare term dominate
+    corpus = BM25Index.build(["metformin dosing"] + ["diabetes care"] * 20)
+    answerer = ExtractiveAnswerer(keyword_index=corpus, max_sentences=1)
+    assert answerer.answer("diabetes metformin dosing", context).endswith("[2]")
+
+
+def test_background_load_reports_readiness_and_warms_up():
+    """Test the LLM loads on a background thread, warms up, and reports its state."""
+    release = threading.Event()
+    prompts = []
+
+    class FakeLlm:
+        def invoke(self, prompt, max_tokens):
+            prompts.append(max_tokens)
+            return "ok"
+
+    generator = AnswerGenerator(model_path="missing.gguf", prefix_cache=False)
+
+    def slow_initialize():
+        release.wait(5)
+        generator.llm = FakeLlm()
+        generator._initialized = True
+
+    generator._initialize_llm = slow_initialize
+    assert generator.get_readiness()['state'] == 'not_loaded'
+
+    generator.start_background_load()
+    assert generator.get_readiness()['state'] == 'loading'
+    assert generator.wait_until_ready(timeout=0.05) is False
+
+    release.set()
+    assert generator.wait_until_ready(timeout=5) is True
+    readiness = generator.get_readiness()
+    assert readiness['state'] == 'ready' and readiness['warmup_ms'] is not None
+    assert prompts == [AnswerGenerator.WARMUP_TOKENS]
+
+
+def test_background_load_failure_is_reported():
+    """Test a model that cannot load ends in the failed state."""
+    generator = AnswerGenerator(model_path="missing.gguf")
+    generator.start_background_load()
+    assert generator.wait_until_ready(timeout=30) is False
+    assert generator.get_readiness()['state'] == 'failed'
+    assert generator.get_readiness()['error']
+
+
+def test_generate_reports_usage_and_usage_log_rotates(tmp_path):
+    """Test responses carry token/timing usage that aggregates and logs as JSON lines."""
+    generator = AnswerGenerator(model_path="missing.gguf")
+    generator.llm = FakeStreamingLLM(["Metformin", " is", " first-line", " [1]."])
+    generator._initialized = True
+    generator.count_tokens = lambda text: len(text.split())
+
+    response = generator.generate("What treats diabetes?", "[1] Source: a.pdf\nMetformin.")
+    usage = response['usage']
+    assert response['answer'] == "Metformin is first-line [1]."
+    assert usage['answer_source'] == 'llm'
+    assert usage['completion_tokens'] == 4
+    assert usage['prefill_ms'] >= 0.0 and usage['decode_ms'] >= 0.0
+
+    demo_usage = generator.generate("What treats diabetes?", "Metformin treats type 2 diabetes in adults.", use_demo_mode=True)['usage']
+    stats = UsageStats()
+    stats.add(dict(usage, prompt_tokens=10, ttft_ms=5.0))
+    stats.add(dict(demo_usage, ttft_ms=15.0))
+    summary = stats.summary()
+    assert summary['by_source'] == {'llm': 1, 'demo': 1}
+    assert summary['prompt_tokens'] == 10
+    assert summary['mean_ttft_ms'] == 10.0
+
+    log = UsageLog(str(tmp_path / "usage.jsonl"), max_bytes=200, backup_count=2)
+    for idx in range(10):
+        log.write({'query': idx, **usage})
+    log.close()
+    lines = (tmp_path / "usage.jsonl").read_text().splitlines()
+    assert json.loads(lines[-1])['query'] == 9
+    assert (tmp_path / "usage.jsonl.1").exists()
+    assert not (tmp_path / "usage.jsonl.3").exists()
+
+
+def test_query_budget_shares_remaining_time_and_caps_answer_length():
+    """Test stage budgets split the remaining time and max_tokens caps reach the model."""
+    budget = QueryBudget(1000, {'search': 1, 'rerank': 1, 'generate': 2})
+    assert budget.stage_budget_ms('search') == pytest.approx(250, abs=5)
+    budget.skip_stage('rerank', 'skipped_rerank')
+    assert budget.stage_budget_ms('search') == pytest.approx(1000 / 3, abs=5)
+    budget.finish_stage('search', 1.0)
+    assert budget.stage_budget_ms('generate') == pytest.approx(1000, abs=5)
+    report = budget.report()
+    assert report['degradations'] == ['skipped_rerank'] and report['met']
+    with pytest.raises(ValueError):
+        QueryBudget(0)
+
+    model = StageLatencyModel(smoothing=0.5)
+    assert model.estimate('embed_ms') is None
+    model.observe('embed_ms', 10.0)
+    model.observe('embed_ms', 20.0)
+    assert model.estimate('embed_ms') == 15.0
+
+    generator = AnswerGenerator(model_path="missing.gguf", max_tokens=3)
+    generator.llm = FakeStreamingLLM(["Metformin", " is", " first-line", " [1]."])
+    generator._initialized = True
+    generator.count_tokens = lambda text: len(text.split())
+    assert generator.generate("What treats diabetes?", "Metformin.", max_tokens=2)['answer'] == "Metformin is"
+    # A cap never raises the configured answer length
+    assert generator.generate("What treats diabetes?", "Metformin.", max_tokens=10)['answer'] == "Metformin is first-line"
@@ -0,0 +1,129 @@
+"""Tests for background ingestion jobs."""
+
+import pytest
+from langchain.schema import Document
+
+import src.ingestion_jobs as ingestion_jobs
+import src.rag_pipeline as rag_pipeline
+from src.embeddings import VectorIndexer
+from src.ingestion_jobs import IngestionJobRunner, run_job
+from src.rag_pipeline import RAGPipeline
+from tests.test_pipeline import FakeEmbedder
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one line of text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (4 + 2 * idx) for idx in range(len(pages))), len(pages)
+        ),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    for idx, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * idx)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(content)
+    content += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    content += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    content += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(content)
+
+
+class FakeProcess:
+    """Stands in for a worker process; the test runs the job itself."""
+
+    def __init__(self, args, **kwargs):
+        self.args = args
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+
+@pytest.fixture
+def job_setup(monkeypatch, tmp_path):
+    """A runner whose workers the test runs in-process, an existing index and a PDF directory."""
+    monkeypatch.setattr(rag_pipeline, "Embedder", FakeEmbedder)
+    processes = []
+
+    def start_worker(args, **kwargs):
+        processes.append(FakeProcess(args))
+        return processes[-1]
+
+    monkeypatch.setattr(ingestion_jobs.subprocess, "Popen", start_worker)
+    index_path = tmp_path / "index"
+    builder = RAGPipeline(
+        model_path=str(tmp_path / "missing.gguf"),
+        index_path=str(index_path),
+        response_cache_path=None,
+        semantic_cache_threshold=None,
+        usage_log_path=None
+    )
+    builder.indexer.create_index([
+        Document(page_content="Statins lower LDL cholesterol.", metadata={'source': 'old.pdf', 'page_number': 1, 'chunk_index': 0})
+    ])
+    builder.indexer.save_index()
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    write_pdf(pdfs / "diabetes.pdf", ["Metformin is the first-line medication for type 2 diabetes.",
+                                      "Insulin glargine is a long-acting basal insulin."])
+    write_pdf(pdfs / "otitis.pdf", ["Amoxicillin treats acute otitis media in children."])
+    yield IngestionJobRunner(str(tmp_path / "jobs")), processes, index_path, pdfs
+
+
+def test_job_reports_progress_and_swaps_in_the_new_index(job_setup):
+    """Test a job records its progress and replaces the index only once built, while the old one keeps answering."""
+    runner, processes, index_path, pdfs = job_setup
+    serving = RAGPipeline(
+        model_path="demo_mode", index_path=str(index_path),
+        response_cache_path=None, semantic_cache_threshold=None, usage_log_path=None
+    )
+    serving.load_index()
+    old_version = VectorIndexer.read_index_version(index_path)
+
+    job_id = runner.submit(str(pdfs), str(index_path))
+    assert runner.get(job_id)['state'] == 'queued'
+    with pytest.raises(ValueError, match="already building"):
+        runner.submit(str(pdfs), str(index_path))
+
+    run_job(processes[0].args[-1])
+    job = runner.get(job_id)
+    assert job['state'] == 'succeeded' and job['error'] is None
+    assert (job['files_done'], job['files_total'], job['pages_extracted']) == (2, 2, 3)
+    assert job['chunks_embedded'] == job['chunks_total'] == 3
+    assert VectorIndexer.read_index_version(index_path) != old_version
+    assert [path.name for path in index_path.parent.iterdir() if path.name.startswith(".")] == []
+
+    assert serving.list_sources() == ['old.pdf']
+    serving.load_index()
+    assert sorted(serving.list_sources()) == ['diabetes.pdf', 'otitis.pdf']
+    assert runner.list_jobs()[0]['job_id'] == job_id
+
+
+def test_cancelled_or_dead_job_leaves_the_current_index(job_setup):
+    """Test a cancelled job stops without touching the index, and a worker that died is reported as failed."""
+    runner, processes, index_path, pdfs = job_setup
+    old_version = VectorIndexer.read_index_version(index_path)
+
+    job_id = runner.submit(str(pdfs), str(index_path))
+    runner.cancel(job_id)
+    run_job(processes[0].args[-1])
+    assert runner.get(job_id)['state'] == 'cancelled'
+    assert VectorIndexer.read_index_version(index_path) == old_version
+    assert sorted(path.name for path in index_path.parent.iterdir()) == ['index', 'jobs', 'pdfs']
+    assert not (runner.jobs_dir / f"{job_id}.cancel").exists()
+
+    job_id = runner.submit(str(pdfs), str(index_path))
+    processes[1].returncode = -9
+    job = runner.get(job_id)
+    assert job['state'] == 'failed' and job['error'] == "Worker exited unexpectedly"
@@ -0,0 +1,180 @@
+"""Tests for the RAG pipeline query APIs."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+import src.rag_pipeline as rag_pipeline
+from src.rag_pipeline import RAGPipeline
+
+
+TEXTS = [
+    "Metformin is the first-line medication for type 2 diabetes in adults.",
+    "Hypertension is treated with ACE inhibitors such as lisinopril and with lifestyle changes.",
+    "Insulin glargine is a long-acting basal insulin given once daily.",
+    "Statins lower LDL cholesterol and reduce cardiovascular risk in most patients.",
+]
+
+
+class FakeEmbedder:
+    """Stands in for Embedder with deterministic, normalized fake embeddings."""
+
+    def __init__(self, model_name: str = "fake", **kwargs):
+        self.model_name = model_name
+        self.embeddings = DeterministicFakeEmbedding(size=32)
+        self.threads = set()
+        self.batches = []
+
+    def embed_query(self, query):
+        self.threads.add(threading.current_thread().name)
+        vector = np.array(self.embeddings.embed_query(query))
+        return list(vector / np.linalg.norm(vector))
+
+    def embed_queries(self, queries):
+        self.batches.append(len(queries))
+        return [self.embed_query(query) for query in queries]
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    """Pipeline over a small in-memory index, answering in demo mode."""
+    monkeypatch.setattr(rag_pipeline, "Embedder", FakeEmbedder)
+    pipeline = RAGPipeline(
+        model_path=str(tmp_path / "missing.gguf"),
+        index_path=str(tmp_path / "index"),
+        response_cache_path=None,
+        semantic_cache_threshold=None,
+        usage_log_path=None
+    )
+    pipeline.indexer.create_index([
+        Document(page_content=text, metadata={'source': 'guide.pdf', 'page_number': idx + 1, 'chunk_index': 0})
+        for idx, text in enumerate(TEXTS)
+    ])
+    pipeline.retriever = pipeline._create_retriever()
+    yield pipeline
+    pipeline.shutdown()
+
+
+def test_aquery_runs_stages_on_executors_and_matches_query(pipeline):
+    """Test concurrent aquery calls embed on the shared executor and answer like query."""
+    questions = ["What treats type 2 diabetes?", "How is hypertension treated?", "What lowers LDL cholesterol?"]
+
+    async def run():
+        return await asyncio.gather(*(pipeline.aquery(question, k=2) for question in questions))
+
+    responses = asyncio.run(run())
+
+    assert pipeline.embedder.threads == {"rag-embed_0"}
+    for question, response in zip(questions, responses):
+        expected = pipeline.query(question, k=2)
+        assert response['answer'] == expected['answer']
+        assert response['citations'] == expected['citations']
+        assert response['usage']['answer_source'] == 'demo'
+
+
+def test_query_batch_dedupes_keeps_order_and_reports_item_errors(pipeline, monkeypatch):
+    """Test a batch embeds unique questions once, answers like query and isolates failures."""
+    questions = ["What treats type 2 diabetes?", "How is hypertension treated?", "What treats type 2 diabetes?", "Broken?"]
+    pack = pipeline._pack_documents
+
+    def failing_pack(state, *args):
+        if state['question'] == "Broken?":
+            raise RuntimeError("packing failed")
+        return pack(state, *args)
+
+    monkeypatch.setattr(pipeline, "_pack_documents", failing_pack)
+    responses = pipeline.query_batch(questions, k=2)
+
+    assert pipeline.embedder.batches == [3]
+    assert [r['question'] for r in responses] == questions
+    assert responses[0]['answer'] == pipeline.query(questions[0], k=2)['answer']
+    assert responses[2]['answer'] == responses[0]['answer'] and responses[2] is not responses[0]
+    assert responses[1]['citations'] == pipeline.query(questions[1], k=2)['citations']
+    assert responses[3] == {'question': "Broken?", 'error': "RuntimeError: packing failed"}
+
+
+def test_llm_loading_fallback_is_not_semantically_cached(monkeypatch, tmp_path):
+    """Test extractive answers given while the LLM loads stay out of the semantic cache."""
+    monkeypatch.setattr(rag_pipeline, "Embedder", FakeEmbedder)
+    model_path = tmp_path / "model.gguf"
+    model_path.write_bytes(b"")
+    pipeline = RAGPipeline(
+        model_path=str(model_path),
+        index_path=str(tmp_path / "index"),
+        response_cache_path=None,
+        semantic_cache_threshold=0.95,
+        usage_log_path=None
+    )
+    pipeline.indexer.create_index([
+        Document(page_content=text, metadata={'source': 'guide.pdf', 'page_number': idx + 1, 'chunk_index': 0})
+        for idx, text in enumerate(TEXTS)
+    ])
+    pipeline.retriever = pipeline._create_retriever()
+    monkeypatch.setattr(pipeline, "_llm_still_loading", lambda: True)
+
+    response = pipeline.query("What treats type 2 diabetes?", k=2)
+    assert response['fallback_reason'] == 'llm_loading'
+    assert len(pipeline.semantic_cache) == 0
+    assert 'cache' not in pipeline.query("What treats type 2 diabetes?", k=2)
+    pipeline.shutdown()
+
+
+def test_demo_answers_are_not_served_once_a_model_is_installed(monkeypatch, tmp_path):
+    """Test semantic cache entries from demo mode miss once the model file appears."""
+    monkeypatch.setattr(rag_pipeline, "Embedder", FakeEmbedder)
+    model_path = tmp_path / "model.gguf"
+    pipeline = RAGPipeline(
+        model_path=str(model_path),
+        index_path=str(tmp_path / "index"),
+        response_cache_path=None,
+        semantic_cache_threshold=0.95,
+        usage_log_path=None
+    )
+    pipeline.indexer.create_index([
+        Document(page_content=text, metadata={'source': 'guide.pdf', 'page_number': idx + 1, 'chunk_index': 0})
+        for idx, text in enumerate(TEXTS)
+    ])
+    pipeline.retriever = pipeline._create_retriever()
+    # Without llama-cpp installed every fingerprint is the demo one; stand in for a real model's
+    monkeypatch.setattr(
+        pipeline._get_generator(), "get_cache_fingerprint",
+        lambda use_demo_mode=False: {'model': 'demo'} if use_demo_mode else {'model': str(model_path)}
+    )
+    question = "What treats type 2 diabetes?"
+
+    pipeline.query(question, k=2)
+    assert pipeline.query(question, k=2)['cache']['type'] == 'semantic'
+
+    model_path.write_bytes(b"")
+    assert 'cache' not in pipeline.query(question, k=2)
+    pipeline.shutdown()
+
+
+def test_response_cache_keys_on_context_settings(pipeline, tmp_path):
+    """Test pipelines sharing a response cache file don't serve answers built from differently sized contexts."""
+    def cached_pipeline(**options):
+        shared = RAGPipeline(
+            model_path=pipeline.model_path,
+            index_path=pipeline.index_path,
+            embedder=pipeline.embedder,
+            indexer=pipeline.indexer,
+            response_cache_path=str(tmp_path / "responses.sqlite"),
+            usage_log_path=None,
+            **options
+        )
+        shared.retriever = shared._create_retriever()
+        return shared
+
+    question = "What treats type 2 diabetes?"
+    first = cached_pipeline(context_token_budget=512)
+    first.query(question, k=2)
+    assert first.query(question, k=2)['cache']['type'] == 'exact'
+    for options in ({'context_token_budget': 1024}, {'rerank_fetch_k': 40}):
+        other = cached_pipeline(**options)
+        assert 'cache' not in other.query(question, k=2)
+        other.shutdown()
+    first.shutdown()
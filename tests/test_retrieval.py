@@ -0,0 +1,311 @@
+"""Tests for retrieval module."""
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from src.embeddings import BM25Index, DocumentCentroidIndex
+from src.embeddings.bm25_index import tokenize, _encode_varints, _decode_varints
+from src.retrieval.metadata_filter import IDFilter
+from src.retrieval import Retriever, reciprocal_rank_fusion, CrossEncoderReranker, maximal_marginal_relevance, ContextPacker, ContextCompressor, expand_with_neighbors
+
+
+TEXTS = [
+    "Metformin 500mg is first-line therapy for type 2 diabetes (ICD E11.9).",
+    "Hypertension is treated with ACE inhibitors such as lisinopril.",
+    "Insulin glargine is a long-acting basal insulin.",
+    "Statins lower LDL cholesterol and cardiovascular risk.",
+]
+
+
+class NormalizedFakeEmbedding(DeterministicFakeEmbedding):
+    """Deterministic fake embeddings normalized like the real Embedder's."""
+
+    def _get_embedding(self, seed):
+        vector = np.array(super()._get_embedding(seed))
+        return list(vector / np.linalg.norm(vector))
+
+
+@pytest.fixture
+def vectorstore():
+    """Small FAISS store with deterministic fake embeddings."""
+    documents = [
+        Document(page_content=text, metadata={'source': 'guide.pdf', 'page_number': idx + 1, 'chunk_index': 0})
+        for idx, text in enumerate(TEXTS)
+    ]
+    return FAISS.from_documents(documents, NormalizedFakeEmbedding(size=32))
+
+
+def test_tokenize_keeps_codes_and_dosages():
+    """Test tokenizer keeps ICD codes and dosages whole."""
+    tokens = tokenize("Metformin 500mg for E11.9")
+    assert "500mg" in tokens
+    assert "e11.9" in tokens
+    assert "e11" in tokens
+
+
+def test_varint_roundtrip():
+    """Test varint compression round trip."""
+    values = [0, 1, 127, 128, 300, 2 ** 20, 2 ** 35]
+    assert _decode_varints(_encode_varints(values)).tolist() == values
+
+
+def test_bm25_save_and_load(tmp_path):
+    """Test BM25 index persists and matches exact terms after mmap load."""
+    BM25Index.build(TEXTS).save(str(tmp_path))
+    index = BM25Index.load(str(tmp_path))
+
+    results = index.search("lisinopril", k=2)
+    assert results[0][0] == 1
+    assert index.search("e11.9", k=1)[0][0] == 0
+    assert index.search("unknownterm", k=3) == []
+
+
+def test_reciprocal_rank_fusion():
+    """Test RRF rewards documents ranked by both lists."""
+    fused = reciprocal_rank_fusion([[(1, 0.9), (2, 0.5)], [(2, 7.0), (3, 3.0)]], k=3)
+    assert fused[0][0] == 2
+    assert len(fused) == 3
+
+
+def test_hybrid_retrieval_finds_exact_term(vectorstore):
+    """Test hybrid mode surfaces the chunk containing an exact drug name."""
+    retriever = Retriever(
+        vectorstore=vectorstore,
+        k=2,
+        keyword_index=BM25Index.build(TEXTS),
+        search_mode="hybrid"
+    )
+    documents = retriever.retrieve("lisinopril dosing")
+    assert "lisinopril" in documents[0].page_content
+
+
+def test_hybrid_falls_back_to_dense_without_keyword_index(vectorstore):
+    """Test hybrid mode degrades to dense search when no BM25 index exists."""
+    retriever = Retriever(vectorstore=vectorstore, k=2, search_mode="hybrid")
+    assert len(retriever.retrieve("insulin")) == 2
+
+
+class CountingReranker(CrossEncoderReranker):
+    """Reranker that scores by text length and counts scored pairs."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scored_pairs = 0
+
+    def _predict(self, pairs):
+        self.scored_pairs += len(pairs)
+        return np.array([len(text) for _, text in pairs], dtype=np.float32)
+
+
+def test_reranker_orders_and_caches_scores(vectorstore):
+    """Test reranking keeps the best-scored chunks and reuses cached scores."""
+    reranker = CountingReranker()
+    retriever = Retriever(vectorstore=vectorstore, k=2, reranker=reranker, rerank_fetch_k=4)
+
+    documents = retriever.retrieve("diabetes")
+    assert documents[0].page_content == max(TEXTS, key=len)
+    assert reranker.scored_pairs == 4
+
+    retriever.retrieve("Diabetes ")
+    assert reranker.scored_pairs == 4
+
+
+def test_rerank_budget_per_query_limits_scored_pairs(vectorstore):
+    """Test a per-query rerank budget caps scoring at the measured per-pair cost."""
+    reranker = CountingReranker()
+    reranker._ms_per_pair = 10.0
+    retriever = Retriever(vectorstore=vectorstore, k=2, reranker=reranker, rerank_fetch_k=4)
+    assert reranker.estimate_ms(4) == 40.0
+
+    timings = {}
+    documents = retriever.retrieve("diabetes", rerank_budget_ms=20.0, timings=timings)
+    assert len(documents) == 2
+    assert reranker.scored_pairs == 2
+    assert set(timings) == {'search_ms', 'rerank_ms'}
+
+
+def test_rerank_scores_every_candidate_before_mmr(vectorstore):
+    """Test the reranker sees the whole over-fetch and MMR chooses among its best chunks."""
+    reranker = CountingReranker()
+    retriever = Retriever(
+        vectorstore=vectorstore, k=1, reranker=reranker, rerank_fetch_k=4, mmr_lambda=1.0, mmr_fetch_k=2
+    )
+
+    documents = retriever.retrieve("diabetes")
+    assert reranker.scored_pairs == 4
+    assert len(documents) == 1
+    assert documents[0].page_content in sorted(TEXTS, key=len)[-2:]
+
+
+def test_mmr_skips_duplicates_and_applies_caps():
+    """Test MMR avoids near-duplicate candidates and honours group caps."""
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([
+        [1.0, 0.0, 0.0],
+        [0.99, 0.01, 0.0],
+        [0.6, 0.8, 0.0],
+        [0.6, 0.0, 0.8],
+    ])
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+
+    pages = np.array([0, 0, 0, 1])
+    selected = maximal_marginal_relevance(query, candidates, k=2, lambda_mult=1.0, group_caps=[(pages, 1)])
+    assert selected == [0, 3]
+
+
+def test_filters_restrict_search_inside_faiss():
+    """Test source and page filters are applied as FAISS ID selectors."""
+    documents = [
+        Document(page_content=text, metadata={'source': source, 'page_number': page, 'chunk_index': 0})
+        for text, source, page in zip(TEXTS, ['a.pdf', 'a.pdf', 'b.pdf', 'b.pdf'], [1, 2, 1, 5])
+    ]
+    store = FAISS.from_documents(documents, NormalizedFakeEmbedding(size=32))
+    retriever = Retriever(vectorstore=store, k=4, keyword_index=BM25Index.build(TEXTS), search_mode="hybrid")
+
+    results = retriever.retrieve("diabetes", filters={'source': 'b.pdf'})
+    assert {doc.metadata['source'] for doc in results} == {'b.pdf'}
+    assert len(results) == 2
+
+    results = retriever.retrieve("diabetes", filters={'page_range': (2, 5)}, search_mode="dense")
+    assert sorted(doc.metadata['page_number'] for doc in results) == [2, 5]
+
+    assert retriever.retrieve("diabetes", filters={'source': 'missing.pdf'}) == []
+
+
+def test_id_filter_bitmap_is_sized_in_bytes():
+    """Test a scattered filter's bitmap selector is bounded by its bytes, not its bits."""
+    mask = np.zeros(20, dtype=bool)
+    mask[[1, 17]] = True
+    id_filter = IDFilter(mask)
+    assert id_filter.selector.n == 3
+    assert [i for i in range(24) if id_filter.selector.is_member(i)] == [1, 17]
+
+
+def test_score_threshold_uses_cosine_similarity():
+    """Test threshold retrieval converts L2 distances to cosine similarity."""
+    embeddings = NormalizedFakeEmbedding(size=32)
+    store = FAISS.from_documents([Document(page_content=text) for text in TEXTS], embeddings)
+
+    retriever = Retriever(vectorstore=store, k=4, score_threshold=0.99)
+    results = retriever.retrieve_with_scores(TEXTS[2])
+    assert [doc.page_content for doc, _ in results] == [TEXTS[2]]
+    assert results[0][1] == pytest.approx(1.0, abs=1e-4)
+
+    vectors = np.array(embeddings.embed_documents(TEXTS))
+    second_best = float(np.sort(vectors @ vectors[2])[-2])
+    retriever.score_threshold = second_best - 1e-3
+    assert len(retriever.retrieve(TEXTS[2])) == 2
+
+
+def test_score_threshold_is_inclusive_for_inner_product():
+    """Test a chunk scoring exactly the threshold is kept, as with an L2 index."""
+    embeddings = NormalizedFakeEmbedding(size=32)
+    store = FAISS.from_documents(
+        [Document(page_content=text) for text in TEXTS], embeddings,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+    query = np.array([embeddings.embed_query(TEXTS[2])], dtype=np.float32)
+    scores, _ = store.index.search(query, 2)
+
+    retriever = Retriever(vectorstore=store, k=4, score_threshold=float(scores[0][1]))
+    assert len(retriever.retrieve(TEXTS[2])) == 2
+
+
+def test_context_packer_trims_and_drops_to_budget():
+    """Test chunks are packed whole, trimmed to sentences, or dropped to fit the budget."""
+    count_words = lambda text: len(text.split())
+    documents = [
+        Document(page_content="Metformin lowers glucose. It is taken orally.", metadata={'source': 'a.pdf', 'page_number': 1}),
+        Document(page_content="Insulin is injected. " * 10, metadata={'source': 'b.pdf', 'page_number': 2}),
+        Document(page_content="Statins lower LDL cholesterol.", metadata={'source': 'c.pdf', 'page_number': 3}),
+    ]
+
+    packer = ContextPacker(count_words, min_chunk_tokens=2)
+    context, included, report = packer.pack(documents, token_budget=30)
+
+    assert count_words(context) <= 30
+    assert report['context_tokens'] == count_words(context)
+    assert included[0].page_content == documents[0].page_content
+    assert included[1].metadata['trimmed'] is True
+    assert report['chunks_trimmed'] == 1
+    assert report['chunks_included'] + report['chunks_dropped'] == 3
+    assert "[2] Source: b.pdf" in context
+
+
+def test_context_compressor_keeps_relevant_sentences_per_chunk():
+    """Test compression keeps the question's sentences and one sentence from every chunk."""
+    vocabulary = ["insulin", "metformin", "statin"]
+    embed_texts = lambda texts: [[t.lower().count(w) for w in vocabulary] + [0.1] for t in texts]
+    documents = [
+        Document(
+            page_content="Insulin is injected. Metformin is oral. Statin therapy is common. Insulin doses vary.",
+            metadata={'source': 'a.pdf'}
+        ),
+        Document(page_content="Statin therapy lowers LDL. Metformin is cheap.", metadata={'source': 'b.pdf'}),
+    ]
+
+    compressor = ContextCompressor(embed_texts, compression_ratio=0.6)
+    compressed, report = compressor.compress([1.0, 0.0, 0.0, 0.0], documents)
+
+    assert compressed[0].page_content == "Insulin is injected. Insulin doses vary."
+    assert compressed[0].metadata == {'source': 'a.pdf', 'compressed': True}
+    assert len(compressed) == 2
+    assert report['sentences_kept'] == 3
+    assert report['kept_ratio'] <= 0.6
+
+
+def test_neighbor_expansion_merges_overlapping_spans():
+    """Test small chunks expand to neighbours on their page with overlaps merged."""
+    from src.ingestion import DocumentChunker
+    from src.retrieval.neighbor_expansion import merge_chunk_texts
+
+    page_text = " ".join(f"Sentence {i} about metformin dosing." for i in range(12))
+    pages = [
+        {'text': page_text, 'page_number': 1, 'source': 'a.pdf'},
+        {'text': "Statins lower LDL cholesterol.", 'page_number': 2, 'source': 'a.pdf'},
+    ]
+    chunks = DocumentChunker(chunk_size=120, chunk_overlap=40).chunk_pages(pages)
+    page_one = [c.page_content for c in chunks if c.metadata['page_number'] == 1]
+    assert len(page_one) >= 4
+    assert merge_chunk_texts(page_one) == page_text
+
+    store = FAISS.from_documents(chunks, NormalizedFakeEmbedding(size=32))
+    retriever = Retriever(store, k=2, expand_window=1)
+    # Hits on chunks 1 and 2 of page one touch, so they merge into one span 0..3
+    merged = expand_with_neighbors([(1, 0.9), (2, 0.8)], retriever.metadata_index, retriever.get_document, 1)
+    assert len(merged) == 1
+    assert merged[0][0].metadata['chunk_span'] == (0, 3)
+    assert merged[0][0].page_content == merge_chunk_texts(page_one[:4])
+    # The last chunk is alone on page two and is returned unchanged
+    last = len(chunks) - 1
+    single = expand_with_neighbors([(last, 0.5)], retriever.metadata_index, retriever.get_document, 1)
+    assert single[0][0].page_content == "Statins lower LDL cholesterol."
+
+
+def test_coarse_to_fine_search_uses_document_centroids(tmp_path):
+    """Test the centroid index selects documents whose chunks are then searched."""
+    documents = [
+        Document(page_content=text, metadata={'source': source, 'page_number': 1, 'chunk_index': idx})
+        for idx, (text, source) in enumerate(zip(TEXTS, ['a.pdf', 'a.pdf', 'b.pdf', 'b.pdf']))
+    ]
+    embedding = NormalizedFakeEmbedding(size=32)
+    store = FAISS.from_documents(documents, embedding)
+    centroids = DocumentCentroidIndex.build(store.index, ['a.pdf', 'a.pdf', 'b.pdf', 'b.pdf'])
+
+    centroids.save(str(tmp_path))
+    loaded = DocumentCentroidIndex.load(str(tmp_path))
+    assert loaded.source_names == ['a.pdf', 'b.pdf']
+    assert loaded.chunk_mask([1]).tolist() == [False, False, True, True]
+
+    # A query equal to a b.pdf chunk is closest to the b.pdf centroid
+    query = embedding.embed_query(TEXTS[2])
+    assert loaded.search(np.array(query), top_d=1)[0][0] == 1
+
+    retriever = Retriever(store, k=4, centroid_index=loaded, coarse_top_d=1)
+    results = retriever.retrieve(TEXTS[2], query_embedding=query)
+    assert [doc.page_content for doc in results] == [TEXTS[2], TEXTS[3]]
+    assert len(retriever.retrieve(TEXTS[2], query_embedding=query, coarse=False)) == 4
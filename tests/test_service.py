@@ -0,0 +1,108 @@
+"""Tests for the HTTP query service and its client."""
+
+import io
+import threading
+
+import pytest
+from langchain.schema import Document
+
+import src.rag_pipeline as rag_pipeline
+from src.rag_pipeline import RAGPipeline
+from src.service import RAGServer, RAGServiceClient, ServiceError
+from src.service.server import RAGRequestHandler
+from tests.test_pipeline import TEXTS, FakeEmbedder
+
+
+@pytest.fixture
+def served(monkeypatch, tmp_path):
+    """A client of a service over a memory-mapped index saved to disk, and its pipeline."""
+    monkeypatch.setattr(rag_pipeline, "Embedder", FakeEmbedder)
+    options = dict(
+        model_path=str(tmp_path / "missing.gguf"),
+        index_path=str(tmp_path / "index"),
+        response_cache_path=None,
+        semantic_cache_threshold=None,
+        usage_log_path=None
+    )
+    builder = RAGPipeline(**options)
+    builder.indexer.create_index([
+        Document(page_content=text, metadata={'source': 'guide.pdf', 'page_number': idx + 1, 'chunk_index': 0})
+        for idx, text in enumerate(TEXTS)
+    ])
+    builder.indexer.save_index()
+
+    pipeline = RAGPipeline(mmap_index=True, **options)
+    pipeline.load_index()
+    server = RAGServer(("127.0.0.1", 0), pipeline)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = RAGServiceClient(f"http://127.0.0.1:{server.server_address[1]}")
+    yield client, pipeline
+    client.close()
+    server.shutdown()
+    server.server_close()
+    pipeline.shutdown()
+
+
+def test_service_endpoints_answer_like_the_pipeline_on_one_connection(served):
+    """Test every endpoint matches the pipeline, over a single keep-alive connection."""
+    client, pipeline = served
+    question = "What treats type 2 diabetes?"
+
+    health = client.health()
+    assert health['status'] == 'ok' and health['index_mmap'] is True
+    connection = client._local.connection.sock
+
+    expected = pipeline.query(question, k=2)
+    assert client.query(question, k=2)['answer'] == expected['answer']
+    events = list(client.query_stream(question, k=2))
+    assert [event['type'] for event in events][0] == 'retrieval' and events[-1]['type'] == 'done'
+    assert events[-1]['response']['answer'] == expected['answer']
+    responses = client.query_batch([question, "How is hypertension treated?"], k=2)
+    assert [r['question'] for r in responses] == [question, "How is hypertension treated?"]
+    documents = client.retrieve(question, k=2, filters={'page_range': [1, 1]})
+    assert [d['page_content'] for d in documents] == [TEXTS[0]]
+    assert client.list_sources() == ['guide.pdf']
+
+    with pytest.raises(ServiceError) as error:
+        client.query(question, top_k=2)
+    assert error.value.status == 400
+    assert client._local.connection.sock is connection
+
+
+def test_mmap_index_is_read_only(served):
+    """Test a memory-mapped index refuses additions instead of writing to the mapping."""
+    _, pipeline = served
+    with pytest.raises(ValueError, match="memory-mapped"):
+        pipeline.indexer.add_documents([Document(page_content="New text", metadata={'source': 'new.pdf'})])
+
+
+class DisconnectedSocketFile(io.BytesIO):
+    """A response stream whose client hangs up after the headers."""
+
+    def write(self, data):
+        if self.getvalue():
+            raise BrokenPipeError("Client disconnected")
+        return super().write(data)
+
+
+def test_stream_stops_quietly_when_the_client_disconnects():
+    """Test a dropped stream is not answered again with an error, and its events are closed."""
+    handler = RAGRequestHandler.__new__(RAGRequestHandler)
+    handler.wfile = DisconnectedSocketFile()
+    handler.request_version = "HTTP/1.1"
+    handler.requestline = "POST /query HTTP/1.1"
+    handler.client_address = ("127.0.0.1", 0)
+    handler.close_connection = False
+    closed = []
+
+    def events():
+        try:
+            yield {'type': 'retrieval'}
+            yield {'type': 'token', 'text': 'Metformin'}
+        finally:
+            closed.append(True)
+
+    handler._send_stream(events())
+    assert closed == [True] and handler.close_connection is True
+    assert handler.wfile.getvalue().count(b"HTTP/1.1") == 1